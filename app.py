@@ -7,201 +7,165 @@ import os
 import sys
 import time
 from pathlib import Path
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify, render_template
+from typing import Dict, Any, Iterator, List, Optional
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 import requests
-from dotenv import load_dotenv
+from kis_core.balance import cached_balance, fetch_balance, iter_balance  # noqa: F401 - re-exported for scripts using app.*
+from kis_core.config import DEFAULT_UNIVERSE, get_env_config, load_env
+from kis_core.orders import order_buy, order_sell
+from kis_core.quotes import QUOTE_CACHE, REALTIME_FEEDS, fetch_price, fetch_prices_batch, iter_prices_batch
+from kis_core.tokens import TOKEN_CACHE, get_cached_token, get_or_issue_token, issue_token, revoke_token
+from orderbook import DEPTH_TR_IDS, limit_price
+from realtime import RealtimeFeed
+from token_store import get_token_store, token_expires_at
+from metrics import CONTENT_TYPE, HTTP_LATENCY, REGISTRY
+from profiling import SamplingProfiler, write_folded
+from factors import rank_quotes
+from responses import DEFAULT_MASK, MaskPlan, OrjsonProvider, compile_fields, dumps, shape_rows
+from positions import get_position_cache
+from snapshot import UniverseScanner
+from scanner import ScanResult
 from universe import load_universe
 
 # Load environment variables
 env_file = Path(".env")
 if not env_file.exists():
     print("Warning: .env file not found. Using environment variables or defaults.")
-load_dotenv()
+load_env()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-TIMEOUT = 5
-TOKEN_CACHE: Dict[str, Dict[str, Any]] = {}
-DEFAULT_UNIVERSE = [
-    # Core large caps
-    "005930", "000660", "035420", "207940", "051910", "005380", "068270", "028260", "055550", "006400",
-    "105560", "096770", "034730", "003550", "011170", "017670", "003670", "010130", "018260", "009150",
-    "032830", "034020", "000270", "036570", "012330",
-]
-
-
-def get_cached_token(mode: str) -> Optional[str]:
-    """Return cached token if still valid."""
-    cache = TOKEN_CACHE.get(mode)
-    if not cache:
-        return None
-    expires_at = cache.get("expires_at")
-    if expires_at and expires_at > time.time():
-        return cache.get("token")
-    return None
+# Background-ranked universe snapshots for /api/portfolio and /api/recommend (interval 0 disables)
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))
+SNAPSHOT_IDLE = float(os.getenv("SNAPSHOT_IDLE", "600"))
+SNAPSHOT_SCANNERS: Dict[tuple, UniverseScanner] = {}
+# Opt-in per-request profiling (X-Profile header or ?profile=); the hooks are only installed when enabled
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))
+
+
+def _cache_samples(field: str):
+    quote = QUOTE_CACHE.stats()
+    positions = get_position_cache().stats()
+    yield {"cache": "quote"}, quote[field] + (quote["coalesced"] if field == "hits" else 0)
+    yield {"cache": "positions"}, positions["hits" if field == "hits" else "refreshes"]
+
+
+REGISTRY.collect("kis_cache_hits_total", "counter", "Lookups served from a cache (quote hits include coalesced calls)", lambda: _cache_samples("hits"))
+REGISTRY.collect("kis_cache_misses_total", "counter", "Lookups that went to KIS", lambda: _cache_samples("misses"))
+REGISTRY.collect(
+    "kis_snapshot_age_seconds",
+    "gauge",
+    "Age of each background universe snapshot",
+    lambda: [({"scanner": s.name}, s.snapshot.age) for s in list(SNAPSHOT_SCANNERS.values()) if s.snapshot is not None],
+)
+
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response: Response) -> Response:
+    started = g.get("started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
+
+
+if PROFILE_REQUESTS:
+
+    @app.before_request
+    def _start_profile():
+        mode = request.headers.get("X-Profile") or request.args.get("profile")
+        if mode in ("1", "file", "inline"):
+            g.profile_mode = mode
+            g.profiler = SamplingProfiler(interval=PROFILE_INTERVAL).start()
+
+    @app.after_request
+    def _finish_profile(response: Response) -> Response:
+        """
+        Stop the request's profiler: 'inline' adds a hot-spot summary to a JSON
+        object body ('profile'), else the folded stacks go to PROFILE_DIR and
+        the path is returned in X-Profile-File. Streamed bodies are not covered.
+        """
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        if g.profile_mode == "inline" and response.is_json and not response.is_streamed:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body["profile"] = profiler.summary()
+                response.set_data(dumps(body))
+                return response
+        try:
+            path = write_folded(profiler, (request.endpoint or "unmatched").replace(".", "_"))
+            response.headers["X-Profile-File"] = str(path)
+            print(f"Profiled {request.method} {request.path}: {profiler.samples} samples in {profiler.seconds:.3f}s -> {path}")
+        except OSError as e:
+            print(f"Failed to write profile: {e}")
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc: Optional[BaseException]) -> None:
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
 
 
 def mask_sensitive_data(data: Any, keys: list = None) -> Any:
-    """Mask sensitive information in data"""
-    if keys is None:
-        keys = ["appkey", "appsecret", "token", "access_token", "authorization"]
-
-    if isinstance(data, dict):
-        masked = {}
-        for k, v in data.items():
-            if k.lower() in [key.lower() for key in keys]:
-                if isinstance(v, str) and v:
-                    masked[k] = v[:4] + "***" if len(v) > 4 else "***"
-                else:
-                    masked[k] = "***"
-            elif isinstance(v, (dict, list)):
-                masked[k] = mask_sensitive_data(v, keys)
-            else:
-                masked[k] = v
-        return masked
-    elif isinstance(data, list):
-        return [mask_sensitive_data(item, keys) for item in data]
-    return data
-
+    """Mask sensitive information in data (see responses.MaskPlan; unchanged parts are shared, not copied)"""
+    return (DEFAULT_MASK if keys is None else MaskPlan(keys)).mask(data)
 
-def get_env_config(mode: str) -> Dict[str, str]:
-    """Get environment configuration for given mode"""
-    if mode == "prod":
-        appkey = os.getenv("APP_KEY", "")
-        appsecret = os.getenv("APP_SECRET", "")
-        return {
-            "base": os.getenv("BASE_PROD", "https://openapi.koreainvestment.com:9443"),
-            "appkey": appkey,
-            "appsecret": appsecret,
-            "account": os.getenv("ACCT_STOCK", ""),
-            "product": os.getenv("PROD_CODE", "01"),
-            "agent": os.getenv("USER_AGENT", "MyTradingApp/1.0"),
-            "name": "prod",
-        }
-    elif mode == "paper":
-        paper_acct = os.getenv("PAPER_ACCT_STOCK", "")
-        appkey = os.getenv("PAPER_APP_KEY", "")
-        appsecret = os.getenv("PAPER_APP_SECRET", "")
-        return {
-            "base": os.getenv("BASE_PAPER", "https://openapivts.koreainvestment.com:29443"),
-            "appkey": appkey,
-            "appsecret": appsecret,
-            "account": paper_acct if paper_acct else os.getenv("ACCT_STOCK", ""),
-            "product": os.getenv("PROD_CODE", "01"),
-            "agent": os.getenv("USER_AGENT", "MyTradingApp/1.0"),
-            "name": "paper",
-        }
-    else:
-        raise ValueError(f"Unknown mode: {mode}")
 
+def get_realtime_feed(mode: str) -> RealtimeFeed:
+    """Return the running WebSocket feed for mode, starting it on first use."""
+    feed = REALTIME_FEEDS.get(mode)
+    if feed is None:
+        feed = RealtimeFeed(get_env_config(mode))
+        REALTIME_FEEDS[mode] = feed
+    return feed.start()
 
-def issue_token(env: Dict) -> Dict:
-    """Issue access token"""
-    if not env.get("appkey") or not env.get("appsecret"):
-        raise ValueError("appkey or appsecret is missing")
-    url = f"{env['base']}/oauth2/tokenP"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "User-Agent": env["agent"],
-    }
-    body = {
-        "grant_type": "client_credentials",
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-    }
-    resp = requests.post(url, headers=headers, json=body, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def revoke_token(env: Dict, token: str) -> Dict:
-    """Revoke access token"""
-    if not env.get("appkey") or not env.get("appsecret"):
-        raise ValueError("appkey or appsecret is missing")
-    
-    url = f"{env['base']}/oauth2/revokeP"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "User-Agent": env["agent"],
-    }
-    body = {
-        "token": token,
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-    }
-    resp = requests.post(url, headers=headers, json=body, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
-
-def get_or_issue_token(env: Dict, mode: str) -> str:
-    """Return cached token if valid, else issue new and cache it."""
-    cached = get_cached_token(mode)
-    if cached:
-        return cached
-    result = issue_token(env)
-    token = result.get("access_token")
-    expires_in = result.get("expires_in")
-    if token and expires_in:
-        # store with small buffer (minus 60s)
-        TOKEN_CACHE[mode] = {
-            "token": token,
-            "expires_at": time.time() + max(int(expires_in) - 60, 0),
-        }
-    return token
 
-
-def fetch_price(env: Dict, token: str, symbol: str, market: str) -> Dict:
-    """Fetch stock price"""
-    url = f"{env['base']}/uapi/domestic-stock/v1/quotations/inquire-price"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "authorization": f"Bearer {token}",
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-        "tr_id": "FHKST01010100",
-        "custtype": "P",
-        "User-Agent": env["agent"],
-    }
-    params = {
-        "FID_COND_MRKT_DIV_CODE": market,
-        "FID_INPUT_ISCD": symbol,
-    }
-    resp = requests.get(url, headers=headers, params=params, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
-
-def fetch_balance(env: Dict, token: str, mode: str) -> Dict:
-    """Fetch stock balance with evaluation P/L"""
-    tr_id = "VTTC8434R" if mode == "paper" else "TTTC8434R"
-    url = f"{env['base']}/uapi/domestic-stock/v1/trading/inquire-balance"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "authorization": f"Bearer {token}",
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-        "tr_id": tr_id,
-        "custtype": "P",
-        "User-Agent": env["agent"],
-    }
-    params = {
-        "CANO": env["account"],
-        "ACNT_PRDT_CD": env["product"],
-        "AFHR_FLPR_YN": "N",            # 시간외단일가 여부
-        "OFL_YN": "",                   # 오프라인 여부
-        "INQR_DVSN": "02",              # 01 대출일별, 02 종목별
-        "UNPR_DVSN": "01",              # 단가구분 기본값
-        "FUND_STTL_ICLD_YN": "N",       # 펀드결제 포함여부
-        "FNCG_AMT_AUTO_RDPT_YN": "N",   # 융자금 자동상환 여부
-        "PRCS_DVSN": "00",              # 전일매매 포함
-        "CTX_AREA_FK100": "",           # 연속조회키 (초기 공란)
-        "CTX_AREA_NK100": "",
-    }
-    resp = requests.get(url, headers=headers, params=params, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
+def get_universe_scanner(
+    mode: str, market: str, limit: int, universe_market: Optional[str] = None, universe_sector: Optional[str] = None
+) -> UniverseScanner:
+    """Scanner for one system universe selection, created on first use and kept warm in the background."""
+    key = (mode, market, limit, universe_market, universe_sector)
+    scanner = SNAPSHOT_SCANNERS.get(key)
+    if scanner is None:
+
+        def fetch(symbols: List[str]) -> List[ScanResult]:
+            env = get_env_config(mode)
+            token = get_or_issue_token(env, mode)
+            if not token:
+                raise RuntimeError("failed to obtain token")
+            return fetch_prices_batch(env, token, symbols, market)
+
+        name = "/".join(str(part) for part in key if part)
+        scanner = SNAPSHOT_SCANNERS.setdefault(
+            key,
+            UniverseScanner(name, lambda: load_universe(limit, universe_market, universe_sector), fetch, SNAPSHOT_INTERVAL, SNAPSHOT_IDLE),
+        )
+    return scanner
+
+
+def covering_snapshot(mode: str, market: str, symbols: List[str], max_staleness: Optional[float]) -> Optional[tuple]:
+    """(snapshot, rows) from a running universe scanner that covers every symbol, else None."""
+    for key, scanner in list(SNAPSHOT_SCANNERS.items()):
+        if key[:2] != (mode, market) or scanner.snapshot is None or scanner.snapshot.subset(symbols) is None:
+            continue
+        snap = scanner.get(max_staleness)
+        rows = snap.subset(symbols)
+        if rows is not None:
+            return snap, rows
+    return None
 
 
 def parse_float(text: Optional[str]) -> Optional[float]:
@@ -211,57 +175,6 @@ def parse_float(text: Optional[str]) -> Optional[float]:
         return float(str(text).replace(',', ''))
     except Exception:
         return None
-
-
-def order_buy(env: Dict, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
-    """Place buy order"""
-    url = f"{env['base']}/uapi/domestic-stock/v1/trading/order-cash"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "authorization": f"Bearer {token}",
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-        "tr_id": "TTTC0012U",
-        "custtype": "P",
-        "User-Agent": env["agent"],
-    }
-    body = {
-        "CANO": env["account"],
-        "ACNT_PRDT_CD": env["product"],
-        "PDNO": symbol,
-        "ORD_DVSN": order_type,
-        "ORD_QTY": str(qty),
-        "ORD_UNPR": str(price) if order_type == "00" else "0",
-    }
-    resp = requests.post(url, headers=headers, json=body, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def order_sell(env: Dict, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
-    """Place sell order"""
-    url = f"{env['base']}/uapi/domestic-stock/v1/trading/order-cash"
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-        "authorization": f"Bearer {token}",
-        "appkey": env["appkey"],
-        "appsecret": env["appsecret"],
-        "tr_id": "TTTC0011U",
-        "custtype": "P",
-        "User-Agent": env["agent"],
-    }
-    body = {
-        "CANO": env["account"],
-        "ACNT_PRDT_CD": env["product"],
-        "PDNO": symbol,
-        "ORD_DVSN": order_type,
-        "ORD_QTY": str(qty),
-        "ORD_UNPR": str(price) if order_type == "00" else "0",
-        "SLL_TYPE": "01",
-    }
-    resp = requests.post(url, headers=headers, json=body, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return resp.json()
 
 
 @app.route("/")
@@ -270,6 +183,84 @@ def index():
     return render_template("index.html")
 
 
+@app.route("/api/quote-cache", methods=["GET"])
+def api_quote_cache():
+    """Quote cache hit/miss/coalesce counters"""
+    return jsonify({"success": True, "data": QUOTE_CACHE.stats()})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus metrics: KIS calls per tr_id, Flask routes, caches"""
+    return Response(REGISTRY.expose(), content_type=CONTENT_TYPE)
+
+
+@app.route("/api/snapshot", methods=["GET"])
+def api_snapshot():
+    """Background universe scanners and the age of their ranked snapshots"""
+    return jsonify({"success": True, "interval": SNAPSHOT_INTERVAL, "data": [s.stats() for s in SNAPSHOT_SCANNERS.values()]})
+
+
+@app.route("/api/realtime/subscribe", methods=["POST"])
+def api_realtime_subscribe():
+    """
+    Subscribe symbols to 실시간체결가 ticks; quote lookups then read the live store.
+    Input JSON: { "symbols": ["005930"], "market": "J", "mode": "paper" }
+    """
+    try:
+        data = request.get_json() or {}
+        symbols = data.get("symbols") or []
+        market = data.get("market", "J")
+        mode = data.get("mode", "paper")
+        if isinstance(symbols, str):
+            symbols = [s.strip() for s in symbols.split(",") if s.strip()]
+        if not symbols:
+            return jsonify({"success": False, "error": "symbols list is required"}), 400
+
+        feed = get_realtime_feed(mode)
+        feed.subscribe_ticks(symbols, market)
+        print(f"[{mode}] Realtime ticks subscribed: {len(symbols)} symbols ({market})")
+        return jsonify({"success": True, "subscriptions": len(feed.subscriptions), "connected": feed.connected.is_set()})
+    except Exception as e:
+        print(f"Error subscribing realtime: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/realtime/prices", methods=["GET"])
+def api_realtime_prices():
+    """Last traded price/change rate from the WebSocket store"""
+    mode = request.args.get("mode", "paper")
+    market = request.args.get("market", "J")
+    feed = REALTIME_FEEDS.get(mode)
+    if feed is None or market not in feed.ticks:
+        return jsonify({"success": False, "error": f"no realtime feed for {mode}/{market}"}), 404
+    store = feed.ticks[market]
+    symbols = request.args.get("symbols")
+    symbols = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else store.symbols()
+    prices = [p for p in (store.get(s) for s in symbols) if p is not None]
+    return jsonify({"success": True, "connected": feed.connected.is_set(), "frames": feed.frames, "data": prices})
+
+
+@app.route("/api/orderbook", methods=["GET"])
+def api_orderbook():
+    """10-level depth from 실시간호가; subscribes the symbol on first request"""
+    symbol = request.args.get("symbol")
+    market = request.args.get("market", "J")
+    mode = request.args.get("mode", "paper")
+    if not symbol:
+        return jsonify({"success": False, "error": "symbol is required"}), 400
+    try:
+        feed = get_realtime_feed(mode)
+        store = feed.subscribe_depth([symbol], market)
+    except Exception as e:
+        print(f"Error subscribing order book: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    book = store.get(symbol)
+    if book is None:
+        return jsonify({"success": True, "pending": True, "connected": feed.connected.is_set()})
+    return jsonify({"success": True, "data": book.snapshot()})
+
+
 @app.route("/api/token/issue", methods=["POST"])
 def api_token_issue():
     """Issue access token"""
@@ -284,13 +275,17 @@ def api_token_issue():
                 "error": f"Missing credentials for {mode} mode. Check PAPER_APP_KEY/PAPER_APP_SECRET (or APP_KEY/APP_SECRET) in .env file"
             }), 400
 
-        cached = get_cached_token(mode)
+        cached = get_cached_token(mode, env)
         if cached:
             print(f"[{mode}] Token reused from cache")
             return jsonify({"success": True, "data": {"access_token": "***cached***"}, "token": cached})
 
         result = issue_token(env)
         token = result.get("access_token")
+        expires_at = token_expires_at(result)
+        if token and expires_at:
+            TOKEN_CACHE[mode] = {"token": token, "expires_at": expires_at}
+            get_token_store().put(env["appkey"], mode, token, expires_at)
 
         # Mask sensitive data for UI display, but return token separately
         masked_result = mask_sensitive_data(result)
@@ -357,6 +352,7 @@ def api_token_revoke():
         cached = TOKEN_CACHE.get(mode, {})
         if cached.get("token") == token:
             TOKEN_CACHE.pop(mode, None)
+        get_token_store().delete(env.get("appkey", ""), mode, token)
 
         print(f"[{mode}] Token revoked")
         return jsonify({"success": True, "data": masked_result})
@@ -419,6 +415,7 @@ def api_order():
         qty = data.get("qty")
         price = data.get("price", 0)
         order_type = data.get("order_type", "00")  # 00=limit, 01=market
+        market = data.get("market", "J")
         mode = data.get("mode", "paper")
         token = data.get("token")
         
@@ -428,6 +425,8 @@ def api_order():
             return jsonify({"success": False, "error": "symbol is required"}), 400
         if not qty:
             return jsonify({"success": False, "error": "qty is required"}), 400
+        if market not in DEPTH_TR_IDS:
+            return jsonify({"success": False, "error": f"market must be one of {', '.join(DEPTH_TR_IDS)}"}), 400
         
         env = get_env_config(mode)
         
@@ -436,6 +435,14 @@ def api_order():
             token = get_or_issue_token(env, mode)
             if not token:
                 return jsonify({"success": False, "error": "failed to obtain token"}), 500
+
+        # Limit order without a price: take the touch from the live order book
+        if order_type == "00" and not int(price):
+            feed = REALTIME_FEEDS.get(mode)
+            book = feed.books[market].get(symbol) if feed else None
+            price = limit_price(book, side, 0)
+            if not price:
+                return jsonify({"success": False, "error": "price is required (no live order book for symbol)"}), 400
         
         # Place order
         if side == "buy":
@@ -455,12 +462,29 @@ def api_order():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def balance_rows(holdings: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cached parsed holdings as output1-style rows (KIS field names, numeric values)."""
+    return [
+        {
+            "pdno": sym,
+            "prdt_name": h.get("name", ""),
+            "hldg_qty": h["qty"],
+            "pchs_avg_pric": h["avg"],
+            "evlu_pfls_rt": h["plrt"],
+            "prpr": h["price"],
+        }
+        for sym, h in holdings.items()
+    ]
+
+
 @app.route("/api/balance", methods=["GET"])
 def api_balance():
-    """Fetch balance and P/L"""
+    """Fetch balance and P/L (served from the position cache; ?refresh=1 reloads, ?fields=pdno,hldg_qty trims holdings)"""
     try:
         mode = request.args.get("mode", "paper")
         token = request.args.get("token")
+        refresh = request.args.get("refresh") in ("1", "true")
+        fields = compile_fields(request.args.get("fields"))
 
         env = get_env_config(mode)
 
@@ -469,22 +493,13 @@ def api_balance():
             if not token:
                 return jsonify({"success": False, "error": "failed to obtain token"}), 500
 
-        result = fetch_balance(env, token, mode)
-        masked_result = mask_sensitive_data(result)
-
-        # Extract totals block (output2 if list/dict, else output1)
-        output2 = masked_result.get("output2")
-        totals_block: Dict[str, str] = {}
-        if isinstance(output2, list) and output2:
-            totals_block = output2[0] if isinstance(output2[0], dict) else {}
-        elif isinstance(output2, dict):
-            totals_block = output2
-        else:
-            o1 = masked_result.get("output1")
-            if isinstance(o1, list) and o1 and isinstance(o1[0], dict):
-                totals_block = o1[0]
-            elif isinstance(o1, dict):
-                totals_block = o1
+        positions, cached = cached_balance(env, token, mode, 0 if refresh else None)
+        totals_block = positions["totals"]
+        rows = balance_rows(positions["holdings"])
+        if fields is not None:
+            rows = shape_rows(rows, fields)
+        result = {k: positions.get(k, "") for k in ("rt_cd", "msg_cd", "msg1")}
+        result.update({"output1": rows, "output2": [totals_block]})
 
         key_fields = [
             "tot_evlu_amt",        # 총평가금액
@@ -496,58 +511,147 @@ def api_balance():
         ]
         summary = {k: totals_block[k] for k in key_fields if k in totals_block}
 
-        print(f"[{mode}] Balance fetched")
-        return jsonify({"success": True, "data": masked_result, "summary": summary})
+        print(f"[{mode}] Balance {'served from cache' if cached else 'fetched'}")
+        return jsonify(
+            {"success": True, "data": result, "summary": summary, "cached": cached, "loaded_at": positions["loaded_at"]}
+        )
     except Exception as e:
         print(f"Error fetching balance: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def stream_format(data: Dict) -> Optional[str]:
+    """'ndjson' or 'sse' when the client asked for a streamed response (body "stream", ?stream= or Accept)."""
+    fmt = data.get("stream") or request.args.get("stream")
+    if fmt is True:
+        fmt = "ndjson"
+    if not fmt:
+        accept = request.headers.get("Accept", "")
+        if "text/event-stream" in accept:
+            fmt = "sse"
+        elif "application/x-ndjson" in accept:
+            fmt = "ndjson"
+    return fmt if fmt in ("ndjson", "sse") else None
+
+
+def stream_response(fmt: str, events: Iterator[Dict]) -> Response:
+    """Send events as NDJSON lines or SSE frames (event: <type>), flushed one by one."""
+
+    def encode() -> Iterator[str]:
+        for event in events:
+            body = dumps(event).decode()
+            yield f"event: {event['type']}\ndata: {body}\n\n" if fmt == "sse" else body + "\n"
+
+    mimetype = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return Response(stream_with_context(encode()), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _summary_row(row: Dict) -> Dict:
+    out = {"symbol": row["symbol"], "price": row.get("price"), "change_rate": row.get("change_rate"), "score": row.get("score")}
+    for key in ("weight", "error"):
+        if key in row:
+            out[key] = row[key]
+    return out
+
+
+def ranking_events(
+    env: Dict,
+    token: str,
+    symbols: List[str],
+    market: str,
+    concurrency: Optional[int],
+    include_raw: bool,
+    top_n: Optional[int] = None,
+    alloc: str = "equal",
+) -> Iterator[Dict]:
+    """
+    Events for a streamed ranking: "start", one "quote" per symbol as it
+    arrives, then "result" with the final ranking (only the weighted picks
+    when top_n is given). Per symbol only price and change rate are kept
+    until the end; the quote payload goes out with its event (if raw) and
+    is dropped.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    yield {"type": "start", "total": len(symbols)}
+    kept: Dict[str, ScanResult] = {}
+    try:
+        for sym, resp, err in iter_prices_batch(env, token, symbols, market, concurrency):
+            event: Dict[str, Any] = {"type": "quote", "symbol": sym, "done": len(kept) + 1}
+            if err:
+                kept[sym] = (sym, None, err)
+                event["error"] = err
+            else:
+                out = resp.get("output") or {}
+                kept[sym] = (sym, {"output": {"stck_prpr": out.get("stck_prpr"), "prdy_ctrt": out.get("prdy_ctrt")}}, None)
+                event["price"] = out.get("stck_prpr")
+                event["change_rate"] = parse_float(out.get("prdy_ctrt")) or 0.0
+                if include_raw:
+                    event["raw"] = mask_sensitive_data(resp)
+            yield event
+        ranked = rank_quotes([kept[sym] for sym in symbols if sym in kept], top_n=top_n, alloc=alloc)
+        if top_n is not None:
+            ranked = [r for r in ranked if "weight" in r]
+        yield {"type": "result", "success": True, "summary": [_summary_row(r) for r in ranked]}
+    except Exception as e:
+        print(f"Error streaming ranking: {e}")
+        yield {"type": "error", "success": False, "error": str(e)}
+
+
 @app.route("/api/recommend", methods=["POST"])
 def api_recommend():
     """
-    Simple quant-style recommendation: rank symbols by intraday change rate (prdy_ctrt).
-    Input JSON: { "symbols": ["005930","000660"], "market": "J", "mode": "paper" }
+    Quant-style recommendation: rank symbols by the multi-factor momentum score
+    (factors.py; falls back to the intraday change rate without stored history).
+    Input JSON: { "symbols": ["005930","000660"], "market": "J", "mode": "paper", "concurrency": 8 }
+    Optional: "raw": true to include each masked quote payload;
+    "fields": "symbol,score,raw.output.acml_vol" (or a list) to return only those row fields;
+    "stream": "ndjson" | "sse" to stream per-symbol events and then the ranking;
+    "max_staleness": seconds, serve from a background universe snapshot no older than this
+    when one covers every symbol (0 forces a fresh scan).
     """
     try:
         data = request.get_json() or {}
         symbols = data.get("symbols") or []
         market = data.get("market", "J")
         mode = data.get("mode", "paper")
+        concurrency = data.get("concurrency")
+        include_raw = bool(data.get("raw"))
+        max_staleness = parse_float(data.get("max_staleness"))
+        fields = compile_fields(data.get("fields") or request.args.get("fields"))
 
         if isinstance(symbols, str):
             symbols = [s.strip() for s in symbols.split(",") if s.strip()]
         if not symbols:
             return jsonify({"success": False, "error": "symbols list is required"}), 400
 
+        if not include_raw and not stream_format(data):
+            covered = covering_snapshot(mode, market, symbols, max_staleness)
+            if covered:
+                snap, rows = covered
+                print(f"[{mode}] Recommend served {len(symbols)} symbols from snapshot ({snap.age:.1f}s old)")
+                return jsonify(
+                    {"success": True, "summary": [_summary_row(r) for r in rows], "data": shape_rows(rows, fields), "snapshot": snap.info()}
+                )
+
         env = get_env_config(mode)
         token = get_or_issue_token(env, mode)
         if not token:
             return jsonify({"success": False, "error": "failed to obtain token"}), 500
 
-        results = []
-        for sym in symbols:
-            try:
-                price_resp = fetch_price(env, token, sym, market)
-                out = price_resp.get("output", {})
-                change_rate = parse_float(out.get("prdy_ctrt")) or 0.0
-                price = out.get("stck_prpr")
-                results.append(
-                    {
-                        "symbol": sym,
-                        "price": price,
-                        "change_rate": change_rate,
-                        "raw": mask_sensitive_data(price_resp),
-                    }
-                )
-            except Exception as e:
-                results.append({"symbol": sym, "error": str(e)})
+        fmt = stream_format(data)
+        if fmt:
+            print(f"[{mode}] Recommend streaming {len(symbols)} symbols ({fmt})")
+            return stream_response(fmt, ranking_events(env, token, symbols, market, concurrency, include_raw))
 
-        ranked = sorted(results, key=lambda x: x.get("change_rate", -1e9), reverse=True)
-        summary = [{"symbol": r["symbol"], "price": r.get("price"), "change_rate": r.get("change_rate")} for r in ranked]
+        ranked = rank_quotes(fetch_prices_batch(env, token, symbols, market, concurrency))
+        for r in ranked:
+            resp = r.pop("resp", None)
+            if include_raw and resp is not None:
+                r["raw"] = resp
+        summary = [{"symbol": r["symbol"], "price": r.get("price"), "change_rate": r.get("change_rate"), "score": r.get("score")} for r in ranked]
 
         print(f"[{mode}] Recommend computed for {len(symbols)} symbols")
-        return jsonify({"success": True, "summary": summary, "data": ranked})
+        return jsonify({"success": True, "summary": summary, "data": shape_rows(ranked, fields)})
     except Exception as e:
         print(f"Error computing recommendations: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -562,9 +666,16 @@ def api_portfolio():
       market: J/NX/UN
       mode: paper/prod
       top_n: how many symbols to select (default 5)
-      alloc: 'equal' (currently only equal weight supported)
+      alloc: 'equal' or 'inverse_vol'
       use_system: bool, default true -> use DEFAULT_UNIVERSE
       universe_limit: int, when use_system true, number of symbols to fetch (default 200)
+      universe_market / universe_sector: optional symbol-master filters (e.g. KOSPI, KOSDAQ)
+      concurrency: int, max quote requests in flight (default SCAN_CONCURRENCY or 8)
+      raw: bool, include each pick's masked quote payload (default false)
+      fields: 'symbol,weight,raw.output.acml_vol' (or a list), return only those fields per pick
+      stream: 'ndjson' | 'sse', stream per-symbol events and then the picks
+      max_staleness: seconds; system-universe picks come from the background snapshot
+        if it is at most this old, else it is rescanned first (default 2 * SNAPSHOT_INTERVAL)
     """
     try:
         data = request.get_json() or {}
@@ -575,9 +686,24 @@ def api_portfolio():
         alloc = data.get("alloc", "equal")
         use_system = data.get("use_system", True)
         universe_limit = int(data.get("universe_limit", 200))
+        concurrency = data.get("concurrency")
+        include_raw = bool(data.get("raw"))
+        max_staleness = parse_float(data.get("max_staleness"))
+        fields = compile_fields(data.get("fields") or request.args.get("fields"))
+
+        if (use_system or not symbols) and SNAPSHOT_INTERVAL > 0 and not include_raw and not stream_format(data):
+            scanner = get_universe_scanner(mode, market, universe_limit, data.get("universe_market"), data.get("universe_sector"))
+            snap = scanner.get(max_staleness)
+            if not snap.rows:
+                return jsonify({"success": False, "error": "symbols universe is empty"}), 400
+            picks = snap.top(max(1, min(top_n, len(snap.rows))), alloc)
+            print(f"[{mode}] Portfolio from snapshot of {len(snap.rows)} -> top {len(picks)} ({snap.age:.1f}s old)")
+            return jsonify(
+                {"success": True, "summary": [_summary_row(p) for p in picks], "data": shape_rows(picks, fields), "snapshot": snap.info()}
+            )
 
         if use_system or not symbols:
-            symbols = load_universe(limit=universe_limit)
+            symbols = load_universe(universe_limit, data.get("universe_market"), data.get("universe_sector"))
         elif isinstance(symbols, str):
             symbols = [s.strip() for s in symbols.split(",") if s.strip()]
 
@@ -591,39 +717,25 @@ def api_portfolio():
         if not token:
             return jsonify({"success": False, "error": "failed to obtain token"}), 500
 
-        scored = []
-        for sym in symbols:
-            try:
-                price_resp = fetch_price(env, token, sym, market)
-                out = price_resp.get("output", {})
-                change_rate = parse_float(out.get("prdy_ctrt")) or 0.0
-                price = out.get("stck_prpr")
-                scored.append(
-                    {
-                        "symbol": sym,
-                        "price": price,
-                        "change_rate": change_rate,
-                        "raw": mask_sensitive_data(price_resp),
-                    }
-                )
-            except Exception as e:
-                scored.append({"symbol": sym, "error": str(e), "change_rate": -1e9})
-
-        ranked = sorted(scored, key=lambda x: x.get("change_rate", -1e9), reverse=True)
-        picks = ranked[:top_n]
-
-        if alloc == "equal":
-            weight = round(1.0 / top_n, 4)
-            for p in picks:
-                p["weight"] = weight
-        else:
-            for p in picks:
-                p["weight"] = None
-
-        summary = [{"symbol": p["symbol"], "price": p.get("price"), "change_rate": p.get("change_rate"), "weight": p.get("weight")} for p in picks]
+        fmt = stream_format(data)
+        if fmt:
+            print(f"[{mode}] Portfolio streaming {len(symbols)} -> top {top_n} ({fmt})")
+            return stream_response(fmt, ranking_events(env, token, symbols, market, concurrency, include_raw, top_n, alloc))
+
+        ranked = rank_quotes(fetch_prices_batch(env, token, symbols, market, concurrency), top_n=top_n, alloc=alloc)
+        picks = [r for r in ranked if "weight" in r]
+        for p in picks:
+            resp = p.pop("resp")
+            if include_raw:
+                p["raw"] = resp
+
+        summary = [
+            {"symbol": p["symbol"], "price": p.get("price"), "change_rate": p.get("change_rate"), "score": p.get("score"), "weight": p.get("weight")}
+            for p in picks
+        ]
 
         print(f"[{mode}] Portfolio built from {len(symbols)} -> top {top_n}")
-        return jsonify({"success": True, "summary": summary, "data": picks})
+        return jsonify({"success": True, "summary": summary, "data": shape_rows(picks, fields)})
     except Exception as e:
         print(f"Error building portfolio: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1,5 +1,5 @@
 """
-Auto trading harness using momentum-based portfolio (top-N equal weight).
+Auto trading harness using a momentum factor portfolio (top-N by factors.py score).
 
 Default behavior is dry-run: it only prints intended trades.
 Use --live to actually place orders (caution: real trades in prod mode).
@@ -7,74 +7,47 @@ Use --live to actually place orders (caution: real trades in prod mode).
 
 import argparse
 import math
+import time
 from pathlib import Path
-from typing import List, Dict, Any
-
-from dotenv import load_dotenv
-
-from app import (
-    DEFAULT_UNIVERSE,
-    get_env_config,
-    get_or_issue_token,
-    fetch_price,
-    fetch_balance,
-    order_buy,
-    order_sell,
-)
-
-
-def as_float(val) -> float:
-    try:
-        return float(str(val).replace(",", ""))
-    except Exception:
-        return 0.0
-
-
-def build_portfolio(env: Dict[str, Any], token: str, universe: List[str], market: str, top_n: int) -> List[Dict[str, Any]]:
-    scored = []
-    for sym in universe:
-        try:
-            price_resp = fetch_price(env, token, sym, market)
-            out = price_resp.get("output", {})
-            change_rate = as_float(out.get("prdy_ctrt"))
-            price = as_float(out.get("stck_prpr"))
-            scored.append({"symbol": sym, "price": price, "change_rate": change_rate})
-        except Exception as e:
-            scored.append({"symbol": sym, "price": 0, "change_rate": -1e9, "error": str(e)})
-    ranked = sorted(scored, key=lambda x: x.get("change_rate", -1e9), reverse=True)
-    return ranked[: top_n]
-
-
-def parse_holdings(balance: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-    holdings_list = balance.get("output1") or []
-    holdings = {}
-    if isinstance(holdings_list, list):
-        for h in holdings_list:
-            sym = h.get("pdno")
-            if not sym:
-                continue
-            holdings[sym] = {
-                "qty": as_float(h.get("hldg_qty")),
-                "avg": as_float(h.get("pchs_avg_pric")),
-                "plrt": as_float(h.get("evlu_pfls_rt")),
-                "price": as_float(h.get("prpr")),
-            }
-    return holdings
-
-
-def parse_totals(balance: Dict[str, Any]) -> Dict[str, float]:
-    totals = {}
-    block = None
-    o2 = balance.get("output2")
-    if isinstance(o2, list) and o2:
-        block = o2[0]
-    elif isinstance(o2, dict):
-        block = o2
-    if not block:
-        return {}
-    for k in ["tot_evlu_amt", "evlu_amt_smtl_amt", "pchs_amt_smtl_amt", "dnca_tot_amt", "asst_icdc_erng_rt"]:
-        totals[k] = as_float(block.get(k))
-    return totals
+from typing import List, Dict, Any, Optional
+
+from execution import DEFAULT_FILL_TIMEOUT, DEFAULT_POLL_INTERVAL, execute_orders
+from kis_core.balance import cached_balance, fetch_orderable_cash
+from kis_core.config import DEFAULT_UNIVERSE, get_env_config, load_env
+from kis_core.quotes import fetch_prices_batch
+from kis_core.tokens import get_or_issue_token
+from metrics import write_textfile
+from positions import as_float
+
+
+def build_portfolio(
+    env: Dict[str, Any],
+    token: str,
+    universe: List[str],
+    market: str,
+    top_n: int,
+    concurrency: Optional[int] = None,
+    engine: str = "thread",
+    alloc: str = "equal",
+) -> List[Dict[str, Any]]:
+    from factors import rank_quotes
+
+    if engine == "async":
+        import asyncio
+
+        from kis_async import scan_universe
+
+        quotes = asyncio.run(scan_universe(env, token, universe, market, concurrency))
+    else:
+        quotes = fetch_prices_batch(env, token, universe, market, concurrency)
+    targets = []
+    for row in rank_quotes(quotes, top_n=top_n, alloc=alloc):
+        if "weight" not in row:
+            break
+        targets.append(
+            {"symbol": row["symbol"], "price": as_float(row["price"]), "change_rate": row["change_rate"], "score": row["score"], "weight": row["weight"]}
+        )
+    return targets
 
 
 def compute_orders(targets: List[Dict[str, Any]], holdings: Dict[str, Dict[str, Any]], equity: float) -> List[Dict[str, Any]]:
@@ -84,9 +57,9 @@ def compute_orders(targets: List[Dict[str, Any]], holdings: Dict[str, Dict[str,
     top_n = len(targets)
     if top_n == 0:
         return orders
-    weight = 1.0 / top_n
     for t in targets:
         sym = t["symbol"]
+        weight = t.get("weight") or 1.0 / top_n
         price = t.get("price") or 0
         if price <= 0:
             continue
@@ -106,26 +79,46 @@ def compute_orders(targets: List[Dict[str, Any]], holdings: Dict[str, Dict[str,
     return orders
 
 
+def price_from_depth(env: Dict[str, Any], orders: List[Dict[str, Any]], market: str, wait: float) -> None:
+    """Reprice limit orders at the live touch (buy at best ask, sell at best bid)."""
+    from orderbook import limit_price
+    from realtime import RealtimeFeed
+
+    feed = RealtimeFeed(env).start()
+    books = feed.subscribe_depth([o["symbol"] for o in orders], market)
+    deadline = time.time() + wait
+    while time.time() < deadline and any(books.get(o["symbol"]) is None for o in orders):
+        time.sleep(0.05)
+    print("\n=== Limit prices from order book ===")
+    for o in orders:
+        book = books.get(o["symbol"])
+        o["price"] = int(limit_price(book, o["side"], o["price"]))
+        source = f"bid={book.best_bid} ask={book.best_ask} spread={book.spread}" if book else "no book, last price"
+        print(f"{o['side'].upper():4} {o['symbol']} price={o['price']} ({source})")
+    feed.stop()
+
+
 def run(args: argparse.Namespace) -> None:
-    load_dotenv()
+    load_env()
     env = get_env_config(args.mode)
     token = get_or_issue_token(env, args.mode)
     if not token:
         raise RuntimeError("Failed to obtain token")
 
     universe = DEFAULT_UNIVERSE if not args.universe else [s.strip() for s in args.universe.split(",") if s.strip()]
-    targets = build_portfolio(env, token, universe, args.market, args.top_n)
+    targets = build_portfolio(env, token, universe, args.market, args.top_n, args.concurrency, args.engine, args.alloc)
 
-    balance = fetch_balance(env, token, args.mode)
-    totals = parse_totals(balance)
+    # cached unless an order or fill invalidated it or it outlived POSITION_CACHE_TTL
+    positions, cached = cached_balance(env, token, args.mode, 0 if args.refresh_balance else None)
+    holdings, totals = positions["holdings"], positions["totals"]
+    print(f"Balance {'from cache' if cached else 'loaded'} (as of {time.strftime('%H:%M:%S', time.localtime(positions['loaded_at']))})")
     equity = totals.get("tot_evlu_amt") or totals.get("evlu_amt_smtl_amt") or 0
-    holdings = parse_holdings(balance)
 
     orders = compute_orders(targets, holdings, equity)
 
     print("\n=== Portfolio targets (top momentum) ===")
     for t in targets:
-        print(f"{t['symbol']}: price={t['price']} change%={t['change_rate']}")
+        print(f"{t['symbol']}: price={t['price']} change%={t['change_rate']} score={t['score']} weight={t['weight']}")
     print("\nEquity:", equity)
 
     if not orders:
@@ -136,21 +129,38 @@ def run(args: argparse.Namespace) -> None:
     for o in orders:
         print(f"{o['side'].upper():4} {o['symbol']} qty={o['qty']} price={o['price']}")
 
+    if args.order_type == "00" and args.depth_wait > 0:
+        price_from_depth(env, orders, args.market, args.depth_wait)
+
     if args.dry_run:
         print("\nDry-run mode: no orders sent. Use --live to execute.")
         return
 
-    # Execute orders
-    for o in orders:
-        try:
-            if o["side"] == "buy":
-                resp = order_buy(env, token, o["symbol"], o["qty"], price=0 if args.order_type == "01" else o["price"], order_type=args.order_type)
-            else:
-                resp = order_sell(env, token, o["symbol"], o["qty"], price=0 if args.order_type == "01" else o["price"], order_type=args.order_type)
-            odno = resp.get("output", {}).get("ODNO")
-            print(f"Sent {o['side']} {o['symbol']} qty={o['qty']} -> ODNO={odno}")
-        except Exception as e:
-            print(f"Order failed for {o['symbol']}: {e}")
+    # Execute orders: sells first, then buys against the orderable cash plus what the sells freed
+    buys = [o for o in orders if o["side"] == "buy"]
+    cash = fetch_orderable_cash(env, token, args.mode, buys[0]["symbol"]) if buys else None
+    if cash is not None:
+        print(f"\nOrderable cash: {cash:,.0f}")
+    feed = tracker = None
+    if args.fill_notices:
+        from fills import subscribe_fills
+        from realtime import RealtimeFeed
+
+        feed = RealtimeFeed(env).start()
+        tracker = subscribe_fills(feed, env.get("hts_id", ""))
+        feed.connected.wait(5)
+    try:
+        report = execute_orders(
+            env, token, orders, args.order_type, cash, args.fill_timeout, args.poll_interval, tracker=tracker
+        )
+    finally:
+        if feed is not None:
+            feed.stop()
+    print("\n=== Execution ===")
+    for r in report["sells"] + report["buys"]:
+        detail = f"filled={r['filled_qty']}/{r['qty']} avg={r['avg_price']}" if r["odno"] else r.get("error", "")
+        print(f"{r['side'].upper():4} {r['symbol']} ODNO={r['odno']} {r['status']} {detail}")
+    print(f"Executed {len(report['sells'])} sells and {len(report['buys'])} buys in {report['seconds']}s")
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -159,8 +169,17 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--market", default="J", help="J=KRX, NX=Nextrade, UN=Unified")
     p.add_argument("--universe", help="Comma-separated symbols; if omitted, use default universe")
     p.add_argument("--top-n", type=int, default=5, help="Number of symbols to hold")
+    p.add_argument("--concurrency", type=int, help="Max quote requests in flight (default SCAN_CONCURRENCY or 8)")
+    p.add_argument("--engine", choices=["thread", "async"], default="thread", help="Quote scan engine: thread pool or asyncio/aiohttp")
+    p.add_argument("--alloc", choices=["equal", "inverse_vol"], default="equal", help="Portfolio weighting")
     p.add_argument("--order-type", default="01", choices=["00", "01"], help="00=limit, 01=market (price=0)")
+    p.add_argument("--depth-wait", type=float, default=0.0, help="With --order-type 00, seconds to wait for live order books to price limits (0=use last price)")
+    p.add_argument("--fill-timeout", type=float, default=DEFAULT_FILL_TIMEOUT, help="Seconds to wait for each wave (sells, then buys) to fill")
+    p.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between fill inquiries")
+    p.add_argument("--fill-notices", action="store_true", help="Track fills from real-time execution notices (needs HTS_ID) instead of polling")
+    p.add_argument("--refresh-balance", action="store_true", help="Reload the balance even if the position cache is fresh")
     p.add_argument("--live", action="store_true", help="Execute orders (default: dry-run)")
+    p.add_argument("--metrics-file", help="Write KIS call metrics (Prometheus text) here on exit, e.g. for node_exporter's textfile collector")
     return p
 
 
@@ -168,4 +187,8 @@ if __name__ == "__main__":
     parser = build_parser()
     args = parser.parse_args()
     args.dry_run = not args.live
-    run(args)
+    try:
+        run(args)
+    finally:
+        if args.metrics_file:
+            write_textfile(args.metrics_file)
@@ -0,0 +1,234 @@
+"""
+Backtest of auto_trader's top-N rebalance over the local OHLCV store.
+
+Scores for every rebalance date come from factors.score_panel in one
+vectorized pass (each date only sees data up to itself), then the
+simulation replays compute_orders on each rebalance: desired quantity is
+floor(equity * weight / price), picks without a price keep their shares,
+and holdings that dropped out are sold. Commission is charged on both
+sides and the transaction tax on sells; trades fill at that day's close.
+Between rebalances the equity curve is holdings @ prices, per segment.
+
+A sweep shares one set of scores across every top_n, and --workers
+spreads the runs over a process pool (workers inherit the matrices).
+
+    python backtest.py --top-n 5,10,20 --every 20 --start 20160101 --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import factors
+import history
+from costs import COMMISSION, SELL_TAX
+
+DEFAULT_EVERY = 20  # trading days between rebalances
+DEFAULT_CAPITAL = 100_000_000
+
+
+def rebalance_points(dates: np.ndarray, every: int, start: Optional[int] = None) -> np.ndarray:
+    """Column indices of rebalance days: every `every` trading days from `start` (yyyymmdd)."""
+    first = int(np.searchsorted(dates, start)) if start else 1
+    return np.arange(max(first, 1), len(dates), max(1, every), dtype=np.intp)
+
+
+def simulate(
+    prices: np.ndarray,
+    scores: np.ndarray,
+    vol: np.ndarray,
+    at: np.ndarray,
+    top_n: int,
+    alloc: str = "equal",
+    capital: float = DEFAULT_CAPITAL,
+    commission: float = COMMISSION,
+    tax: float = SELL_TAX,
+) -> Dict[str, Any]:
+    """
+    Replay the rebalance on `prices` (symbols, days; forward-filled, 0 where
+    a symbol has no price yet) at the columns `at`, with scores/vol shaped (symbols, len(at)). Returns the
+    daily equity curve from the first rebalance plus per-rebalance turnover
+    and costs.
+    """
+    n_sym, days = prices.shape
+    px_all = prices
+    qty = np.zeros(n_sym)
+    cash = float(capital)
+    holdings = np.zeros((len(at), n_sym))
+    cash_after = np.zeros(len(at))
+    turnover = np.zeros(len(at))
+    costs = np.zeros(len(at))
+    for k, t in enumerate(at):
+        px = px_all[:, t]
+        equity = cash + qty @ px
+        new = qty.copy()
+        if equity > 0:
+            score = scores[:, k]
+            rankable = np.flatnonzero(~np.isnan(score))
+            picks = rankable[np.argsort(-score[rankable], kind="stable")][:top_n]
+            weights = factors.weights_for(picks, vol[:, k], alloc)
+            priced = px[picks] > 0
+            new[:] = 0.0
+            new[picks] = qty[picks]
+            new[picks[priced]] = np.floor(equity * weights[priced] / px[picks[priced]])
+        trade = new - qty
+        notional = np.abs(trade) * px
+        cost = commission * notional.sum() + tax * notional[trade < 0].sum()
+        cash -= trade @ px + cost
+        qty = new
+        holdings[k] = qty
+        cash_after[k] = cash
+        turnover[k] = notional.sum() / equity if equity > 0 else 0.0
+        costs[k] = cost
+
+    equity_curve = np.empty(days - at[0])
+    bounds = list(at) + [days]
+    for k in range(len(at)):
+        a, b = bounds[k], bounds[k + 1]
+        equity_curve[a - at[0]:b - at[0]] = cash_after[k] + holdings[k] @ px_all[:, a:b]
+    return {"equity": equity_curve, "turnover": turnover, "costs": costs, "holdings": holdings}
+
+
+def summarize(result: Dict[str, Any], capital: float, every: int) -> Dict[str, float]:
+    equity = result["equity"]
+    years = max(len(equity) / factors.TRADING_DAYS, 1e-9)
+    daily = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+    peak = np.maximum.accumulate(equity)
+    sharpe = float(daily.mean() / daily.std() * np.sqrt(factors.TRADING_DAYS)) if daily.size and daily.std() > 0 else 0.0
+    return {
+        "final_equity": round(float(equity[-1]), 0),
+        "total_return": round(float(equity[-1] / capital - 1), 4),
+        "cagr": round(float((equity[-1] / capital) ** (1 / years) - 1), 4) if equity[-1] > 0 else -1.0,
+        "max_drawdown": round(float((equity / peak - 1).min()), 4),
+        "sharpe": round(sharpe, 3),
+        "avg_turnover": round(float(result["turnover"].mean()), 4),
+        "annual_turnover": round(float(result["turnover"].sum() / years), 3),
+        "total_costs": round(float(result["costs"].sum()), 0),
+        "rebalances": int(len(result["turnover"])),
+        "every": every,
+    }
+
+
+# worker state for the process pool; set once per worker by _init_worker (inherited on fork)
+_SHARED: Dict[str, Any] = {}
+
+
+def _init_worker(shared: Dict[str, Any]) -> None:
+    _SHARED.update(shared)
+
+
+def _run_one(job: Dict[str, Any]) -> Dict[str, Any]:
+    prepared = _SHARED["prepared"][job["every"]]
+    result = simulate(
+        _SHARED["prices"], prepared["score"], prepared["vol"], prepared["at"], job["top_n"],
+        job["alloc"], job["capital"], job["commission"], job["tax"],
+    )
+    return {**job, "summary": summarize(result, job["capital"], job["every"]), "equity": result["equity"]}
+
+
+def sweep(
+    dates: np.ndarray,
+    closes: np.ndarray,
+    values: Optional[np.ndarray],
+    top_ns: Sequence[int],
+    everys: Sequence[int] = (DEFAULT_EVERY,),
+    start: Optional[int] = None,
+    alloc: str = "equal",
+    capital: float = DEFAULT_CAPITAL,
+    commission: float = COMMISSION,
+    tax: float = SELL_TAX,
+    workers: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Backtest every (top_n, every) combination. Scores are computed once per
+    rebalance schedule and shared by all top_n runs; with workers > 1 the runs
+    go to a process pool.
+    """
+    prices = factors._ffill(np.asarray(closes, dtype=np.float64))
+    prepared = {}
+    for every in everys:
+        at = rebalance_points(dates, every, start)
+        if not len(at):
+            raise ValueError("no rebalance dates in range")
+        scored = factors.score_panel(prices, at, values)
+        prepared[every] = {"at": at, "score": scored["score"], "vol": scored["vol"]}
+    jobs = [
+        {"top_n": n, "every": every, "alloc": alloc, "capital": capital, "commission": commission, "tax": tax}
+        for every in everys
+        for n in top_ns
+    ]
+    shared = {"prices": np.nan_to_num(prices), "prepared": prepared}
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+            results = list(pool.map(_run_one, jobs))
+    else:
+        _init_worker(shared)
+        results = [_run_one(job) for job in jobs]
+    for r in results:
+        r["dates"] = dates[prepared[r["every"]]["at"][0]:]
+    return results
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Backtest the top-N momentum rebalance on stored daily history")
+    p.add_argument("--symbols", help="Comma-separated symbols (default: every symbol in the OHLCV store)")
+    p.add_argument("--top-n", default="5", help="Comma-separated top_n values to sweep")
+    p.add_argument("--every", default=str(DEFAULT_EVERY), help="Comma-separated rebalance intervals in trading days")
+    p.add_argument("--start", type=int, help="First rebalance day yyyymmdd (earlier history is warm-up)")
+    p.add_argument("--alloc", choices=["equal", "inverse_vol"], default="equal")
+    p.add_argument("--capital", type=float, default=DEFAULT_CAPITAL)
+    p.add_argument("--commission", type=float, default=COMMISSION, help="Per-side commission rate")
+    p.add_argument("--tax", type=float, default=SELL_TAX, help="Sell-side transaction tax rate")
+    p.add_argument("--workers", type=int, default=1, help="Processes for the sweep (0 = CPU count)")
+    p.add_argument("--out", help="Write summaries and equity curves as JSON")
+    args = p.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else history.stored_symbols()
+    if not symbols:
+        raise SystemExit(f"no history in {history.history_dir()}; run history.py first")
+    t0 = time.perf_counter()
+    dates, closes = history.load_panel(symbols, history.CLOSE)
+    _, values = history.load_panel(symbols, history.VALUE)
+    t1 = time.perf_counter()
+    results = sweep(
+        dates, closes, values, _int_list(args.top_n), _int_list(args.every), args.start,
+        args.alloc, args.capital, args.commission, args.tax, args.workers or os.cpu_count() or 1,
+    )
+    t2 = time.perf_counter()
+
+    print(f"{len(symbols)} symbols x {len(dates)} days; load {t1 - t0:.2f}s, backtest {t2 - t1:.2f}s")
+    print(f"{'top_n':>5} {'every':>5} {'total':>8} {'cagr':>7} {'mdd':>7} {'sharpe':>6} {'turn/yr':>7} {'costs':>12}")
+    for r in results:
+        s = r["summary"]
+        print(
+            f"{r['top_n']:>5} {r['every']:>5} {s['total_return']:>8.2%} {s['cagr']:>7.2%} {s['max_drawdown']:>7.2%} "
+            f"{s['sharpe']:>6.2f} {s['annual_turnover']:>7.2f} {s['total_costs']:>12,.0f}"
+        )
+    if args.out:
+        payload = [
+            {
+                "top_n": r["top_n"],
+                "every": r["every"],
+                "alloc": r["alloc"],
+                "summary": r["summary"],
+                "dates": [int(d) for d in r["dates"]],
+                "equity": [round(float(e), 0) for e in r["equity"]],
+            }
+            for r in results
+        ]
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
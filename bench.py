@@ -0,0 +1,282 @@
+"""
+Offline benchmarks against the local KIS stand-in (kis_standin.py).
+
+Cases:
+  scan-<mode>-<engine>-<n>   POST /api/portfolio over n explicit symbols
+                             (paper: one inquire-price per symbol,
+                             prod: intstock-multprice chunks of 30)
+  balance-cold / -cached     cached_balance reload vs position-cache hit
+  orders-<n>                 execution.execute_orders, n/2 sells then n/2 buys
+  rebalance                  auto_trader.run --live end to end
+
+Each case reports min/median/p95/max seconds and items per second; the
+results and the run's settings go to --out as JSON, and --compare prints
+the median change against an earlier file (exit 1 past --threshold):
+
+    python bench.py --latency 0.02 --jitter 0.005 --out bench.json
+    python bench.py --latency 0.02 --jitter 0.005 --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from kis_standin import Account, StandIn
+
+DEFAULT_SIZES = "25,200,2500"
+
+
+def summarize(samples: List[float], items: int) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "runs": len(ordered),
+        "items": items,
+        "min": round(ordered[0], 4),
+        "median": round(median, 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 4),
+        "max": round(ordered[-1], 4),
+        "throughput": round(items / median, 1) if median > 0 else None,
+    }
+
+
+def measure(name: str, fn: Callable[[], int], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Time fn() repeat times (setup() runs untimed before each); fn returns the item count."""
+    samples, items = [], 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        items = fn()
+        samples.append(time.perf_counter() - started)
+    result = summarize(samples, items)
+    print(f"{name:28} median={result['median']:.3f}s p95={result['p95']:.3f}s ({result['throughput']}/s)")
+    return result
+
+
+def configure(args: argparse.Namespace, base: str, workdir: str) -> None:
+    """Point the app at the stand-in; must run before app is imported."""
+    client_rate = str(args.client_rate or (args.rate if args.rate > 0 else 10000))
+    os.environ.update(
+        {
+            "BASE_PAPER": base,
+            "BASE_PROD": base,
+            "APP_KEY": "bench-prod",
+            "APP_SECRET": "bench",
+            "PAPER_APP_KEY": "bench-paper",
+            "PAPER_APP_SECRET": "bench",
+            "ACCT_STOCK": "50000000",
+            "PAPER_ACCT_STOCK": "50000000",
+            "KIS_TOKEN_STORE": os.path.join(workdir, "tokens.db"),
+            "POSITION_CACHE": os.path.join(workdir, "positions.db"),
+            "HISTORY_DIR": os.path.join(workdir, "history"),
+            "QUOTE_CACHE_TTL": "0",
+            "SNAPSHOT_INTERVAL": "0",
+        }
+    )
+    for mode in ("PAPER", "PROD"):
+        for kind in ("QUOTE", "TRADE"):
+            os.environ[f"KIS_RATE_{mode}_{kind}"] = client_rate
+
+
+def bench_scans(args: argparse.Namespace, client) -> Dict[str, Any]:
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        symbols = [f"{100000 + i * 37:06d}" for i in range(size)]
+        for mode in args.modes.split(","):
+            for engine in args.engines.split(","):
+                os.environ["SCAN_ENGINE"] = engine
+
+                def scan() -> int:
+                    resp = client.post(
+                        "/api/portfolio",
+                        json={"symbols": symbols, "mode": mode, "use_system": False, "top_n": 5, "concurrency": args.concurrency},
+                    )
+                    if not resp.get_json().get("success"):
+                        raise RuntimeError(f"scan failed: {resp.get_json()}")
+                    return size
+
+                results[f"scan-{mode}-{engine}-{size}"] = measure(f"scan-{mode}-{engine}-{size}", scan, args.repeat)
+    os.environ.pop("SCAN_ENGINE", None)
+    return results
+
+
+def bench_balance(args: argparse.Namespace, standin: StandIn) -> Dict[str, Any]:
+    from kis_core.balance import cached_balance
+    from kis_core.config import get_env_config
+    from kis_core.tokens import get_or_issue_token
+
+    env = get_env_config("paper")
+    token = get_or_issue_token(env, "paper")
+    holdings = len(standin.account.holdings)
+
+    def cold() -> int:
+        cached_balance(env, token, "paper", 0)
+        return holdings
+
+    def cached() -> int:
+        cached_balance(env, token, "paper")
+        return holdings
+
+    cached_balance(env, token, "paper", 0)
+    return {
+        "balance-cold": measure("balance-cold", cold, args.repeat),
+        "balance-cached": measure("balance-cached", cached, args.repeat),
+    }
+
+
+def bench_orders(args: argparse.Namespace, standin: StandIn) -> Dict[str, Any]:
+    from execution import execute_orders
+    from kis_core.config import get_env_config
+    from kis_core.tokens import get_or_issue_token
+
+    env = get_env_config("paper")
+    token = get_or_issue_token(env, "paper")
+
+    def reset() -> None:
+        standin.account = Account(args.holdings, fill_delay=args.fill_delay)
+
+    def wave() -> int:
+        held = sorted(standin.account.holdings)
+        half = args.orders // 2
+        orders = [{"side": "sell", "symbol": s, "qty": 1, "price": 0} for s in held[:half]]
+        orders += [{"side": "buy", "symbol": f"{200000 + i:06d}", "qty": 1, "price": 10000} for i in range(args.orders - len(orders))]
+        report = execute_orders(env, token, orders, "01", None, 30.0, args.poll_interval)
+        done = [r for r in report["sells"] + report["buys"] if r["status"] == "filled"]
+        if len(done) != len(orders):
+            raise RuntimeError(f"{len(orders) - len(done)} orders not filled")
+        return len(orders)
+
+    return {f"orders-{args.orders}": measure(f"orders-{args.orders}", wave, args.repeat, reset)}
+
+
+def bench_rebalance(args: argparse.Namespace, standin: StandIn) -> Dict[str, Any]:
+    import auto_trader
+
+    universe = ",".join(f"{300000 + i * 11:06d}" for i in range(200))
+    run_args = auto_trader.build_parser().parse_args(
+        ["--mode", "paper", "--universe", universe, "--live", "--refresh-balance", "--poll-interval", str(args.poll_interval)]
+    )
+    run_args.dry_run = False
+
+    def reset() -> None:
+        standin.account = Account(args.holdings, fill_delay=args.fill_delay)
+
+    def rebalance() -> int:
+        auto_trader.run(run_args)
+        return 200
+
+    return {"rebalance": measure("rebalance", rebalance, args.repeat, reset)}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(results: Dict[str, Any], path: str, threshold: float) -> int:
+    """Print median changes against an earlier results file; returns the number of regressions."""
+    with open(path, encoding="utf-8") as f:
+        before = json.load(f).get("results", {})
+    regressions = 0
+    print(f"\n=== vs {path} (median) ===")
+    for name, now in results.items():
+        old = before.get(name)
+        if not old or not old.get("median"):
+            print(f"{name:28} {now['median']:.3f}s (new)")
+            continue
+        change = now["median"] / old["median"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:28} {old['median']:.3f}s -> {now['median']:.3f}s ({change:+.1%}){flag}")
+    return regressions
+
+
+def run(args: argparse.Namespace) -> int:
+    standin = StandIn(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate=args.rate,
+        account=Account(args.holdings, fill_delay=args.fill_delay),
+        seed=args.seed,
+    ).start()
+    with tempfile.TemporaryDirectory(prefix="kis-bench-") as workdir:
+        configure(args, standin.url, workdir)
+        import app  # noqa: E402 - reads the environment set by configure()
+
+        client = app.app.test_client()
+        results: Dict[str, Any] = {}
+        cases = args.cases.split(",")
+        if "scan" in cases:
+            results.update(bench_scans(args, client))
+        if "balance" in cases:
+            results.update(bench_balance(args, standin))
+        if "orders" in cases:
+            results.update(bench_orders(args, standin))
+        if "rebalance" in cases:
+            results.update(bench_rebalance(args, standin))
+    standin.stop()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "standin": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate, "rate": args.rate, "fill_delay": args.fill_delay},
+            "server": standin.counts,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Offline benchmarks against the KIS stand-in server")
+    p.add_argument("--cases", default="scan,balance,orders,rebalance", help="Comma-separated: scan, balance, orders, rebalance")
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help="Universe sizes for the scan cases")
+    p.add_argument("--modes", default="paper,prod", help="Modes for the scan cases")
+    p.add_argument("--engines", default="thread,async", help="Scan engines (SCAN_ENGINE)")
+    p.add_argument("--concurrency", type=int, default=8, help="Quote requests in flight per scan")
+    p.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    p.add_argument("--orders", type=int, default=10, help="Orders per wave case")
+    p.add_argument("--holdings", type=int, default=30, help="Positions in the simulated account")
+    p.add_argument("--poll-interval", type=float, default=0.1, help="Fill inquiry interval for order cases")
+    p.add_argument("--latency", type=float, default=0.0, help="Stand-in seconds per call")
+    p.add_argument("--jitter", type=float, default=0.0, help="Stand-in +/- seconds around latency")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Stand-in fraction of HTTP 500s")
+    p.add_argument("--rate", type=float, default=0.0, help="Stand-in calls/s per appkey before EGW00201 (0 = unlimited)")
+    p.add_argument("--client-rate", type=float, help="Client rate limit for every mode/kind (default --rate, else unlimited)")
+    p.add_argument("--fill-delay", type=float, default=0.2, help="Stand-in seconds until an order fills")
+    p.add_argument("--seed", type=int, default=1, help="Stand-in jitter/error seed")
+    p.add_argument("--out", help="Write results JSON here")
+    p.add_argument("--compare", help="Earlier results JSON to compare medians against")
+    p.add_argument("--threshold", type=float, default=0.2, help="Median slowdown (fraction) counted as a regression")
+    return p
+
+
+if __name__ == "__main__":
+    sys.exit(run(build_parser().parse_args()))
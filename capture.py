@@ -0,0 +1,241 @@
+"""
+Record/replay of KIS REST traffic for offline runs.
+
+KIS_CAPTURE=path records every request/response the clients make to an
+append-only gzip file of JSON lines (one gzip member per process, flushed
+after each record so a crash loses at most the record in flight):
+
+    {"t": time, "m": method, "p": path, "tr": tr_id, "c": tr_cont,
+     "q": params, "b": body, "s": status, "h": {"tr_cont": ...}, "r": response}
+
+Headers other than tr_id/tr_cont are never written (appkey, appsecret and
+the bearer token live there), and bodies go through the same masking as
+API output plus the account fields. KIS_REPLAY=path serves those
+responses back instead of the network: no sockets, no rate limiter. A
+request is matched on method, path, tr_id, tr_cont and its params/body
+minus the account and date fields; repeats of one request step through
+the recorded answers in order and then keep returning the last one, and
+an unmatched request gets HTTP 404 with msg_cd REPLAY404.
+"""
+
+import atexit
+import gzip
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, DefaultDict, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import orjson
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from responses import SENSITIVE_KEYS, MaskPlan
+
+CAPTURE_MASK = MaskPlan(SENSITIVE_KEYS + ("approval_key", "secretkey", "cano", "ctx_area_fk100"))
+# left out of the match key: account, dates and the account-echoing continuation key
+UNMATCHED_FIELDS = frozenset(
+    ("CANO", "ACNT_PRDT_CD", "CTX_AREA_FK100", "INQR_STRT_DT", "INQR_END_DT", "appkey", "appsecret", "token")
+)
+NOT_RECORDED = {"rt_cd": "1", "msg_cd": "REPLAY404", "msg1": "no recorded response for this request"}
+
+MatchKey = Tuple[str, str, str, str, bytes]
+
+
+def match_key(method: str, path: str, tr_id: Optional[str], tr_cont: Optional[str], params: Any, body: Any) -> MatchKey:
+    fields: Dict[str, Any] = {}
+    for source in (params, body):
+        if isinstance(source, dict):
+            fields.update((k, str(v)) for k, v in source.items() if k not in UNMATCHED_FIELDS)
+    return method.upper(), path, tr_id or "", tr_cont or "", orjson.dumps(fields, option=orjson.OPT_SORT_KEYS)
+
+
+def _json(raw: Any) -> Any:
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+
+
+class CaptureWriter:
+    """Appends masked records to one gzip member; safe to share between threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "ab")
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def write(
+        self,
+        method: str,
+        path: str,
+        tr_id: Optional[str],
+        tr_cont: Optional[str],
+        params: Any,
+        body: Any,
+        status: int,
+        resp_tr_cont: Optional[str],
+        response: Any,
+    ) -> None:
+        record = {
+            "t": round(time.time(), 3),
+            "m": method.upper(),
+            "p": path,
+            "tr": tr_id or "",
+            "c": tr_cont or "",
+            "q": CAPTURE_MASK.mask(params) if params else None,
+            "b": CAPTURE_MASK.mask(body) if body else None,
+            "s": status,
+            "h": {"tr_cont": resp_tr_cont} if resp_tr_cont else {},
+            "r": CAPTURE_MASK.mask(response),
+        }
+        line = orjson.dumps(record) + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path: Path) -> List[Dict[str, Any]]:
+    """All records of a capture file; a truncated last record (killed writer) is dropped."""
+    records = []
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    break
+        except EOFError:
+            pass
+    return records
+
+
+class ReplayStore:
+    """Recorded responses by match key, served in recorded order (then the last one again)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.responses: DefaultDict[MatchKey, List[Dict[str, Any]]] = defaultdict(list)
+        for rec in read_capture(self.path):
+            key = match_key(rec["m"], rec["p"], rec["tr"], rec.get("c"), rec.get("q"), rec.get("b"))
+            self.responses[key].append(rec)
+        self._cursor: Dict[MatchKey, int] = {}
+        self._lock = threading.Lock()
+        self.served = 0
+        self.missed = 0
+
+    def lookup(self, method: str, path: str, tr_id: Optional[str], tr_cont: Optional[str], params: Any, body: Any) -> Tuple[int, Dict[str, str], Any]:
+        """(status, response headers, decoded body) for a request."""
+        key = match_key(method, path, tr_id, tr_cont, params, body)
+        with self._lock:
+            recorded = self.responses.get(key)
+            if not recorded:
+                self.missed += 1
+                return 404, {}, NOT_RECORDED
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = min(i + 1, len(recorded) - 1)
+            self.served += 1
+        rec = recorded[i]
+        return rec["s"], rec.get("h") or {}, rec["r"]
+
+
+def _split(request: requests.PreparedRequest) -> Tuple[str, Dict[str, str], Any]:
+    url = urlsplit(request.url)
+    body = request.body.encode() if isinstance(request.body, str) else request.body
+    return url.path, dict(parse_qsl(url.query, keep_blank_values=True)), _json(body)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that also appends each exchange to a CaptureWriter."""
+
+    def __init__(self, writer: CaptureWriter, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        resp = super().send(request, **kwargs)
+        path, params, body = _split(request)
+        try:
+            self.writer.write(
+                request.method or "GET",
+                path,
+                request.headers.get("tr_id"),
+                request.headers.get("tr_cont"),
+                params,
+                body,
+                resp.status_code,
+                resp.headers.get("tr_cont"),
+                _json(resp.content),
+            )
+        except Exception as e:
+            print(f"Capture write failed: {e}")
+        return resp
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport that answers from a ReplayStore without touching the network."""
+
+    def __init__(self, store: ReplayStore):
+        super().__init__()
+        self.store = store
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        path, params, body = _split(request)
+        status, headers, data = self.store.lookup(
+            request.method or "GET", path, request.headers.get("tr_id"), request.headers.get("tr_cont"), params, body
+        )
+        resp = requests.Response()
+        resp.status_code = status
+        resp.reason = "OK" if status < 400 else "Replay"
+        resp._content = orjson.dumps(data)
+        resp.headers = CaseInsensitiveDict({"Content-Type": "application/json; charset=utf-8", **headers})
+        resp.encoding = "utf-8"
+        resp.url = request.url or ""
+        resp.request = request
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+_WRITERS: Dict[str, CaptureWriter] = {}
+_STORES: Dict[str, ReplayStore] = {}
+_LOCK = threading.Lock()
+
+
+def get_writer(path: str) -> CaptureWriter:
+    """Process-wide writer per capture path."""
+    with _LOCK:
+        writer = _WRITERS.get(path)
+        if writer is None:
+            if not _WRITERS:
+                atexit.register(close_writers)
+            writer = _WRITERS[path] = CaptureWriter(Path(path).expanduser())
+        return writer
+
+
+def get_replay(path: str) -> ReplayStore:
+    """Process-wide replay store per capture path (loaded once)."""
+    with _LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = ReplayStore(Path(path).expanduser())
+        return store
+
+
+def close_writers() -> None:
+    with _LOCK:
+        for writer in _WRITERS.values():
+            writer.close()
+        _WRITERS.clear()
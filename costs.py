@@ -0,0 +1,4 @@
+"""Domestic stock trading costs shared by live execution and the backtester."""
+
+COMMISSION = 0.00015  # per side, on traded notional
+SELL_TAX = 0.0018  # 증권거래세 + 농특세, sells only
@@ -0,0 +1,199 @@
+"""
+Order execution for a rebalance: sells first, then buys sized to the cash they freed.
+
+Each wave submits its orders concurrently (the appkey's trade rate limiter
+paces them), then polls inquire-daily-ccld until every order of the wave
+is filled, rejected or closed, or fill_timeout runs out. One inquiry
+covers the whole wave, so polling costs one call per interval however
+many orders are open. With a fills.FillTracker the wave waits on pushed
+fill notices instead, and only orders without a closing notice get a
+final inquiry. When cash is given, buys are scaled down to what the
+starting orderable cash plus filled sell proceeds can pay for.
+"""
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from costs import COMMISSION, SELL_TAX
+from kis_client import CCLD_PATH, ccld_params, ccld_tr_id, get_client
+from kis_core.orders import order_buy, order_sell
+
+if TYPE_CHECKING:
+    from fills import FillTracker
+
+DEFAULT_FILL_TIMEOUT = 30.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_WORKERS = 8
+BUY_BUFFER = 0.01  # headroom for market buys filling above the last price
+
+
+def _num(val: Any) -> float:
+    try:
+        return float(str(val).replace(",", ""))
+    except Exception:
+        return 0.0
+
+
+def _odno_key(odno: Any) -> str:
+    # order-cash and inquire-daily-ccld do not agree on zero padding
+    return str(odno or "").lstrip("0")
+
+
+def submit_order(env: Dict[str, Any], token: str, order: Dict[str, Any], order_type: str = "01") -> Dict[str, Any]:
+    """
+    Send one order through kis_core.orders (which marks cached positions stale
+    even when the call fails); returns the order plus odno and status 'sent',
+    'rejected' or 'failed'.
+    """
+    result = dict(order, odno=None, status="failed", filled_qty=0, avg_price=0.0)
+    place = order_buy if order["side"] == "buy" else order_sell
+    try:
+        price = 0 if order_type == "01" else int(order["price"])
+        resp = place(env, token, order["symbol"], order["qty"], price, order_type)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    odno = (resp.get("output") or {}).get("ODNO")
+    if resp.get("rt_cd", "0") != "0" or not odno:
+        result["status"] = "rejected"
+        result["error"] = f"{resp.get('msg_cd', '')} {resp.get('msg1', '')}".strip()
+    else:
+        result["odno"] = odno
+        result["status"] = "sent"
+    return result
+
+
+def submit_wave(
+    env: Dict[str, Any], token: str, orders: List[Dict[str, Any]], order_type: str = "01", workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Submit orders concurrently; results keep the input order."""
+    if not orders:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(orders), workers or DEFAULT_WORKERS))) as pool:
+        return list(pool.map(lambda o: submit_order(env, token, o, order_type), orders))
+
+
+def fetch_fills(env: Dict[str, Any], token: str, side: str = "00") -> Dict[str, Dict[str, Any]]:
+    """Today's orders from inquire-daily-ccld (all pages), keyed by unpadded odno."""
+    params = ccld_params(env, time.strftime("%Y%m%d"), side)
+    rows = {}
+    for page in get_client(env).pages(CCLD_PATH, ccld_tr_id(env.get("name", "")), token, params):
+        for row in page.get("output1") or []:
+            rows[_odno_key(row.get("odno"))] = row
+    return rows
+
+
+def apply_fill(result: Dict[str, Any], row: Dict[str, Any]) -> None:
+    """Update a sent order from its ccld row; status becomes filled/partial/rejected when it is closed."""
+    ordered = _num(row.get("ord_qty")) or result["qty"]
+    filled = _num(row.get("tot_ccld_qty"))
+    result["filled_qty"] = int(filled)
+    result["avg_price"] = _num(row.get("avg_prvs"))
+    result["filled_amount"] = _num(row.get("tot_ccld_amt"))
+    if filled >= ordered:
+        result["status"] = "filled"
+    elif _num(row.get("rjct_qty")) > 0 or row.get("cncl_yn") == "Y" or _num(row.get("rmn_qty")) <= 0 < filled:
+        result["status"] = "partial" if filled > 0 else "rejected"
+
+
+def apply_notice(result: Dict[str, Any], state: Dict[str, Any]) -> None:
+    """Update a sent order from its fills.FillTracker state."""
+    result["filled_qty"] = state["filled_qty"]
+    result["avg_price"] = state["avg_price"]
+    result["filled_amount"] = state["filled_qty"] * state["avg_price"]
+    if state["status"] == "filled":
+        result["status"] = "filled"
+    elif state["status"] in ("rejected", "cancelled"):
+        result["status"] = "partial" if state["filled_qty"] > 0 else "rejected"
+
+
+def wait_fills(
+    env: Dict[str, Any],
+    token: str,
+    results: List[Dict[str, Any]],
+    side: str = "00",
+    timeout: float = DEFAULT_FILL_TIMEOUT,
+    interval: float = DEFAULT_POLL_INTERVAL,
+    tracker: Optional["FillTracker"] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Poll until no sent order is open or timeout elapses. Orders still open
+    at the deadline are left with status 'sent' and whatever filled so far.
+    With a tracker, wait on fill notices first; the deadline then allows one
+    reconciling inquiry for orders that never got a closing notice.
+    """
+    deadline = time.time() + timeout
+    if tracker is not None:
+        for r in results:
+            if r["status"] == "sent":
+                state = tracker.wait(r["odno"], max(0.0, deadline - time.time()))
+                if state is not None:
+                    apply_notice(r, state)
+    while True:
+        pending = [r for r in results if r["status"] == "sent"]
+        if not pending:
+            break
+        try:
+            rows = fetch_fills(env, token, side)
+        except Exception as e:
+            print(f"Fill inquiry failed: {e}")
+            rows = {}
+        for r in pending:
+            row = rows.get(_odno_key(r["odno"]))
+            if row is not None:
+                apply_fill(r, row)
+        if time.time() + interval > deadline or not any(r["status"] == "sent" for r in results):
+            break
+        time.sleep(interval)
+    return results
+
+
+def sell_proceeds(results: List[Dict[str, Any]]) -> float:
+    """Cash freed by filled sells, net of commission and transaction tax."""
+    gross = sum(r.get("filled_amount") or r["filled_qty"] * r["avg_price"] for r in results)
+    return gross * (1 - COMMISSION - SELL_TAX)
+
+
+def scale_buys(buys: List[Dict[str, Any]], budget: float) -> List[Dict[str, Any]]:
+    """Shrink buy quantities proportionally so their estimated cost fits budget; drops orders that round to 0."""
+    cost = sum(o["qty"] * o["price"] for o in buys) * (1 + COMMISSION + BUY_BUFFER)
+    if cost <= budget:
+        return buys
+    factor = max(budget, 0.0) / cost
+    scaled = [dict(o, qty=math.floor(o["qty"] * factor)) for o in buys]
+    return [o for o in scaled if o["qty"] > 0]
+
+
+def execute_orders(
+    env: Dict[str, Any],
+    token: str,
+    orders: List[Dict[str, Any]],
+    order_type: str = "01",
+    cash: Optional[float] = None,
+    fill_timeout: float = DEFAULT_FILL_TIMEOUT,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    workers: Optional[int] = None,
+    tracker: Optional["FillTracker"] = None,
+) -> Dict[str, Any]:
+    """
+    Run sells as one concurrent wave and wait for their fills, then size
+    and submit the buys as a second wave and wait for those. cash should be
+    the orderable cash (ord_psbl_cash, see kis_core.balance.fetch_orderable_cash),
+    not the deposit total, which counts unsettled sells and pending buys.
+    Returns {"sells": [...], "buys": [...], "seconds": float}.
+    """
+    started = time.time()
+    sells = [o for o in orders if o["side"] == "sell"]
+    buys = [o for o in orders if o["side"] == "buy"]
+
+    sold = wait_fills(env, token, submit_wave(env, token, sells, order_type, workers), "01", fill_timeout, poll_interval, tracker)
+    if cash is not None and buys:
+        budget = cash + sell_proceeds(sold)
+        sized = scale_buys(buys, budget)
+        if sized is not buys:
+            print(f"Scaled buys to available cash {budget:,.0f}")
+        buys = sized
+    bought = wait_fills(env, token, submit_wave(env, token, buys, order_type, workers), "02", fill_timeout, poll_interval, tracker)
+    return {"sells": sold, "buys": bought, "seconds": round(time.time() - started, 3)}
@@ -0,0 +1,331 @@
+"""
+Vectorized cross-sectional momentum scoring.
+
+score_prices takes a (symbols, days) close matrix, oldest day first, plus
+an optional matching traded-value matrix. It computes every factor for
+the whole universe in one NumPy pass:
+
+  ret_<n>   simple return over n trading days, for each n in LOOKBACKS
+  mom_skip  return from -SKIP_LONG to -SKIP_RECENT days (12-1 style, skips the last month)
+  vol_mom   mom_skip divided by annualized daily volatility
+  liquidity symbols whose median daily traded value over LIQUIDITY_WINDOW
+            is under min_value are excluded
+
+score_panel evaluates the same factors as of many dates at once (each
+date only sees data up to itself), which is what backtest.py replays;
+score_prices is the single-date case for live ranking.
+
+Each factor is z-scored across the universe and the composite is the
+mean of the z-scores a symbol has, so names with shorter history are
+still ranked on what is available. With only today's quote (two price
+columns) the composite reduces to the one-day change rate, which is
+what the rankers used before history existed.
+
+rank_quotes is the glue used by /api/recommend, /api/portfolio and
+auto_trader: it turns fetch_prices_batch results plus the local OHLCV
+store (history.py) into ranked rows with scores and weights.
+"""
+
+import datetime as dt
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import history
+
+LOOKBACKS = (5, 20, 60, 120)
+SKIP_RECENT = 20
+SKIP_LONG = 250
+VOL_WINDOW = 60
+LIQUIDITY_WINDOW = 20
+TRADING_DAYS = 252
+DEFAULT_MIN_VALUE = 1e9  # KRW of median daily traded value
+
+
+def min_traded_value() -> float:
+    return float(os.getenv("FACTOR_MIN_VALUE", DEFAULT_MIN_VALUE))
+
+
+def _ffill(prices: np.ndarray) -> np.ndarray:
+    """Carry the last valid price forward along each row (suspensions, missing days)."""
+    valid = ~np.isnan(prices)
+    if valid.all():
+        return prices
+    idx = np.where(valid, np.arange(prices.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = prices[np.arange(prices.shape[0])[:, None], idx]
+    filled[~np.maximum.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+
+def _ret(prices: np.ndarray, at: np.ndarray, back: int, recent: int = 0) -> np.ndarray:
+    """prices[at-recent] / prices[at-back] - 1 -> (symbols, len(at)); NaN where history is too short."""
+    base = at - back
+    ok = base >= 0
+    out = np.full((prices.shape[0], len(at)), np.nan)
+    if ok.any():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[:, ok] = prices[:, at[ok] - recent] / prices[:, base[ok]] - 1.0
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+    """Cross-sectional z-score of (symbols, dates); a date with <2 values or no spread scores 0."""
+    valid = ~np.isnan(x)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(x, axis=0) / counts
+        std = np.sqrt(np.nansum((x - mean) ** 2, axis=0) / counts)
+        z = (x - mean) / std
+    flat = (counts < 2) | ~(std > 0)
+    z[:, flat] = 0.0
+    z[~valid] = np.nan
+    return z
+
+
+def _rolling_vol(prices: np.ndarray, at: np.ndarray, window: int) -> np.ndarray:
+    """Annualized stdev of the `window` daily log returns ending at each `at` (needs >=2)."""
+    if len(at) * window <= 4 * prices.shape[1]:
+        # few dates: gather just their windows
+        cols = at[:, None] + np.arange(-window, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.log(prices[:, np.maximum(cols, 0)])
+        logs[:, cols < 0] = np.nan
+        with np.errstate(invalid="ignore"):
+            daily = np.diff(logs, axis=2)
+        finite = np.isfinite(daily)
+        n = finite.sum(axis=2)
+        daily = np.where(finite, daily, 0.0)
+        s = daily.sum(axis=2)
+        sq = (daily * daily).sum(axis=2)
+    else:
+        # many dates: running sums over the whole matrix
+        with np.errstate(divide="ignore", invalid="ignore"):
+            daily = np.diff(np.log(prices), axis=1)
+        finite = np.isfinite(daily)
+        daily = np.where(finite, daily, 0.0)
+        shape = (prices.shape[0], prices.shape[1])
+        total, squares, counts = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        np.cumsum(daily, axis=1, out=total[:, 1:])
+        np.cumsum(daily * daily, axis=1, out=squares[:, 1:])
+        np.cumsum(finite, axis=1, out=counts[:, 1:])
+        lo = np.maximum(at - window, 0)
+        n = counts[:, at] - counts[:, lo]
+        s = total[:, at] - total[:, lo]
+        sq = squares[:, at] - squares[:, lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (sq - s * s / n) / (n - 1)
+        vol = np.sqrt(np.maximum(var, 0.0)) * np.sqrt(TRADING_DAYS)
+    vol[(n < 2) | ~(vol > 0)] = np.nan
+    return vol
+
+
+def _rolling_median(values: np.ndarray, at: np.ndarray, window: int, block: int = 64) -> np.ndarray:
+    """Median of the `window` values ending at each `at`, ignoring NaN; (symbols, len(at))."""
+    out = np.full((values.shape[0], len(at)), np.nan)
+    offsets = np.arange(1 - window, 1)
+    for start in range(0, len(at), block):
+        cols = at[start:start + block, None] + offsets
+        windows = values[:, np.maximum(cols, 0)]
+        windows[:, cols < 0] = np.nan
+        has = ~np.isnan(windows).all(axis=2)
+        if has.all():
+            out[:, start:start + block] = np.nanmedian(windows, axis=2)
+        elif has.any():
+            out[:, start:start + block][has] = np.nanmedian(windows[has], axis=1)
+    return out
+
+
+def factor_panel(
+    prices: np.ndarray,
+    at: np.ndarray,
+    lookbacks: Sequence[int] = LOOKBACKS,
+    skip_recent: int = SKIP_RECENT,
+    skip_long: int = SKIP_LONG,
+    vol_window: int = VOL_WINDOW,
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Raw factors as of each column index in `at`, using only data up to it.
+    Returns (names, factors shaped (len(names), symbols, len(at)), vol).
+    A factor that needs more history than a date has is NaN on that date.
+    """
+    prices = _ffill(np.asarray(prices, dtype=np.float64))
+    at = np.asarray(at, dtype=np.intp)
+    names = [f"ret_{n}" for n in lookbacks]
+    rows = [_ret(prices, at, n) for n in lookbacks]
+    # before the shortest lookback is available, rank on the one-day change
+    names.append("ret_1")
+    rows.append(np.where(at < min(lookbacks), _ret(prices, at, 1), np.nan))
+    vol = _rolling_vol(prices, at, vol_window)
+    mom = _ret(prices, at, skip_long, skip_recent)
+    names += ["mom_skip", "vol_mom"]
+    rows += [mom, mom / vol]
+    return names, np.stack(rows), vol
+
+
+def score_panel(
+    prices: np.ndarray,
+    at: np.ndarray,
+    values: Optional[np.ndarray] = None,
+    min_value: Optional[float] = None,
+    **params: Any,
+) -> Dict[str, Any]:
+    """
+    Composite scores as of each column in `at`, shaped (symbols, len(at));
+    NaN = not rankable that day (no data or filtered out). `values` must be
+    column-aligned with `prices`. Returns {"score", "vol", "factors", "eligible"}.
+    """
+    at = np.asarray(at, dtype=np.intp)
+    names, factors, vol = factor_panel(prices, at, **params)
+    z = np.stack([_zscore(f) for f in factors])
+    counts = (~np.isnan(z)).sum(axis=0)
+    score = np.nansum(z, axis=0) / np.maximum(counts, 1)
+    score[counts == 0] = np.nan
+
+    eligible = ~np.isnan(score)
+    if values is not None and values.shape[1]:
+        floor = min_traded_value() if min_value is None else min_value
+        median = _rolling_median(np.asarray(values, dtype=np.float64), at, LIQUIDITY_WINDOW)
+        # symbols with no stored value history are not filtered
+        eligible &= ~(median < floor)
+    score = np.where(eligible, score, np.nan)
+    return {"score": score, "vol": vol, "factors": dict(zip(names, factors)), "eligible": eligible}
+
+
+def score_prices(
+    prices: np.ndarray,
+    values: Optional[np.ndarray] = None,
+    min_value: Optional[float] = None,
+    **params: Any,
+) -> Dict[str, Any]:
+    """
+    Composite score per symbol as of the last column (NaN = not rankable).
+    `values` may be shorter than `prices` (e.g. no traded value yet for today's
+    live column); it is aligned to the most recent days.
+    Returns {"score", "vol", "factors": {name: array}, "eligible"}.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    days = prices.shape[1]
+    if not days:
+        empty = np.full(prices.shape[0], np.nan)
+        return {"score": empty, "vol": empty, "factors": {}, "eligible": np.zeros(prices.shape[0], bool)}
+    if values is not None:
+        values = np.asarray(values, dtype=np.float64)[:, -days:]
+        if values.shape[1] < days:
+            pad = np.full((values.shape[0], days - values.shape[1]), np.nan)
+            values = np.hstack([values, pad]) if values.shape[1] else None
+    scored = score_panel(prices, np.array([days - 1]), values, min_value, **params)
+    factors = {name: f[:, 0] for name, f in scored["factors"].items() if not np.isnan(f).all()}
+    return {"score": scored["score"][:, 0], "vol": scored["vol"][:, 0], "factors": factors, "eligible": scored["eligible"][:, 0]}
+
+
+def weights_for(picks: np.ndarray, vol: np.ndarray, alloc: str = "equal") -> np.ndarray:
+    """Weights for the picked rows: 'equal', or 'inverse_vol' (falls back to equal without vol)."""
+    n = len(picks)
+    if n == 0:
+        return np.empty(0)
+    if alloc == "inverse_vol":
+        inv = 1.0 / vol[picks]
+        if np.isfinite(inv).all():
+            return inv / inv.sum()
+    return np.full(n, 1.0 / n)
+
+
+def rank_prices(
+    prices: np.ndarray,
+    values: Optional[np.ndarray] = None,
+    top_n: Optional[int] = None,
+    alloc: str = "equal",
+    **params: Any,
+) -> Dict[str, Any]:
+    """
+    Score and rank. Returns {"order": row indices best first (unrankable rows
+    last, in input order), "picks": top_n rankable rows, "weights", "score", "vol"}.
+    """
+    scored = score_prices(prices, values, **params)
+    score = scored["score"]
+    rankable = np.flatnonzero(~np.isnan(score))
+    best = rankable[np.argsort(-score[rankable], kind="stable")]
+    order = np.concatenate([best, np.flatnonzero(np.isnan(score))])
+    picks = best if top_n is None else best[:top_n]
+    return {**scored, "order": order, "picks": picks, "weights": weights_for(picks, scored["vol"], alloc)}
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def quote_matrix(
+    symbols: List[str], prices: np.ndarray, change_rates: np.ndarray, lookback: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Close and traded-value matrices: the last `lookback` stored days (if the
+    OHLCV store has them) followed by today's live price. Without history
+    the previous close is implied from the change rate.
+    """
+    dates, closes = history.load_panel(symbols, history.CLOSE)
+    _, values = history.load_panel(symbols, history.VALUE)
+    if dates.size and dates[-1] >= float(dt.date.today().strftime("%Y%m%d")):
+        closes, values = closes[:, :-1], values[:, :-1]
+    closes, values = closes[:, -lookback:], values[:, -lookback:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        implied = prices / (1.0 + change_rates / 100.0)
+    if closes.shape[1]:
+        last = closes[:, -1]
+        closes[:, -1] = np.where(np.isnan(last), implied, last)
+    else:
+        closes = implied[:, None]
+    return np.hstack([closes, prices[:, None]]), values
+
+
+def rank_quotes(
+    results: List[Tuple[str, Optional[Dict], Optional[str]]],
+    top_n: Optional[int] = None,
+    alloc: str = "equal",
+    use_history: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Rank fetch_prices_batch results. Returns one row per symbol, best first,
+    with symbol/price/change_rate/score/vol (and weight for the top_n picks;
+    error rows last). "resp" carries the quote response for callers that show it.
+    """
+    symbols = [sym for sym, _, _ in results]
+    outputs = [(resp or {}).get("output") or {} for _, resp, _ in results]
+    prices = np.array([_num(out.get("stck_prpr")) for out in outputs])
+    change_rates = np.array([_num(out.get("prdy_ctrt")) for out in outputs])
+    failed = np.array([err is not None for _, _, err in results], dtype=bool)
+    prices[failed] = np.nan
+    lookback = max(max(LOOKBACKS), SKIP_LONG, VOL_WINDOW) + 1
+    if use_history and symbols:
+        matrix, values = quote_matrix(symbols, prices, change_rates, lookback)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.column_stack([prices / (1.0 + change_rates / 100.0), prices])
+        values = None
+    ranked = rank_prices(matrix, values, top_n=top_n, alloc=alloc)
+
+    weights = dict(zip(ranked["picks"].tolist(), np.round(ranked["weights"], 4).tolist()))
+    score, vol = ranked["score"], ranked["vol"]
+    rows = []
+    for i in ranked["order"].tolist():
+        sym, resp, err = results[i]
+        if err:
+            rows.append({"symbol": sym, "error": err})
+            continue
+        row = {
+            "symbol": sym,
+            "price": outputs[i].get("stck_prpr"),
+            "change_rate": 0.0 if np.isnan(change_rates[i]) else float(change_rates[i]),
+            "score": None if np.isnan(score[i]) else round(float(score[i]), 4),
+            "vol": None if np.isnan(vol[i]) else round(float(vol[i]), 4),
+            "resp": resp,
+        }
+        if i in weights:
+            row["weight"] = weights[i]
+        rows.append(row)
+    return rows
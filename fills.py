@@ -0,0 +1,139 @@
+"""
+Push-based order state from 국내주식 실시간체결통보 (H0STCNI0, paper H0STCNI9).
+
+The feed delivers both order acknowledgements (접수/정정/취소/거부,
+CNTG_YN=1) and executions (체결, CNTG_YN=2) for every order on the HTS
+ID, AES-encrypted; RealtimeFeed decrypts them and FillTracker folds each
+notice into an order-state table keyed by ODNO. Callers block (or await)
+on one order until it is filled, rejected or cancelled, so fills are
+seen as they happen instead of on the next inquire-daily-ccld poll.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from positions import invalidate_positions
+from realtime import RealtimeFeed
+
+FILL_TR_IDS = {"prod": "H0STCNI0", "paper": "H0STCNI9"}
+# record layout (docs/API/국내주식 실시간체결통보-표 1.csv)
+NOTICE_FIELDS = (
+    "CUST_ID", "ACNT_NO", "ODER_NO", "OODER_NO", "SELN_BYOV_CLS", "RCTF_CLS", "ODER_KIND", "ODER_COND",
+    "STCK_SHRN_ISCD", "CNTG_QTY", "CNTG_UNPR", "STCK_CNTG_HOUR", "RFUS_YN", "CNTG_YN", "ACPT_YN", "BRNC_NO",
+    "ODER_QTY", "ACNT_NAME", "ORD_COND_PRC", "ORD_EXG_GB", "POPUP_YN", "FILLER", "CRDT_CLS", "CRDT_LOAN_DATE",
+    "CNTG_ISNM40", "ODER_PRC",
+)
+NOTICE_WIDTH = len(NOTICE_FIELDS)
+DONE = ("filled", "rejected", "cancelled")
+
+
+def _int(val: str) -> int:
+    try:
+        return int(val or 0)
+    except ValueError:
+        return 0
+
+
+def _odno_key(odno: Any) -> str:
+    return str(odno or "").lstrip("0")
+
+
+def parse_notices(payload: str, count: int) -> List[Dict[str, str]]:
+    """Split a decrypted payload into `count` notices keyed by NOTICE_FIELDS."""
+    fields = payload.split("^")
+    if count <= 1 or len(fields) < count * NOTICE_WIDTH:
+        return [dict(zip(NOTICE_FIELDS, fields))]
+    return [dict(zip(NOTICE_FIELDS, fields[i:i + NOTICE_WIDTH])) for i in range(0, count * NOTICE_WIDTH, NOTICE_WIDTH)]
+
+
+class FillTracker:
+    """
+    Order-state table fed by fill notices:
+    odno -> {odno, symbol, side, order_qty, filled_qty, avg_price, status, updated_at}.
+    status is accepted, partial, filled, rejected or cancelled.
+    """
+
+    def __init__(self):
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.notices = 0
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []  # called with each updated state
+        self._cond = threading.Condition()
+
+    def apply(self, notice: Dict[str, str]) -> Dict[str, Any]:
+        key = _odno_key(notice.get("ODER_NO"))
+        with self._cond:
+            state = self.orders.get(key)
+            if state is None:
+                state = self.orders[key] = {
+                    "odno": notice.get("ODER_NO", ""),
+                    "symbol": notice.get("STCK_SHRN_ISCD", ""),
+                    "side": "sell" if notice.get("SELN_BYOV_CLS") == "01" else "buy",
+                    "order_qty": 0,
+                    "filled_qty": 0,
+                    "avg_price": 0.0,
+                    "status": "accepted",
+                }
+            if _int(notice.get("ODER_QTY")):
+                state["order_qty"] = _int(notice.get("ODER_QTY"))
+            if notice.get("CNTG_YN") == "2":
+                qty, price = _int(notice.get("CNTG_QTY")), _int(notice.get("CNTG_UNPR"))
+                total = state["filled_qty"] + qty
+                if total:
+                    state["avg_price"] = (state["avg_price"] * state["filled_qty"] + price * qty) / total
+                state["filled_qty"] = total
+                state["status"] = "filled" if total >= state["order_qty"] > 0 else "partial"
+            elif notice.get("RFUS_YN") == "1":
+                state["status"] = "rejected"
+            elif notice.get("RCTF_CLS") == "2" or notice.get("ACPT_YN") == "3":
+                state["status"] = "cancelled"
+            state["updated_at"] = time.time()
+            self.notices += 1
+            self._cond.notify_all()
+            snapshot = dict(state)
+        for listener in self.listeners:
+            listener(snapshot)
+        return snapshot
+
+    def on_frame(self, payload: str, count: int) -> None:
+        for notice in parse_notices(payload, count):
+            self.apply(notice)
+
+    def get(self, odno: str) -> Optional[Dict[str, Any]]:
+        state = self.orders.get(_odno_key(odno))
+        return dict(state) if state is not None else None
+
+    def wait(self, odno: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Block until the order is filled, rejected or cancelled, or timeout
+        passes; returns its latest state (None if no notice arrived).
+        """
+        key = _odno_key(odno)
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                state = self.orders.get(key)
+                remaining = deadline - time.time()
+                if (state is not None and state["status"] in DONE) or remaining <= 0:
+                    return dict(state) if state is not None else None
+                self._cond.wait(remaining)
+
+    async def wait_async(self, odno: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """wait() for asyncio callers; runs on the default executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.wait, odno, timeout)
+
+
+def subscribe_fills(feed: RealtimeFeed, hts_id: str, tracker: Optional[FillTracker] = None) -> FillTracker:
+    """
+    Route the environment's fill-notice tr_id on feed into tracker and
+    subscribe the HTS ID. Executions also invalidate the cached positions.
+    """
+    if not hts_id:
+        raise ValueError("HTS ID is required for fill notices")
+    tracker = tracker or FillTracker()
+    tracker.listeners.append(lambda state: state["filled_qty"] and invalidate_positions(feed.env))
+    tr_id = FILL_TR_IDS[feed.env.get("name", "paper")]
+    feed.on(tr_id, tracker.on_frame)
+    feed.subscribe(tr_id, hts_id)
+    return tracker
@@ -0,0 +1,297 @@
+"""
+Daily OHLCV history: downloader for 국내주식기간별시세 (FHKST03010100) and a
+local columnar store.
+
+Each symbol is one .npy file holding a float64 array shaped
+(len(COLUMNS), days): row i is column COLUMNS[i], contiguous and sorted by
+date. Files are loaded with mmap_mode="r", so opening years of history for
+thousands of symbols only maps pages; nothing is parsed. Later runs fetch
+only the days after the last stored date and rewrite the file atomically.
+After a backfill the per-symbol files are also consolidated into a panel
+(_panel/: dates, symbols and one (symbols, dates) matrix per column) so a
+universe-wide load is a handful of mmaps instead of one open per symbol.
+
+    python history.py --mode prod --limit 500 --start 20180101
+"""
+
+import argparse
+import datetime as dt
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kis_client import get_client
+from scanner import scan_symbols
+
+DAILY_CHART_PATH = "/uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice"
+DAILY_CHART_TR_ID = "FHKST03010100"
+PAGE_SIZE = 100  # rows per call; the API has no tr_cont paging, so windows move back by date
+
+COLUMNS = ("date", "open", "high", "low", "close", "volume", "value")
+DATE, OPEN, HIGH, LOW, CLOSE, VOLUME, VALUE = range(len(COLUMNS))
+# output2 field per column
+_FIELDS = ("stck_bsop_date", "stck_oprc", "stck_hgpr", "stck_lwpr", "stck_clpr", "acml_vol", "acml_tr_pbmn")
+
+DEFAULT_DIR = Path("data/ohlcv")
+DEFAULT_YEARS = 5
+PANEL = "_panel"
+
+
+def history_dir() -> Path:
+    return Path(os.getenv("HISTORY_DIR", str(DEFAULT_DIR))).expanduser()
+
+
+def _path(symbol: str, root: Optional[Path] = None) -> Path:
+    return (root or history_dir()) / f"{symbol}.npy"
+
+
+def _ymd(day: dt.date) -> str:
+    return day.strftime("%Y%m%d")
+
+
+def _parse_ymd(value: float) -> dt.date:
+    return dt.datetime.strptime(str(int(value)), "%Y%m%d").date()
+
+
+def load(symbol: str, root: Optional[Path] = None) -> Optional[np.ndarray]:
+    """Memory-mapped (len(COLUMNS), days) array for symbol, or None if not downloaded."""
+    path = _path(symbol, root)
+    if not path.exists():
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def load_many(symbols: List[str], root: Optional[Path] = None) -> Dict[str, np.ndarray]:
+    """symbol -> memory-mapped history; symbols without a file are skipped."""
+    out = {}
+    for sym in symbols:
+        data = load(sym, root)
+        if data is not None and data.shape[1]:
+            out[sym] = data
+    return out
+
+
+def stored_symbols(root: Optional[Path] = None) -> List[str]:
+    root = root or history_dir()
+    if not root.exists():
+        return []
+    return sorted(p.stem for p in root.glob("*.npy") if not p.name.endswith(".tmp.npy"))
+
+
+def build_panel(root: Optional[Path] = None) -> int:
+    """Consolidate every per-symbol file into the _panel matrices; returns the symbol count."""
+    root = root or history_dir()
+    symbols = stored_symbols(root)
+    dates, values = _align(symbols, [load(sym, root) for sym in symbols], list(range(1, len(COLUMNS))))
+    panel = root / PANEL
+    panel.mkdir(parents=True, exist_ok=True)
+    arrays = {"dates": dates, "symbols": np.array(symbols, dtype="U12")}
+    arrays.update({COLUMNS[col]: matrix for col, matrix in values.items()})
+    for name, array in arrays.items():
+        tmp = panel / f"{name}.tmp.npy"
+        np.save(tmp, array)
+        os.replace(tmp, panel / f"{name}.npy")
+    return len(symbols)
+
+
+def _align(symbols: List[str], histories: List[Optional[np.ndarray]], columns: List[int]) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    present = [h for h in histories if h is not None and h.shape[1]]
+    dates = np.unique(np.concatenate([h[DATE] for h in present])) if present else np.empty(0)
+    values = {col: np.full((len(symbols), len(dates)), np.nan) for col in columns}
+    for i, h in enumerate(histories):
+        if h is None or not h.shape[1]:
+            continue
+        idx = np.searchsorted(dates, h[DATE])
+        for col, matrix in values.items():
+            matrix[i, idx] = h[col]
+    return dates, values
+
+
+def _load_from_panel(symbols: List[str], column: int, root: Path) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    panel = root / PANEL
+    path = panel / f"{COLUMNS[column]}.npy"
+    if not path.exists():
+        return None
+    dates = np.load(panel / "dates.npy")
+    stored = np.load(panel / "symbols.npy")
+    matrix = np.load(path, mmap_mode="r")
+    index = {sym: i for i, sym in enumerate(stored.tolist())}
+    rows = np.array([index.get(sym, -1) for sym in symbols], dtype=np.intp)
+    found = rows >= 0
+    values = np.full((len(symbols), len(dates)), np.nan)
+    values[found] = matrix[rows[found]]
+    # symbols downloaded after the panel was built
+    for i in np.flatnonzero(~found):
+        h = load(symbols[i], root)
+        if h is not None and h.shape[1]:
+            idx = np.searchsorted(dates, h[DATE])
+            keep = (idx < len(dates)) & (dates[np.minimum(idx, len(dates) - 1)] == h[DATE])
+            values[i, idx[keep]] = h[column][keep]
+    return dates, values
+
+
+def load_panel(
+    symbols: List[str], column: int = CLOSE, start: Optional[int] = None, root: Optional[Path] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Align one column across symbols on the union of trading dates.
+    Returns (dates, values) with values shaped (len(symbols), len(dates));
+    days a symbol did not trade (or symbols never downloaded) are NaN.
+    `start` is a yyyymmdd int.
+    """
+    root = root or history_dir()
+    if not root.exists():
+        return np.empty(0), np.empty((len(symbols), 0))
+    loaded = _load_from_panel(symbols, column, root)
+    if loaded is None:
+        dates, values = _align(symbols, [load(sym, root) for sym in symbols], [column])
+        loaded = dates, values[column]
+    dates, values = loaded
+    if start is not None:
+        keep = dates >= start
+        dates, values = dates[keep], values[:, keep]
+    return dates, values
+
+
+def _rows_to_array(rows: List[Dict[str, Any]]) -> np.ndarray:
+    """output2 rows (any order) -> date-sorted columnar array, dropping blank/duplicate days."""
+    table = [
+        [float(row.get(f) or 0) for f in _FIELDS]
+        for row in rows
+        if row.get("stck_bsop_date")
+    ]
+    if not table:
+        return np.empty((len(COLUMNS), 0))
+    data = np.array(table, dtype=np.float64).T
+    dates, first = np.unique(data[DATE], return_index=True)
+    return data[:, first]
+
+
+def fetch_daily(env: Dict[str, Any], token: str, symbol: str, start: str, end: str, market: str = "J") -> np.ndarray:
+    """
+    Adjusted daily bars for symbol between start and end (yyyymmdd, inclusive).
+    Pages backwards from `end` PAGE_SIZE rows at a time.
+    """
+    client = get_client(env)
+    rows: List[Dict[str, Any]] = []
+    window_end = end
+    while window_end >= start:
+        params = {
+            "FID_COND_MRKT_DIV_CODE": market,
+            "FID_INPUT_ISCD": symbol,
+            "FID_INPUT_DATE_1": start,
+            "FID_INPUT_DATE_2": window_end,
+            "FID_PERIOD_DIV_CODE": "D",
+            "FID_ORG_ADJ_PRC": "0",  # 수정주가
+        }
+        resp = client.get(DAILY_CHART_PATH, DAILY_CHART_TR_ID, token, params)
+        if resp.get("rt_cd") not in (None, "0"):
+            raise RuntimeError(f"{resp.get('msg_cd')} {resp.get('msg1')}")
+        page = [row for row in resp.get("output2") or [] if row.get("stck_bsop_date")]
+        if not page:
+            break
+        rows.extend(page)
+        oldest = min(row["stck_bsop_date"] for row in page)
+        if len(page) < PAGE_SIZE or oldest <= start:
+            break
+        window_end = _ymd(_parse_ymd(float(oldest)) - dt.timedelta(days=1))
+    return _rows_to_array(rows)
+
+
+def _save(symbol: str, data: np.ndarray, root: Optional[Path] = None) -> None:
+    path = _path(symbol, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, np.ascontiguousarray(data))
+    os.replace(tmp, path)
+
+
+def update_symbol(
+    env: Dict[str, Any], token: str, symbol: str, start: str, end: str, market: str = "J", root: Optional[Path] = None
+) -> int:
+    """
+    Bring one symbol's file up to `end`; returns the number of days written
+    (0 means the file is unchanged). The fetch overlaps the last stored day:
+    if its close changed, adjusted prices were restated (split, rights issue)
+    and the whole range is reloaded, which counts every day rewritten.
+    """
+    existing = load(symbol, root)
+    if existing is None or not existing.shape[1]:
+        data = fetch_daily(env, token, symbol, start, end, market)
+        if data.shape[1]:
+            _save(symbol, data, root)
+        return data.shape[1]
+    existing = np.array(existing)
+    last = existing[DATE, -1]
+    if _ymd(_parse_ymd(last)) >= end:
+        return 0
+    fresh = fetch_daily(env, token, symbol, _ymd(_parse_ymd(last)), end, market)
+    overlap = fresh[:, fresh[DATE] == last]
+    if overlap.shape[1] and overlap[CLOSE, 0] != existing[CLOSE, -1]:
+        data = fetch_daily(env, token, symbol, min(start, _ymd(_parse_ymd(existing[DATE, 0]))), end, market)
+        _save(symbol, data, root)
+        return data.shape[1]
+    fresh = fresh[:, fresh[DATE] > last]
+    if not fresh.shape[1]:
+        return 0
+    _save(symbol, np.concatenate([existing, fresh], axis=1), root)
+    return fresh.shape[1]
+
+
+def backfill(
+    env: Dict[str, Any],
+    token: str,
+    symbols: List[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    market: str = "J",
+    concurrency: Optional[int] = None,
+    root: Optional[Path] = None,
+) -> List[Tuple[str, Optional[int], Optional[str]]]:
+    """
+    Update every symbol in parallel, then rebuild the panel if anything changed.
+    Returns [(symbol, days_written, error)] in input order.
+    """
+    today = dt.date.today()
+    end = end or _ymd(today)
+    start = start or _ymd(today.replace(year=today.year - DEFAULT_YEARS))
+    results = scan_symbols(symbols, lambda sym: update_symbol(env, token, sym, start, end, market, root), concurrency)
+    if any(n for _, n, _ in results):
+        build_panel(root)
+    return results
+
+
+def main() -> None:
+    from kis_core.config import get_env_config, load_env
+    from kis_core.tokens import get_or_issue_token
+    from universe import load_universe
+
+    p = argparse.ArgumentParser(description="Download/refresh daily OHLCV history into the local store")
+    p.add_argument("--mode", choices=["paper", "prod"], default="prod")
+    p.add_argument("--market", default="J", help="J=KRX, NX=Nextrade, UN=Unified")
+    p.add_argument("--symbols", help="Comma-separated symbols (default: universe.load_universe)")
+    p.add_argument("--limit", type=int, default=200, help="Universe size when --symbols is omitted")
+    p.add_argument("--start", help=f"First day yyyymmdd for new symbols (default {DEFAULT_YEARS} years ago)")
+    p.add_argument("--end", help="Last day yyyymmdd (default today)")
+    p.add_argument("--concurrency", type=int, help="Symbols downloaded in parallel (default SCAN_CONCURRENCY or 8)")
+    args = p.parse_args()
+
+    load_env()
+    env = get_env_config(args.mode)
+    token = get_or_issue_token(env, args.mode)
+    if not token:
+        raise RuntimeError("Failed to obtain token")
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else load_universe(args.limit)
+
+    results = backfill(env, token, symbols, args.start, args.end, args.market, args.concurrency)
+    written = sum(n or 0 for _, n, _ in results)
+    for sym, _, err in results:
+        if err:
+            print(f"{sym}: {err}")
+    print(f"{len(symbols)} symbols, {written} rows written, {sum(1 for r in results if r[2])} errors -> {history_dir()}")
+
+
+if __name__ == "__main__":
+    main()
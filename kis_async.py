@@ -0,0 +1,285 @@
+"""
+Asyncio KIS client and scan pipeline.
+
+AsyncKISClient mirrors issue_token / fetch_price / fetch_balance /
+order_buy / order_sell on one aiohttp connection pool and shares the
+per-appkey rate limiter with the threaded client. scan_quotes runs a fixed
+number of worker coroutines over the universe, so memory stays bounded by
+the concurrency cap rather than the universe size.
+
+auto_trader drives it with asyncio.run(); Flask handlers (which are
+synchronous) go through scan_quotes_sync, which runs on a shared
+background event loop.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+import metrics
+from kis_client import (
+    BALANCE_PATH,
+    DEFAULT_TIMEOUT,
+    ORDER_PATH,
+    PRICE_PATH,
+    THROTTLE_RETRIES,
+    balance_params,
+    balance_tr_id,
+    order_body,
+    order_tr_id,
+    price_params,
+    tr_headers,
+)
+from rate_limit import THROTTLE_CODE, get_limiter, is_throttled
+from scanner import (
+    MULTI_PRICE_PATH,
+    ScanResult,
+    multi_price_chunks,
+    multi_price_params,
+    scan_concurrency,
+    split_multi_price,
+)
+
+DEFAULT_ASYNC_POOL_SIZE = 100
+
+T = TypeVar("T")
+
+
+def _decode(content: bytes) -> Any:
+    try:
+        return json.loads(content) if content else None
+    except ValueError:
+        return None
+
+
+class AsyncKISClient:
+    """aiohttp session plus pre-built headers for one KIS environment."""
+
+    def __init__(self, env: Dict[str, Any], pool_size: Optional[int] = None, timeout: Optional[float] = None):
+        self.env = env
+        self.base = env["base"].rstrip("/")
+        self.pool_size = int(pool_size or env.get("pool_size") or os.getenv("KIS_ASYNC_POOL_SIZE", DEFAULT_ASYNC_POOL_SIZE))
+        self.timeout = float(timeout or env.get("timeout") or os.getenv("KIS_TIMEOUT", DEFAULT_TIMEOUT))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tr_headers: Dict[str, Dict[str, str]] = {}
+        capture = env.get("capture") or os.getenv("KIS_CAPTURE")
+        replay = env.get("replay") or os.getenv("KIS_REPLAY")
+        self.writer = self.replay = None
+        if replay:
+            from capture import get_replay
+
+            self.replay = get_replay(replay)
+        elif capture:
+            from capture import get_writer
+
+            self.writer = get_writer(capture)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json; charset=utf-8", "User-Agent": self.env.get("agent", "")},
+            )
+        return self._session
+
+    def headers(self, tr_id: Optional[str], token: Optional[str]) -> Dict[str, str]:
+        if not tr_id:
+            return {"authorization": f"Bearer {token}"} if token else {}
+        base = self._tr_headers.get(tr_id)
+        if base is None:
+            base = self._tr_headers[tr_id] = tr_headers(self.env, tr_id)
+        if not token:
+            return base
+        return {**base, "authorization": f"Bearer {token}"}
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        tr_id: Optional[str] = None,
+        token: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+    ) -> Dict:
+        """Same pacing and throttle-retry rules as KISClient.request; returns decoded JSON."""
+        if self.replay is not None:
+            return self._replayed(method, path, tr_id, params, body)
+        headers = self.headers(tr_id, token)
+        limiter = get_limiter(self.env.get("appkey", ""), self.env.get("name", ""), tr_id)
+        label = metrics.tr_label(tr_id, path)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            if attempt:
+                metrics.KIS_RETRIES.inc(label)
+            if limiter is not None:
+                wait = limiter.reserve()
+                if wait > 0:
+                    metrics.KIS_RATE_WAIT.inc(label, amount=wait)
+                    await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                async with self.session.request(method, f"{self.base}{path}", headers=headers, params=params, json=body) as resp:
+                    content = await resp.read()
+                    status = resp.status
+                if self.writer is not None:
+                    self.writer.write(method, path, tr_id, None, params, body, status, resp.headers.get("tr_cont"), _decode(content))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.KIS_ERRORS.inc(label, type(e).__name__)
+                raise
+            finally:
+                metrics.KIS_LATENCY.observe(time.perf_counter() - started, label, method)
+            if limiter is None or not is_throttled(content):
+                if limiter is not None:
+                    limiter.succeeded()
+                if status >= 400:
+                    metrics.record_error(label, _decode(content), status)
+                    resp.raise_for_status()
+                return metrics.record_result(label, json.loads(content))
+            metrics.KIS_THROTTLES.inc(label)
+            limiter.throttled()
+        metrics.KIS_ERRORS.inc(label, THROTTLE_CODE)
+        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=status, message="throttled (EGW00201)")
+
+    def _replayed(self, method: str, path: str, tr_id: Optional[str], params: Optional[Dict[str, Any]], body: Optional[Dict[str, Any]]) -> Dict:
+        """Answer from the KIS_REPLAY capture: no network, no pacing."""
+        label = metrics.tr_label(tr_id, path)
+        started = time.perf_counter()
+        status, _, data = self.replay.lookup(method, path, tr_id, None, params, body)
+        metrics.KIS_LATENCY.observe(time.perf_counter() - started, label, method)
+        if status >= 400:
+            metrics.record_error(label, data, status)
+            url = URL(f"{self.base}{path}")
+            raise aiohttp.ClientResponseError(
+                aiohttp.RequestInfo(url, method, CIMultiDictProxy(CIMultiDict())), (), status=status, message=data.get("msg1", "")
+            )
+        return metrics.record_result(label, data)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def issue_token(self) -> Dict:
+        if not self.env.get("appkey") or not self.env.get("appsecret"):
+            raise ValueError("appkey or appsecret is missing")
+        body = {
+            "grant_type": "client_credentials",
+            "appkey": self.env["appkey"],
+            "appsecret": self.env["appsecret"],
+        }
+        return await self.request("POST", "/oauth2/tokenP", body=body)
+
+    async def fetch_price(self, token: str, symbol: str, market: str) -> Dict:
+        return await self.request("GET", PRICE_PATH, "FHKST01010100", token, params=price_params(symbol, market))
+
+    async def fetch_balance(self, token: str, mode: str) -> Dict:
+        return await self.request("GET", BALANCE_PATH, balance_tr_id(mode), token, params=balance_params(self.env))
+
+    async def order_buy(self, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
+        body = order_body(self.env, "buy", symbol, qty, price, order_type)
+        return await self.request("POST", ORDER_PATH, order_tr_id("buy"), token, body=body)
+
+    async def order_sell(self, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
+        body = order_body(self.env, "sell", symbol, qty, price, order_type)
+        return await self.request("POST", ORDER_PATH, order_tr_id("sell"), token, body=body)
+
+    async def fetch_multi_price(self, token: str, chunk: str, market: str) -> Dict:
+        return await self.request("GET", MULTI_PRICE_PATH, "FHKST11300006", token, params=multi_price_params(chunk, market))
+
+
+async def gather_bounded(
+    items: List[str], fetch: Callable[[str], Awaitable[T]], concurrency: Optional[int] = None
+) -> List[Tuple[str, Optional[T], Optional[str]]]:
+    """
+    Async counterpart of scanner.scan_symbols: at most `concurrency` fetches
+    in flight, results in input order, per-item errors captured as strings.
+    Only `concurrency` worker tasks exist at any time.
+    """
+    results: List[Tuple[str, Optional[T], Optional[str]]] = [("", None, None)] * len(items)
+    next_index = iter(range(len(items)))
+
+    async def worker() -> None:
+        for i in next_index:
+            item = items[i]
+            try:
+                results[i] = (item, await fetch(item), None)
+            except Exception as e:
+                results[i] = (item, None, str(e) or type(e).__name__)
+
+    workers = min(scan_concurrency(concurrency), len(items))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+
+async def scan_quotes(
+    client: AsyncKISClient, token: str, symbols: List[str], market: str, concurrency: Optional[int] = None
+) -> List[ScanResult]:
+    """
+    Quotes for the universe in input order: multi-symbol chunks in prod,
+    one inquire-price per symbol in paper (where the batch TR is unavailable).
+    """
+    if client.env.get("name") == "paper":
+        return await gather_bounded(symbols, lambda s: client.fetch_price(token, s, market), concurrency)
+    results: List[ScanResult] = []
+    chunks = await gather_bounded(multi_price_chunks(symbols), lambda c: client.fetch_multi_price(token, c, market), concurrency)
+    for chunk, resp, err in chunks:
+        results.extend(split_multi_price(chunk, resp, err))
+    return results
+
+
+async def scan_universe(env: Dict[str, Any], token: str, symbols: List[str], market: str, concurrency: Optional[int] = None) -> List[ScanResult]:
+    """One-shot scan with its own client, for asyncio.run() callers such as auto_trader."""
+    client = AsyncKISClient(env)
+    try:
+        return await scan_quotes(client, token, symbols, market, concurrency)
+    finally:
+        await client.close()
+
+
+class _LoopThread:
+    """A daemon thread running one event loop that sync code can submit coroutines to."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.clients: Dict[Tuple[str, str, str], AsyncKISClient] = {}
+        threading.Thread(target=self.loop.run_forever, name="kis-async", daemon=True).start()
+
+    def run(self, coro: Awaitable[T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def client(self, env: Dict[str, Any]) -> AsyncKISClient:
+        key = (env.get("name", ""), env["base"], env.get("appkey", ""))
+        client = self.clients.get(key)
+        if client is None:
+            client = self.clients[key] = AsyncKISClient(env)
+        return client
+
+
+_BRIDGE: Optional[_LoopThread] = None
+_BRIDGE_LOCK = threading.Lock()
+
+
+def _bridge() -> _LoopThread:
+    global _BRIDGE
+    if _BRIDGE is None:
+        with _BRIDGE_LOCK:
+            if _BRIDGE is None:
+                _BRIDGE = _LoopThread()
+    return _BRIDGE
+
+
+def scan_quotes_sync(env: Dict[str, Any], token: str, symbols: List[str], market: str, concurrency: Optional[int] = None) -> List[ScanResult]:
+    """Blocking bridge for threaded callers (Flask): runs scan_quotes on the shared loop."""
+    bridge = _bridge()
+
+    async def run() -> List[ScanResult]:
+        return await scan_quotes(bridge.client(env), token, symbols, market, concurrency)
+
+    return bridge.run(run())
@@ -0,0 +1,302 @@
+"""
+Pooled HTTP client for the KIS Open Trading API.
+
+One KISClient is kept per environment (base URL + appkey) and owns a
+keep-alive requests.Session, so repeated calls reuse the same TLS
+connection instead of opening a new one per request.
+Shared by app.py, auto_trader.py and cli_test.py.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+import metrics
+from rate_limit import get_limiter, is_throttled
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_POOL_SIZE = 10
+THROTTLE_RETRIES = 3
+MAX_PAGES = 50  # safety cap for tr_cont continuation
+
+Timeout = Union[float, Tuple[float, float]]
+
+PRICE_PATH = "/uapi/domestic-stock/v1/quotations/inquire-price"
+BALANCE_PATH = "/uapi/domestic-stock/v1/trading/inquire-balance"
+ORDER_PATH = "/uapi/domestic-stock/v1/trading/order-cash"
+CCLD_PATH = "/uapi/domestic-stock/v1/trading/inquire-daily-ccld"
+PSBL_ORDER_PATH = "/uapi/domestic-stock/v1/trading/inquire-psbl-order"
+
+
+def tr_headers(env: Dict[str, Any], tr_id: str) -> Dict[str, str]:
+    """Static headers for one tr_id (everything except the bearer token)."""
+    return {
+        "appkey": env["appkey"],
+        "appsecret": env["appsecret"],
+        "tr_id": tr_id,
+        "custtype": "P",
+    }
+
+
+def price_params(symbol: str, market: str) -> Dict[str, str]:
+    return {"FID_COND_MRKT_DIV_CODE": market, "FID_INPUT_ISCD": symbol}
+
+
+def balance_tr_id(mode: str) -> str:
+    return "VTTC8434R" if mode == "paper" else "TTTC8434R"
+
+
+def balance_params(env: Dict[str, Any], fk: str = "", nk: str = "") -> Dict[str, str]:
+    """inquire-balance query; fk/nk are the CTX_AREA continuation keys."""
+    return {
+        "CANO": env["account"],
+        "ACNT_PRDT_CD": env["product"],
+        "AFHR_FLPR_YN": "N",            # 시간외단일가 여부
+        "OFL_YN": "",                   # 오프라인 여부
+        "INQR_DVSN": "02",              # 01 대출일별, 02 종목별
+        "UNPR_DVSN": "01",              # 단가구분 기본값
+        "FUND_STTL_ICLD_YN": "N",       # 펀드결제 포함여부
+        "FNCG_AMT_AUTO_RDPT_YN": "N",   # 융자금 자동상환 여부
+        "PRCS_DVSN": "00",              # 전일매매 포함
+        "CTX_AREA_FK100": fk,           # 연속조회키 (초기 공란)
+        "CTX_AREA_NK100": nk,
+    }
+
+
+def psbl_order_tr_id(mode: str) -> str:
+    """매수가능조회."""
+    return "VTTC8908R" if mode == "paper" else "TTTC8908R"
+
+
+def psbl_order_params(env: Dict[str, Any], symbol: str, price: int = 0, order_type: str = "01") -> Dict[str, str]:
+    """inquire-psbl-order query; ord_psbl_cash in the answer does not depend on symbol."""
+    return {
+        "CANO": env["account"],
+        "ACNT_PRDT_CD": env["product"],
+        "PDNO": symbol,
+        "ORD_UNPR": str(price) if order_type == "00" else "0",
+        "ORD_DVSN": order_type,
+        "CMA_EVLU_AMT_ICLD_YN": "N",    # CMA평가금액 포함여부
+        "OVRS_ICLD_YN": "N",            # 해외포함여부
+    }
+
+
+def ccld_tr_id(mode: str) -> str:
+    """주식일별주문체결조회 (3개월이내)."""
+    return "VTTC0081R" if mode == "paper" else "TTTC0081R"
+
+
+def ccld_params(env: Dict[str, Any], day: str, side: str = "00", odno: str = "", fk: str = "", nk: str = "") -> Dict[str, str]:
+    """inquire-daily-ccld query for one day (yyyymmdd); side "00" 전체, "01" 매도, "02" 매수."""
+    return {
+        "CANO": env["account"],
+        "ACNT_PRDT_CD": env["product"],
+        "INQR_STRT_DT": day,
+        "INQR_END_DT": day,
+        "SLL_BUY_DVSN_CD": side,
+        "INQR_DVSN": "00",              # 역순
+        "PDNO": "",
+        "CCLD_DVSN": "00",              # 체결+미체결
+        "ORD_GNO_BRNO": "",
+        "ODNO": odno,
+        "INQR_DVSN_3": "00",
+        "INQR_DVSN_1": "",
+        "EXCG_ID_DVSN_CD": "KRX" if env.get("name") == "paper" else "ALL",
+        "CTX_AREA_FK100": fk,
+        "CTX_AREA_NK100": nk,
+    }
+
+
+def order_tr_id(side: str) -> str:
+    return "TTTC0012U" if side == "buy" else "TTTC0011U"
+
+
+def order_body(env: Dict[str, Any], side: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict[str, str]:
+    """order-cash body; order_type "00"=지정가 (uses price), "01"=시장가."""
+    body = {
+        "CANO": env["account"],
+        "ACNT_PRDT_CD": env["product"],
+        "PDNO": symbol,
+        "ORD_DVSN": order_type,
+        "ORD_QTY": str(qty),
+        "ORD_UNPR": str(price) if order_type == "00" else "0",
+    }
+    if side == "sell":
+        body["SLL_TYPE"] = "01"  # 매도주문구분: 01=보통
+    return body
+
+
+class KISClient:
+    """Keep-alive session plus pre-built headers for one KIS environment."""
+
+    def __init__(
+        self,
+        env: Dict[str, Any],
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Timeout = DEFAULT_TIMEOUT,
+        capture: Optional[str] = None,
+        replay: Optional[str] = None,
+    ):
+        self.env = env
+        self.base = env["base"].rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.replay = bool(replay)
+        adapter: BaseAdapter
+        if replay:
+            from capture import ReplayAdapter, get_replay
+
+            adapter = ReplayAdapter(get_replay(replay))
+        elif capture:
+            from capture import RecordingAdapter, get_writer
+
+            adapter = RecordingAdapter(get_writer(capture), pool_connections=1, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Content-Type": "application/json; charset=utf-8",
+                "User-Agent": env.get("agent", ""),
+            }
+        )
+        self._tr_headers: Dict[str, Dict[str, str]] = {}
+
+    def headers(self, tr_id: Optional[str], token: Optional[str]) -> Dict[str, str]:
+        """Return per-call headers; the tr_id part is built once and reused."""
+        if not tr_id:
+            return {"authorization": f"Bearer {token}"} if token else {}
+        base = self._tr_headers.get(tr_id)
+        if base is None:
+            base = self._tr_headers[tr_id] = tr_headers(self.env, tr_id)
+        if not token:
+            return base
+        return {**base, "authorization": f"Bearer {token}"}
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        tr_id: Optional[str] = None,
+        token: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        """
+        Send a request over the pooled session and raise on HTTP errors.
+        Calls with a tr_id are paced by the appkey's rate limiter and retried
+        up to THROTTLE_RETRIES times when KIS answers with a throttle error.
+        Replayed calls (KIS_REPLAY) are not paced.
+        """
+        headers = self.headers(tr_id, token)
+        if extra_headers:
+            headers = {**headers, **extra_headers}
+        limiter = None if self.replay else get_limiter(self.env.get("appkey", ""), self.env.get("name", ""), tr_id)
+        label = metrics.tr_label(tr_id, path)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            if attempt:
+                metrics.KIS_RETRIES.inc(label)
+            if limiter is not None:
+                wait = limiter.reserve()
+                if wait > 0:
+                    metrics.KIS_RATE_WAIT.inc(label, amount=wait)
+                    time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                resp = self.session.request(
+                    method,
+                    f"{self.base}{path}",
+                    headers=headers,
+                    params=params,
+                    json=body,
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                metrics.KIS_ERRORS.inc(label, type(e).__name__)
+                raise
+            finally:
+                metrics.KIS_LATENCY.observe(time.perf_counter() - started, label, method)
+            if limiter is None:
+                break
+            if not is_throttled(resp.content):
+                limiter.succeeded()
+                break
+            metrics.KIS_THROTTLES.inc(label)
+            limiter.throttled()
+        if resp.status_code >= 400:
+            try:
+                data = resp.json()
+            except ValueError:
+                data = None
+            metrics.record_error(label, data, resp.status_code)
+        resp.raise_for_status()
+        return resp
+
+    def get(self, path: str, tr_id: str, token: str, params: Dict[str, Any]) -> Dict:
+        return metrics.record_result(tr_id, self.request("GET", path, tr_id=tr_id, token=token, params=params).json())
+
+    def pages(self, path: str, tr_id: str, token: str, params: Dict[str, Any], max_pages: int = MAX_PAGES) -> Iterator[Dict]:
+        """
+        Yield each page of a continued inquiry. While the response header
+        tr_cont is F/M the next call repeats with tr_cont: N and the
+        ctx_area_fk100/nk100 keys from the previous body.
+        """
+        params = dict(params)
+        headers = None
+        for _ in range(max_pages):
+            resp = self.request("GET", path, tr_id=tr_id, token=token, params=params, extra_headers=headers)
+            data = metrics.record_result(tr_id, resp.json())
+            yield data
+            if resp.headers.get("tr_cont") not in ("F", "M"):
+                return
+            params["CTX_AREA_FK100"] = data.get("ctx_area_fk100") or ""
+            params["CTX_AREA_NK100"] = data.get("ctx_area_nk100") or ""
+            headers = {"tr_cont": "N"}
+
+    def post(self, path: str, tr_id: Optional[str], token: Optional[str], body: Dict[str, Any]) -> Dict:
+        return metrics.record_result(metrics.tr_label(tr_id, path), self.request("POST", path, tr_id=tr_id, token=token, body=body).json())
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_CLIENTS: Dict[Tuple[str, str, str], KISClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(env: Dict[str, Any]) -> KISClient:
+    """
+    Return the shared client for env, creating it on first use.
+    Pool size and timeout come from env["pool_size"]/env["timeout"] if set,
+    else from KIS_POOL_SIZE / KIS_TIMEOUT environment variables; likewise
+    env["capture"]/KIS_CAPTURE records traffic to a file and
+    env["replay"]/KIS_REPLAY answers from one (see capture.py).
+    """
+    key = (env.get("name", ""), env["base"], env.get("appkey", ""))
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            pool_size = int(env.get("pool_size") or os.getenv("KIS_POOL_SIZE", DEFAULT_POOL_SIZE))
+            timeout = float(env.get("timeout") or os.getenv("KIS_TIMEOUT", DEFAULT_TIMEOUT))
+            capture = env.get("capture") or os.getenv("KIS_CAPTURE")
+            replay = env.get("replay") or os.getenv("KIS_REPLAY")
+            client = KISClient(env, pool_size=pool_size, timeout=timeout, capture=capture, replay=replay)
+            _CLIENTS[key] = client
+    return client
+
+
+def close_clients() -> None:
+    """Close every pooled session (e.g. at process shutdown)."""
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
@@ -0,0 +1,57 @@
+"""
+Lightweight KIS core shared by app.py, auto_trader.py and cli_test.py.
+
+  config   .env / kis_devlp.yaml -> env dicts, DEFAULT_UNIVERSE
+  tokens   access tokens (in-process cache + shared token store)
+  quotes   inquire-price / multi-price scans behind QUOTE_CACHE
+  orders   order-cash buy/sell, inquire-daily-ccld order status
+  balance  paged inquire-balance, the position cache, orderable cash
+
+Nothing here imports Flask. Names are resolved lazily, so
+`from kis_core import get_env_config` loads only kis_core.config; requests
+comes in with the first module that calls KIS (tokens, quotes, orders, balance).
+"""
+
+import importlib
+from typing import Any, List
+
+_EXPORTS = {
+    "ConfigError": "config",
+    "DEFAULT_UNIVERSE": "config",
+    "env_from_yaml": "config",
+    "get_env_config": "config",
+    "load_env": "config",
+    "load_yaml_config": "config",
+    "TOKEN_CACHE": "tokens",
+    "get_cached_token": "tokens",
+    "get_or_issue_token": "tokens",
+    "issue_token": "tokens",
+    "revoke_token": "tokens",
+    "QUOTE_CACHE": "quotes",
+    "REALTIME_FEEDS": "quotes",
+    "fetch_price": "quotes",
+    "fetch_prices_batch": "quotes",
+    "iter_prices_batch": "quotes",
+    "order_buy": "orders",
+    "order_sell": "orders",
+    "inquire_order": "orders",
+    "cached_balance": "balance",
+    "fetch_balance": "balance",
+    "fetch_orderable_cash": "balance",
+    "iter_balance": "balance",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
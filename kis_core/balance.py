@@ -0,0 +1,47 @@
+"""Account balance: paged inquire-balance, merged raw or parsed and cached by positions.py."""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from kis_client import BALANCE_PATH, PSBL_ORDER_PATH, balance_params, balance_tr_id, get_client, psbl_order_params, psbl_order_tr_id
+from positions import as_float, get_position_cache, load_balance, position_key
+
+
+def iter_balance(env: Dict, token: str, mode: str) -> Iterator[Dict]:
+    """
+    Yield inquire-balance pages as they arrive, following tr_cont and the
+    CTX_AREA_FK100/NK100 keys. Each page has its own output1 holdings;
+    output2 carries account-level totals and is repeated on every page.
+    """
+    return get_client(env).pages(BALANCE_PATH, balance_tr_id(mode), token, balance_params(env))
+
+
+def fetch_balance(env: Dict, token: str, mode: str) -> Dict:
+    """Fetch stock balance with evaluation P/L: every page's output1, output2 from the last page"""
+    merged: Dict[str, Any] = {}
+    holdings: List[Dict] = []
+    for page in iter_balance(env, token, mode):
+        holdings.extend(page.get("output1") or [])
+        totals = page.get("output2") or merged.get("output2")
+        merged.update({k: v for k, v in page.items() if not k.startswith("ctx_area")})
+        merged["output2"] = totals
+        if page.get("rt_cd", "0") != "0":
+            break
+    merged["output1"] = holdings
+    return merged
+
+
+def fetch_orderable_cash(env: Dict, token: str, mode: str, symbol: str) -> float:
+    """
+    주문가능현금 (ord_psbl_cash) from inquire-psbl-order: the deposit net of
+    pending buys and unsettled amounts, i.e. what KIS will actually accept.
+    dnca_tot_amt from inquire-balance overstates it.
+    """
+    resp = get_client(env).get(PSBL_ORDER_PATH, psbl_order_tr_id(mode), token, psbl_order_params(env, symbol))
+    if resp.get("rt_cd", "0") != "0":
+        raise RuntimeError(f"inquire-psbl-order failed: {resp.get('msg_cd', '')} {resp.get('msg1', '')}".strip())
+    return as_float((resp.get("output") or {}).get("ord_psbl_cash"))
+
+
+def cached_balance(env: Dict, token: str, mode: str, max_age: Optional[float] = None) -> tuple:
+    """(parsed positions, cached) from the shared position cache; see positions.load_balance"""
+    return get_position_cache().get(position_key(env), lambda: load_balance(iter_balance(env, token, mode)), max_age)
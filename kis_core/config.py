@@ -0,0 +1,111 @@
+"""
+Environment configuration: .env variables (server, auto_trader) or
+kis_devlp.yaml (cli_test) -> the env dict every KIS call takes.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict
+
+DEFAULT_UNIVERSE = [
+    # Core large caps
+    "005930", "000660", "035420", "207940", "051910", "005380", "068270", "028260", "055550", "006400",
+    "105560", "096770", "034730", "003550", "011170", "017670", "003670", "010130", "018260", "009150",
+    "032830", "034020", "000270", "036570", "012330",
+]
+YAML_REQUIRED = ("my_app", "my_sec", "paper_app", "paper_sec", "my_acct_stock", "my_prod", "prod", "vps", "my_agent")
+
+_ENV_LOADED = False
+
+
+class ConfigError(Exception):
+    pass
+
+
+def load_env() -> None:
+    """Load .env into os.environ once per process (existing variables win)."""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _ENV_LOADED = True
+
+
+def get_env_config(mode: str) -> Dict[str, str]:
+    """Get environment configuration for given mode"""
+    load_env()
+    if mode == "prod":
+        appkey = os.getenv("APP_KEY", "")
+        appsecret = os.getenv("APP_SECRET", "")
+        return {
+            "base": os.getenv("BASE_PROD", "https://openapi.koreainvestment.com:9443"),
+            "appkey": appkey,
+            "appsecret": appsecret,
+            "account": os.getenv("ACCT_STOCK", ""),
+            "product": os.getenv("PROD_CODE", "01"),
+            "agent": os.getenv("USER_AGENT", "MyTradingApp/1.0"),
+            "ws": os.getenv("WS_PROD", "ws://ops.koreainvestment.com:21000"),
+            "hts_id": os.getenv("HTS_ID", ""),
+            "name": "prod",
+        }
+    elif mode == "paper":
+        paper_acct = os.getenv("PAPER_ACCT_STOCK", "")
+        appkey = os.getenv("PAPER_APP_KEY", "")
+        appsecret = os.getenv("PAPER_APP_SECRET", "")
+        return {
+            "base": os.getenv("BASE_PAPER", "https://openapivts.koreainvestment.com:29443"),
+            "appkey": appkey,
+            "appsecret": appsecret,
+            "account": paper_acct if paper_acct else os.getenv("ACCT_STOCK", ""),
+            "product": os.getenv("PROD_CODE", "01"),
+            "agent": os.getenv("USER_AGENT", "MyTradingApp/1.0"),
+            "ws": os.getenv("WS_PAPER", "ws://ops.koreainvestment.com:31000"),
+            "hts_id": os.getenv("PAPER_HTS_ID") or os.getenv("HTS_ID", ""),
+            "name": "paper",
+        }
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+
+def load_yaml_config(path: Path) -> Dict:
+    """Read kis_devlp.yaml (same keys as the official sample) and check the required keys."""
+    if not path.exists():
+        raise ConfigError(f"Config file not found: {path}")
+    import yaml
+
+    with path.open("r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    missing = [k for k in YAML_REQUIRED if not data.get(k)]
+    if missing:
+        raise ConfigError(f"Missing config keys: {', '.join(missing)}")
+    return data
+
+
+def env_from_yaml(cfg: Dict, mode: str) -> Dict:
+    """Env dict for mode from a load_yaml_config result."""
+    if mode == "prod":
+        return {
+            "base": cfg["prod"],
+            "appkey": cfg["my_app"],
+            "appsecret": cfg["my_sec"],
+            "account": cfg["my_acct_stock"],
+            "product": cfg["my_prod"],
+            "agent": cfg["my_agent"],
+            "name": "prod",
+            "pool_size": cfg.get("pool_size"),
+            "timeout": cfg.get("timeout"),
+        }
+    if mode == "paper":
+        return {
+            "base": cfg["vps"],
+            "appkey": cfg["paper_app"],
+            "appsecret": cfg["paper_sec"],
+            "account": cfg.get("my_paper_stock", cfg["my_acct_stock"]),  # 모의 계좌가 없으면 실전 계좌 사용
+            "product": cfg["my_prod"],
+            "agent": cfg["my_agent"],
+            "name": "paper",
+            "pool_size": cfg.get("pool_size"),
+            "timeout": cfg.get("timeout"),
+        }
+    raise ConfigError(f"Unknown mode: {mode}")
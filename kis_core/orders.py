@@ -0,0 +1,34 @@
+"""Cash orders (order-cash) and their status (inquire-daily-ccld); every order marks the account's cached positions stale."""
+
+import time
+from typing import Dict, Optional
+
+from kis_client import CCLD_PATH, ORDER_PATH, ccld_params, ccld_tr_id, get_client, order_body, order_tr_id
+from positions import invalidate_positions
+
+
+def order_buy(env: Dict, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
+    """Place buy order"""
+    body = order_body(env, "buy", symbol, qty, price, order_type)
+    try:
+        return get_client(env).post(ORDER_PATH, order_tr_id("buy"), token, body)
+    finally:
+        invalidate_positions(env)
+
+
+def order_sell(env: Dict, token: str, symbol: str, qty: int, price: int = 0, order_type: str = "00") -> Dict:
+    """Place sell order"""
+    body = order_body(env, "sell", symbol, qty, price, order_type)
+    try:
+        return get_client(env).post(ORDER_PATH, order_tr_id("sell"), token, body)
+    finally:
+        invalidate_positions(env)
+
+
+def inquire_order(env: Dict, token: str, order_no: str = "", day: Optional[str] = None) -> Dict:
+    """
+    주문 조회: one inquire-daily-ccld page for day (yyyymmdd, default today);
+    output1 holds only order_no when given, else every order of the day.
+    """
+    params = ccld_params(env, day or time.strftime("%Y%m%d"), odno=order_no or "")
+    return get_client(env).get(CCLD_PATH, ccld_tr_id(env.get("name", "")), token, params)
@@ -0,0 +1,149 @@
+"""
+Quotes: single inquire-price calls and universe scans behind QUOTE_CACHE.
+
+Scans answer from a running WebSocket feed in REALTIME_FEEDS when one
+has ticks (app.py registers its feeds there), then from fresh cache
+entries, and send only the rest upstream. The async engine (aiohttp) is
+imported only when SCAN_ENGINE=async.
+"""
+
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+from kis_client import PRICE_PATH, get_client, price_params
+from kis_core.config import load_env
+from quote_cache import QuoteCache
+from scanner import (
+    MULTI_PRICE_PATH,
+    ScanResult,
+    iter_scan,
+    multi_price_chunks,
+    multi_price_params,
+    scan_symbols,
+    split_multi_price,
+)
+
+if TYPE_CHECKING:
+    from realtime import RealtimeFeed
+
+load_env()
+
+# Short-lived quote cache shared by /api/price, /api/recommend, /api/portfolio (TTL 0 disables)
+QUOTE_CACHE = QuoteCache(
+    ttl=float(os.getenv("QUOTE_CACHE_TTL", "2")),
+    max_size=int(os.getenv("QUOTE_CACHE_SIZE", "5000")),
+)
+REALTIME_FEEDS: Dict[str, "RealtimeFeed"] = {}
+
+# Cache keys are (mode, market, symbol, tr_id): a multi-price row (inter_* fields)
+# must never answer a caller that expects the full inquire-price output.
+PRICE_TR_ID = "FHKST01010100"
+MULTI_PRICE_TR_ID = "FHKST11300006"
+
+
+def _request_price(env: Dict, token: str, symbol: str, market: str) -> Dict:
+    return get_client(env).get(PRICE_PATH, PRICE_TR_ID, token, price_params(symbol, market))
+
+
+def fetch_price(env: Dict, token: str, symbol: str, market: str) -> Dict:
+    """Fetch stock price (served from QUOTE_CACHE when fresh)"""
+    key = (env.get("name"), market, symbol, PRICE_TR_ID)
+    return QUOTE_CACHE.get_or_fetch(key, lambda: _request_price(env, token, symbol, market))
+
+
+def _request_prices_batch(env: Dict, token: str, symbols: List[str], market: str, concurrency: Optional[int] = None) -> List[ScanResult]:
+    if os.getenv("SCAN_ENGINE") == "async":
+        from kis_async import scan_quotes_sync
+
+        return scan_quotes_sync(env, token, symbols, market, concurrency)
+    if env.get("name") == "paper":
+        return scan_symbols(symbols, lambda s: _request_price(env, token, s, market), concurrency)
+
+    def fetch_chunk(chunk: str) -> Dict:
+        return get_client(env).get(MULTI_PRICE_PATH, MULTI_PRICE_TR_ID, token, multi_price_params(chunk, market))
+
+    results: List[ScanResult] = []
+    for chunk, resp, err in scan_symbols(multi_price_chunks(symbols), fetch_chunk, concurrency):
+        results.extend(split_multi_price(chunk, resp, err))
+    return results
+
+
+def fetch_prices_batch(env: Dict, token: str, symbols: List[str], market: str, concurrency: Optional[int] = None) -> List[ScanResult]:
+    """
+    Fetch quotes for many symbols via 관심종목(멀티종목) 시세조회 (FHKST11300006),
+    MULTI_PRICE_MAX symbols per call. Returns [(symbol, {"output": {...}}, error)]
+    in input order, like scan_symbols. The endpoint is prod-only, so paper mode
+    falls back to one inquire-price call per symbol. Symbols with a live
+    WebSocket tick are answered from the realtime store, fresh QUOTE_CACHE
+    entries are reused, and only the rest go upstream.
+    """
+    mode = env.get("name")
+    live = _live_quotes(mode, market, symbols)
+    if len(live) == len(symbols):
+        return [(sym, live[sym], None) for sym in symbols]
+
+    rest = [s for s in symbols if s not in live]
+    tr_id = _batch_tr_id(mode)
+    fetch_missing = _cache_filler(env, token, market, concurrency)
+    cached = dict(zip(rest, QUOTE_CACHE.get_many([(mode, market, s, tr_id) for s in rest], fetch_missing)))
+    return [(sym, live[sym], None) if sym in live else (sym, *cached[sym]) for sym in symbols]
+
+
+def iter_prices_batch(env: Dict, token: str, symbols: List[str], market: str, concurrency: Optional[int] = None) -> Iterator[ScanResult]:
+    """
+    Streaming form of fetch_prices_batch: yields (symbol, resp, error) in
+    completion order. Realtime ticks come first, then each multi-price chunk
+    (one symbol per call in paper) as soon as it returns.
+    """
+    mode = env.get("name")
+    live = _live_quotes(mode, market, symbols)
+    for sym in symbols:
+        if sym in live:
+            yield sym, live[sym], None
+
+    rest = [s for s in symbols if s not in live]
+    tr_id = _batch_tr_id(mode)
+    fetch_missing = _cache_filler(env, token, market, 1)
+
+    def fetch_group(group: str) -> List[ScanResult]:
+        syms = group.split(",")
+        cached = QUOTE_CACHE.get_many([(mode, market, s, tr_id) for s in syms], fetch_missing)
+        return [(sym, *c) for sym, c in zip(syms, cached)]
+
+    groups = rest if mode == "paper" else multi_price_chunks(rest)
+    for group, rows, err in iter_scan(groups, fetch_group, concurrency):
+        if err:
+            for sym in group.split(","):
+                yield sym, None, err
+        else:
+            yield from rows
+
+
+def _live_quotes(mode: str, market: str, symbols: List[str]) -> Dict[str, Dict]:
+    """Quotes answerable from the running WebSocket tick store."""
+    live: Dict[str, Dict] = {}
+    feed = REALTIME_FEEDS.get(mode)
+    if feed is not None and feed.connected.is_set() and market in feed.ticks:
+        store = feed.ticks[market]
+        for sym in symbols:
+            quote = store.quote(sym)
+            if quote is not None:
+                live[sym] = quote
+    return live
+
+
+def _batch_tr_id(mode: str) -> str:
+    """TR a universe scan answers with: one inquire-price per symbol in paper, multi-price in prod."""
+    return PRICE_TR_ID if mode == "paper" else MULTI_PRICE_TR_ID
+
+
+def _cache_filler(env: Dict, token: str, market: str, concurrency: Optional[int]):
+    """fetch_many callback for QUOTE_CACHE.get_many over (mode, market, symbol, tr_id) keys."""
+    mode = env.get("name")
+    tr_id = _batch_tr_id(mode)
+
+    def fetch_missing(keys: List[Any]) -> Dict[Any, Any]:
+        fetched = _request_prices_batch(env, token, [k[2] for k in keys], market, concurrency)
+        return {(mode, market, sym, tr_id): (resp, err) for sym, resp, err in fetched}
+
+    return fetch_missing
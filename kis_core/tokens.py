@@ -0,0 +1,68 @@
+"""Access tokens: an in-process cache in front of the shared token store (token_store.py)."""
+
+import time
+from typing import Any, Dict, Optional
+
+from kis_client import get_client
+from token_store import get_token_store
+
+TOKEN_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def get_cached_token(mode: str, env: Optional[Dict] = None) -> Optional[str]:
+    """Return cached token if still valid (in-process first, then the persistent store when env is given)."""
+    cache = TOKEN_CACHE.get(mode)
+    if cache:
+        expires_at = cache.get("expires_at")
+        if expires_at and expires_at > time.time():
+            return cache.get("token")
+    if not env or not env.get("appkey"):
+        return None
+    stored = get_token_store().get(env["appkey"], mode)
+    if not stored:
+        return None
+    TOKEN_CACHE[mode] = {"token": stored[0], "expires_at": stored[1]}
+    return stored[0]
+
+
+def issue_token(env: Dict) -> Dict:
+    """Issue access token"""
+    if not env.get("appkey") or not env.get("appsecret"):
+        raise ValueError("appkey or appsecret is missing")
+    body = {
+        "grant_type": "client_credentials",
+        "appkey": env["appkey"],
+        "appsecret": env["appsecret"],
+    }
+    return get_client(env).post("/oauth2/tokenP", None, None, body)
+
+
+def revoke_token(env: Dict, token: str) -> Dict:
+    """Revoke access token"""
+    if not env.get("appkey") or not env.get("appsecret"):
+        raise ValueError("appkey or appsecret is missing")
+
+    body = {
+        "token": token,
+        "appkey": env["appkey"],
+        "appsecret": env["appsecret"],
+    }
+    return get_client(env).post("/oauth2/revokeP", None, None, body)
+
+
+def get_or_issue_token(env: Dict, mode: str) -> str:
+    """
+    Return cached token if valid, else issue new and cache it.
+    The persistent token store is shared across processes, so restarts and
+    CLI runs reuse a live token instead of calling tokenP again.
+    """
+    cached = get_cached_token(mode)
+    if cached:
+        return cached
+    token, expires_at = get_token_store().get_or_issue(env.get("appkey", ""), mode, lambda: issue_token(env))
+    if token and expires_at:
+        TOKEN_CACHE[mode] = {
+            "token": token,
+            "expires_at": expires_at,
+        }
+    return token
@@ -0,0 +1,311 @@
+"""
+Local stand-in for the KIS REST API, for offline runs and benchmarks.
+
+Implements tokenP/revokeP/Approval, inquire-price, intstock-multprice,
+inquire-balance (paged with tr_cont and CTX_AREA keys), inquire-psbl-order,
+order-cash and inquire-daily-ccld over a simulated account: orders fill in
+full at the quoted price after fill_delay seconds and then show up in the
+balance.
+Every call can be slowed (latency + uniform jitter), fail at random
+(error_rate, HTTP 500) and be throttled per appkey the way KIS does
+(EGW00201 above `rate` calls per second):
+
+    python kis_standin.py --port 29443 --latency 0.03 --jitter 0.01 --rate 20
+    BASE_PAPER=http://127.0.0.1:29443 python app.py
+
+The WebSocket side is ws_replay.py.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from rate_limit import THROTTLE_CODE
+
+PAGE_SIZES = {"VTTC8434R": 20, "TTTC8434R": 50, "VTTC0081R": 15, "TTTC0081R": 100}
+
+
+def quote_for(symbol: str) -> Tuple[int, float]:
+    """Deterministic (price, change rate) per symbol."""
+    h = zlib.crc32(symbol.encode())
+    return 1000 + h % 99000 // 10 * 10, round((h >> 8) % 601 / 100 - 3.0, 2)
+
+
+class Account:
+    """Simulated cash account: holdings and today's orders."""
+
+    def __init__(self, holdings: int = 30, cash: float = 100_000_000, fill_delay: float = 0.2):
+        self.cash = cash
+        self.fill_delay = fill_delay
+        self.holdings: Dict[str, Dict[str, float]] = {}
+        for i in range(holdings):
+            sym = f"{(i * 7919) % 900000 + 100000:06d}"
+            price, _ = quote_for(sym)
+            self.holdings[sym] = {"qty": 10 + i % 50, "avg": price}
+        self.orders: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def place(self, side: str, symbol: str, qty: int) -> str:
+        with self.lock:
+            odno = f"{len(self.orders) + 1:010d}"
+            self.orders.append(
+                {"odno": odno, "side": side, "symbol": symbol, "qty": qty, "at": time.time(), "filled": False, "price": quote_for(symbol)[0]}
+            )
+            return odno
+
+    def settle(self) -> None:
+        """Apply every order whose fill time has passed."""
+        now = time.time()
+        with self.lock:
+            for o in self.orders:
+                if o["filled"] or now - o["at"] < self.fill_delay:
+                    continue
+                o["filled"] = True
+                h = self.holdings.setdefault(o["symbol"], {"qty": 0, "avg": o["price"]})
+                if o["side"] == "buy":
+                    h["avg"] = (h["avg"] * h["qty"] + o["price"] * o["qty"]) / (h["qty"] + o["qty"])
+                    h["qty"] += o["qty"]
+                    self.cash -= o["price"] * o["qty"]
+                else:
+                    h["qty"] = max(0, h["qty"] - o["qty"])
+                    self.cash += o["price"] * o["qty"]
+                    if not h["qty"]:
+                        del self.holdings[o["symbol"]]
+
+    def orderable_cash(self) -> float:
+        """Cash less the notional of buys that have not filled yet."""
+        self.settle()
+        with self.lock:
+            return self.cash - sum(o["price"] * o["qty"] for o in self.orders if o["side"] == "buy" and not o["filled"])
+
+    def balance_rows(self) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+        self.settle()
+        rows, total = [], 0.0
+        with self.lock:
+            for sym, h in sorted(self.holdings.items()):
+                price, _ = quote_for(sym)
+                total += price * h["qty"]
+                rows.append(
+                    {
+                        "pdno": sym,
+                        "hldg_qty": str(int(h["qty"])),
+                        "pchs_avg_pric": f"{h['avg']:.4f}",
+                        "prpr": str(price),
+                        "evlu_amt": str(int(price * h["qty"])),
+                        "evlu_pfls_rt": f"{(price / h['avg'] - 1) * 100:.2f}",
+                    }
+                )
+            cash = self.cash
+        totals = {
+            "dnca_tot_amt": str(int(cash)),
+            "evlu_amt_smtl_amt": str(int(total)),
+            "tot_evlu_amt": str(int(cash + total)),
+            "pchs_amt_smtl_amt": str(int(sum(h["avg"] * h["qty"] for h in self.holdings.values()))),
+        }
+        return rows, totals
+
+    def ccld_rows(self) -> List[Dict[str, str]]:
+        self.settle()
+        with self.lock:
+            return [
+                {
+                    "odno": o["odno"],
+                    "pdno": o["symbol"],
+                    "sll_buy_dvsn_cd": "01" if o["side"] == "sell" else "02",
+                    "ord_qty": str(o["qty"]),
+                    "tot_ccld_qty": str(o["qty"] if o["filled"] else 0),
+                    "rmn_qty": "0" if o["filled"] else str(o["qty"]),
+                    "avg_prvs": str(o["price"] if o["filled"] else 0),
+                    "tot_ccld_amt": str(o["price"] * o["qty"] if o["filled"] else 0),
+                    "rjct_qty": "0",
+                    "cncl_yn": "",
+                }
+                for o in reversed(self.orders)
+            ]
+
+
+class StandIn:
+    """Configurable stand-in server; start() runs it on a daemon thread."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate: float = 0.0,
+        account: Optional[Account] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate = rate
+        self.account = account or Account()
+        self.random = random.Random(seed)
+        self.counts: Dict[str, int] = {"requests": 0, "errors": 0, "throttled": 0}
+        self._windows: Dict[str, List[float]] = {}  # appkey -> [window start, calls]
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandIn":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="kis-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _admit(self, appkey: str) -> Optional[str]:
+        """None to serve the call, else 'throttled' or 'error'."""
+        with self._lock:
+            self.counts["requests"] += 1
+            if self.rate > 0:
+                now = time.monotonic()
+                window = self._windows.setdefault(appkey, [now, 0])
+                if now - window[0] >= 1.0:
+                    window[0], window[1] = now, 0
+                window[1] += 1
+                if window[1] > self.rate:
+                    self.counts["throttled"] += 1
+                    return "throttled"
+            if self.error_rate > 0 and self.random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return "error"
+        return None
+
+    def _delay(self) -> None:
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, obj: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _gate(self) -> bool:
+                standin._delay()
+                verdict = standin._admit(self.headers.get("appkey", ""))
+                if verdict == "throttled":
+                    self._send({"rt_cd": "1", "msg_cd": THROTTLE_CODE, "msg1": "초당 거래건수를 초과하였습니다."}, 500)
+                elif verdict == "error":
+                    self._send({"rt_cd": "1", "msg_cd": "EGW00500", "msg1": "stand-in injected error"}, 500)
+                return verdict is None
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = urlparse(self.path).path
+                if not self._gate():
+                    return
+                if path.endswith("/oauth2/tokenP"):
+                    self._send({"access_token": f"standin-{int(time.time())}", "token_type": "Bearer", "expires_in": 86400})
+                elif path.endswith("/oauth2/revokeP"):
+                    self._send({"code": 200, "message": "ok"})
+                elif path.endswith("/oauth2/Approval"):
+                    self._send({"approval_key": "standin-approval"})
+                elif path.endswith("/order-cash"):
+                    side = "sell" if self.headers.get("tr_id", "").endswith("0011U") else "buy"
+                    odno = standin.account.place(side, body.get("PDNO", ""), int(body.get("ORD_QTY") or 0))
+                    self._send({"rt_cd": "0", "msg_cd": "APBK0013", "msg1": "주문 전송 완료 되었습니다.", "output": {"ODNO": odno, "ORD_TMD": time.strftime("%H%M%S")}})
+                else:
+                    self._send({"rt_cd": "1", "msg1": f"unknown path {path}"}, 404)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                if not self._gate():
+                    return
+                if url.path.endswith("/inquire-price"):
+                    price, rate = quote_for(q.get("FID_INPUT_ISCD", ""))
+                    self._send({"rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.", "output": {"stck_prpr": str(price), "prdy_ctrt": str(rate), "acml_vol": "100000"}})
+                elif url.path.endswith("/intstock-multprice"):
+                    rows = []
+                    for key in sorted(k for k in q if k.startswith("FID_INPUT_ISCD_")):
+                        price, rate = quote_for(q[key])
+                        rows.append({"inter_shrn_iscd": q[key], "inter2_prpr": str(price), "prdy_ctrt": str(rate), "acml_vol": "100000"})
+                    self._send({"rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.", "output": rows})
+                elif url.path.endswith("/inquire-balance"):
+                    rows, totals = standin.account.balance_rows()
+                    self._page(rows, {"output2": [totals]}, q)
+                elif url.path.endswith("/inquire-daily-ccld"):
+                    self._page(standin.account.ccld_rows(), {"output2": {}}, q)
+                elif url.path.endswith("/inquire-psbl-order"):
+                    cash = str(int(standin.account.orderable_cash()))
+                    self._send({"rt_cd": "0", "msg_cd": "KIOK0510", "msg1": "조회가 완료되었습니다", "output": {"ord_psbl_cash": cash, "nrcvb_buy_amt": cash}})
+                else:
+                    self._send({"rt_cd": "1", "msg1": f"unknown path {url.path}"}, 404)
+
+            def _page(self, rows: List[Dict], extra: Dict[str, Any], q: Dict[str, str]) -> None:
+                size = PAGE_SIZES.get(self.headers.get("tr_id", ""), 50)
+                start = int(q.get("CTX_AREA_NK100") or 0) if self.headers.get("tr_cont") == "N" else 0
+                more = start + size < len(rows)
+                self._send(
+                    {
+                        "rt_cd": "0",
+                        "msg_cd": "KIOK0510",
+                        "msg1": "조회가 완료되었습니다",
+                        "output1": rows[start:start + size],
+                        "ctx_area_fk100": q.get("CANO", ""),
+                        "ctx_area_nk100": str(start + size),
+                        **extra,
+                    },
+                    headers={"tr_cont": "M" if more else "D"},
+                )
+
+        return Handler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Offline stand-in for the KIS REST API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=29443)
+    p.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    p.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds around latency")
+    p.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    p.add_argument("--rate", type=float, default=0.0, help="calls per second per appkey before EGW00201 (0 = unlimited)")
+    p.add_argument("--holdings", type=int, default=30, help="positions in the simulated account")
+    p.add_argument("--fill-delay", type=float, default=0.2, help="seconds until an order fills")
+    return p
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    standin = StandIn(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate, Account(args.holdings, fill_delay=args.fill_delay)
+    )
+    print(f"KIS stand-in on {standin.url} (latency={args.latency}s jitter={args.jitter}s errors={args.error_rate} rate={args.rate}/s)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
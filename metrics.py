@@ -0,0 +1,163 @@
+"""
+In-process metrics in Prometheus text format.
+
+KISClient/AsyncKISClient record every round trip per tr_id (OAuth calls
+are labelled by path): latency histogram, errors by msg_cd (or http_<status>),
+throttle retries and time spent waiting on the rate limiter. The Flask app
+adds per-route latency and cache hit counts and serves REGISTRY.expose()
+at /metrics; auto_trader --metrics-file writes the same text at exit for
+node_exporter's textfile collector.
+
+Recording is a bisect plus a few increments under one lock per metric, so
+it stays on in production.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in items)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[Any]] = {}  # labels -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self.series.items())
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def counter(self, name: str, doc: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, doc, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, doc, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self, name: str, kind: str, doc: str, fn: Callable[[], Iterable[Sample]]) -> None:
+        """Add a metric read at scrape time: fn yields (labels, value) pairs; kind is counter or gauge."""
+        self.collectors.append((name, kind, doc, fn))
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        for name, kind, doc, fn in self.collectors:
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {doc}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(labels, labels.values())} {_num(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+KIS_LATENCY = REGISTRY.histogram("kis_request_duration_seconds", "KIS round trip time per attempt", ("tr_id", "method"))
+KIS_ERRORS = REGISTRY.counter("kis_errors_total", "KIS calls answered with rt_cd != 0 or an HTTP error, by msg_cd", ("tr_id", "msg_cd"))
+KIS_THROTTLES = REGISTRY.counter("kis_throttled_total", "KIS attempts answered with EGW00201", ("tr_id",))
+KIS_RETRIES = REGISTRY.counter("kis_retries_total", "KIS attempts repeated after a throttle", ("tr_id",))
+KIS_RATE_WAIT = REGISTRY.counter("kis_rate_limit_wait_seconds_total", "Time callers spent waiting on the appkey rate limiter (summed over concurrent callers)", ("tr_id",))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "Flask handler time (streamed bodies excluded)", ("route", "method", "status"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def tr_label(tr_id: Optional[str], path: str) -> str:
+    return tr_id or path.rsplit("/", 1)[-1]
+
+
+def record_error(tr_id: str, data: Any, status: Optional[int] = None) -> None:
+    """Count a failed call: msg_cd from the decoded body if there is one, else http_<status>."""
+    msg_cd = data.get("msg_cd") if isinstance(data, dict) else None
+    KIS_ERRORS.inc(tr_id, msg_cd or (f"http_{status}" if status else "unknown"))
+
+
+def record_result(tr_id: str, data: Any) -> Any:
+    """Count rt_cd != 0 bodies; returns data so callers can wrap their decode."""
+    if isinstance(data, dict) and data.get("rt_cd", "0") != "0":
+        record_error(tr_id, data)
+    return data
+
+
+def write_textfile(path: str) -> None:
+    """Write REGISTRY.expose() to path atomically (node_exporter textfile collector)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.expose())
+    os.replace(tmp, path)
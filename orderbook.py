@@ -0,0 +1,161 @@
+"""
+10-level order book depth store fed by 실시간호가 (H0STASP0 / H0NXASP0 / H0UNASP0).
+
+Each symbol owns one preallocated array('d') that every update overwrites
+in place, so a busy feed creates no per-message containers. Readers get
+best bid/ask, spread and a depth-weighted mid in O(1) from cached slots,
+guarded by a sequence counter so they never see a half-applied update.
+"""
+
+import time
+from array import array
+from typing import Dict, List, Optional
+
+LEVELS = 10
+# slot layout inside OrderBook.data
+_ASK, _BID, _ASK_QTY, _BID_QTY = 0, LEVELS, 2 * LEVELS, 3 * LEVELS
+_TOTAL_ASK, _TOTAL_BID, _MID, _UPDATED = 4 * LEVELS, 4 * LEVELS + 1, 4 * LEVELS + 2, 4 * LEVELS + 3
+_SLOTS = 4 * LEVELS + 4
+# first price field of a record (docs/API/국내주식 실시간호가 (KRX)-표 1.csv); ASKP1..10, BIDP1..10,
+# ASKP_RSQN1..10, BIDP_RSQN1..10, TOTAL_ASKP_RSQN, TOTAL_BIDP_RSQN follow in slot order
+_F_ASK = 3
+
+# 실시간호가 tr_id and record width per market (J=KRX, NX=Nextrade, UN=Unified)
+DEPTH_TR_IDS = {"J": ("H0STASP0", 59), "NX": ("H0NXASP0", 65), "UN": ("H0UNASP0", 65)}
+
+
+class OrderBook:
+    __slots__ = ("symbol", "data", "hour", "seq")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.data = array("d", bytes(8 * _SLOTS))
+        self.hour = ""
+        self.seq = 0
+
+    def apply(self, fields: List[str], base: int, received_at: float) -> None:
+        """
+        Overwrite the book from one record starting at fields[base].
+        Fields are parsed before the write starts, so a malformed record
+        raises ValueError and leaves the book (and seq) untouched.
+        """
+        start = base + _F_ASK
+        values = [float(f or 0) for f in fields[start:start + 4 * LEVELS + 2]]
+        if len(values) != 4 * LEVELS + 2:
+            raise ValueError(f"short depth record for {self.symbol}")
+        ask_depth = bid_depth = ask_notional = bid_notional = 0.0
+        for i in range(LEVELS):
+            q = values[_ASK_QTY + i]
+            ask_depth += q
+            ask_notional += q * values[_ASK + i]
+            q = values[_BID_QTY + i]
+            bid_depth += q
+            bid_notional += q * values[_BID + i]
+        if ask_depth > 0 and bid_depth > 0:
+            # each side's VWAP weighted by the opposite side's depth (micro-price over the book)
+            ask_vwap = ask_notional / ask_depth
+            bid_vwap = bid_notional / bid_depth
+            mid = (ask_vwap * bid_depth + bid_vwap * ask_depth) / (ask_depth + bid_depth)
+        else:
+            mid = 0.0
+
+        data = self.data
+        self.seq += 1  # odd: write in progress
+        for i, v in enumerate(values):
+            data[i] = v
+        data[_MID] = mid
+        data[_UPDATED] = received_at
+        self.hour = fields[base + 1]
+        self.seq += 1
+
+    def _read(self, slot: int) -> float:
+        while True:
+            seq = self.seq
+            value = self.data[slot]
+            if not seq & 1 and seq == self.seq:
+                return value
+
+    @property
+    def best_ask(self) -> float:
+        return self._read(_ASK)
+
+    @property
+    def best_bid(self) -> float:
+        return self._read(_BID)
+
+    @property
+    def spread(self) -> float:
+        while True:
+            seq = self.seq
+            value = self.data[_ASK] - self.data[_BID]
+            if not seq & 1 and seq == self.seq:
+                return value
+
+    @property
+    def depth_weighted_mid(self) -> float:
+        return self._read(_MID)
+
+    def snapshot(self) -> Dict:
+        """Consistent copy of the whole book for display."""
+        while True:
+            seq = self.seq
+            data = self.data.tolist()
+            hour = self.hour
+            if not seq & 1 and seq == self.seq:
+                break
+        return {
+            "symbol": self.symbol,
+            "time": hour,
+            "asks": [[data[_ASK + i], data[_ASK_QTY + i]] for i in range(LEVELS)],
+            "bids": [[data[_BID + i], data[_BID_QTY + i]] for i in range(LEVELS)],
+            "total_ask_qty": data[_TOTAL_ASK],
+            "total_bid_qty": data[_TOTAL_BID],
+            "best_ask": data[_ASK],
+            "best_bid": data[_BID],
+            "spread": data[_ASK] - data[_BID],
+            "depth_weighted_mid": round(data[_MID], 2),
+            "age": round(time.time() - data[_UPDATED], 3) if data[_UPDATED] else None,
+        }
+
+
+class DepthStore:
+    """symbol -> OrderBook; books are created once and then reused."""
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        self.updates = 0
+        self.dropped = 0
+
+    def get(self, symbol: str) -> Optional[OrderBook]:
+        book = self.books.get(symbol)
+        if book is None or not book.data[_UPDATED]:
+            return None
+        return book
+
+    def apply(self, payload: str, count: int, width: int) -> None:
+        fields = payload.split("^")
+        if len(fields) < count * width:
+            count = len(fields) // width
+        now = time.time()
+        books = self.books
+        applied = 0
+        for base in range(0, count * width, width):
+            symbol = fields[base]
+            book = books.get(symbol)
+            if book is None:
+                book = books[symbol] = OrderBook(symbol)
+            try:
+                book.apply(fields, base, now)
+            except ValueError:
+                self.dropped += 1  # malformed record; the book keeps its last good state
+                continue
+            applied += 1
+        self.updates += applied
+
+
+def limit_price(book: Optional[OrderBook], side: str, fallback: float) -> float:
+    """Marketable limit price from the book: best ask to buy, best bid to sell."""
+    if book is None:
+        return fallback
+    price = book.best_ask if side == "buy" else book.best_bid
+    return price if price > 0 else fallback
@@ -0,0 +1,187 @@
+"""
+Position and balance cache shared by the Flask server, auto_trader and cli_test.
+
+inquire-balance is one of the slower trading TRs, so the parsed holdings
+and account totals (not the raw pages) are kept in a SQLite file per account
+(mode + account + product) and served locally until one of these happens:
+  - this or another process on the host places an order (invalidate),
+  - a fill notice arrives (fills.FillTracker listener -> invalidate),
+  - the entry is older than POSITION_CACHE_TTL seconds (full refresh).
+Refreshes run under SQLite's write lock, so concurrent readers of a stale
+entry share one reload instead of each paging through inquire-balance.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+DEFAULT_PATH = Path.home() / ".kis" / "positions.db"
+DEFAULT_TTL = 60.0
+LOCK_TIMEOUT = 30.0
+
+
+def as_float(val) -> float:
+    try:
+        return float(str(val).replace(",", ""))
+    except Exception:
+        return 0.0
+
+
+def parse_holdings(balance: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    holdings_list = balance.get("output1") or []
+    holdings = {}
+    if isinstance(holdings_list, list):
+        for h in holdings_list:
+            sym = h.get("pdno")
+            if not sym:
+                continue
+            holdings[sym] = {
+                "name": h.get("prdt_name", ""),
+                "qty": as_float(h.get("hldg_qty")),
+                "avg": as_float(h.get("pchs_avg_pric")),
+                "plrt": as_float(h.get("evlu_pfls_rt")),
+                "price": as_float(h.get("prpr")),
+            }
+    return holdings
+
+
+def parse_totals(balance: Dict[str, Any]) -> Dict[str, float]:
+    totals = {}
+    block = None
+    o2 = balance.get("output2")
+    if isinstance(o2, list) and o2:
+        block = o2[0]
+    elif isinstance(o2, dict):
+        block = o2
+    if not block:
+        return {}
+    for k in ["tot_evlu_amt", "evlu_amt_smtl_amt", "evlu_pfls_smtl_amt", "pchs_amt_smtl_amt", "dnca_tot_amt", "asst_icdc_erng_rt"]:
+        totals[k] = as_float(block.get(k))
+    return totals
+
+
+def load_balance(pages: Iterable[Dict]) -> Dict[str, Any]:
+    """
+    Parse inquire-balance pages one at a time, keeping only the holding
+    fields and the latest account totals (output2 repeats on every page),
+    so memory stays bounded on large accounts.
+    Returns {"holdings", "totals", "rt_cd", "msg_cd", "msg1", "loaded_at"}.
+    """
+    holdings: Dict[str, Dict[str, Any]] = {}
+    totals: Dict[str, float] = {}
+    status: Dict[str, str] = {"rt_cd": "0", "msg_cd": "", "msg1": ""}
+    for page in pages:
+        holdings.update(parse_holdings(page))
+        totals = parse_totals(page) or totals
+        status = {k: page.get(k, v) for k, v in status.items()}
+        if status["rt_cd"] != "0":
+            break
+    return {"holdings": holdings, "totals": totals, **status, "loaded_at": time.time()}
+
+
+def position_key(env: Dict[str, Any]) -> str:
+    return hashlib.sha256(f"{env.get('name', '')}:{env.get('account', '')}:{env.get('product', '')}".encode()).hexdigest()
+
+
+class PositionCache:
+    def __init__(self, path: Path = DEFAULT_PATH, ttl: float = DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if not self.path.exists():
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.path, 0o600)
+        self._local = threading.local()
+        self.hits = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions (key TEXT PRIMARY KEY, entry TEXT, loaded_at REAL, valid INTEGER)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=LOCK_TIMEOUT, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _fresh(self, key: str, max_age: float) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT entry, loaded_at, valid FROM positions WHERE key = ?", (key,)).fetchone()
+        if row and row[2] and time.time() - row[1] <= max_age:
+            return json.loads(row[0])
+        return None
+
+    def get(self, key: str, load: Callable[[], Dict[str, Any]], max_age: Optional[float] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        (entry, cached): a valid entry at most max_age (default ttl) seconds
+        old, else load() (a load_balance result) stored under the write lock.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        if self.ttl <= 0:
+            return load(), False
+        entry = self._fresh(key, max_age)
+        if entry is not None:
+            self.hits += 1
+            return entry, True
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            entry = self._fresh(key, max_age)
+            if entry is not None:
+                conn.execute("COMMIT")
+                self.hits += 1
+                return entry, True
+            entry = load()
+            if entry.get("rt_cd", "0") == "0":
+                conn.execute(
+                    "INSERT OR REPLACE INTO positions (key, entry, loaded_at, valid) VALUES (?, ?, ?, 1)",
+                    (key, json.dumps(entry, ensure_ascii=False), entry["loaded_at"]),
+                )
+            conn.execute("COMMIT")
+            self.refreshes += 1
+            return entry, False
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, key: str) -> None:
+        """Positions changed (order placed or filled): the next read reloads."""
+        if self.ttl <= 0:
+            return
+        self._connect().execute("UPDATE positions SET valid = 0 WHERE key = ?", (key,))
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ttl": self.ttl, "hits": self.hits, "refreshes": self.refreshes, "invalidations": self.invalidations}
+
+
+_CACHE: Optional[PositionCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_position_cache() -> PositionCache:
+    """Process-wide cache at POSITION_CACHE (default ~/.kis/positions.db), ttl POSITION_CACHE_TTL (0 disables)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PositionCache(
+                    Path(os.getenv("POSITION_CACHE", str(DEFAULT_PATH))).expanduser(),
+                    float(os.getenv("POSITION_CACHE_TTL", DEFAULT_TTL)),
+                )
+    return _CACHE
+
+
+def invalidate_positions(env: Dict[str, Any]) -> None:
+    """Mark env's account positions stale after placing an order; never raises."""
+    try:
+        get_position_cache().invalidate(position_key(env))
+    except Exception as e:
+        print(f"Position cache invalidation failed: {e}")
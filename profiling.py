@@ -0,0 +1,136 @@
+"""
+Opt-in wall-clock sampling profiler for single Flask requests.
+
+A background thread samples the stacks of the request thread and the
+quote-scan workers (scan-* pool threads, the kis-async loop) every
+PROFILE_INTERVAL seconds while the request runs, skipping idle pool
+workers. Wall-clock samples show network and rate-limit waits next to
+JSON decoding, masking and sorting, which a deterministic profiler of the
+request thread alone would miss.
+
+Output is either a folded-stacks file ("thread;outer;...;leaf count"
+lines, the input format of flamegraph.pl, speedscope and inferno) or an
+inline summary of the hottest functions.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_DIR = Path.home() / ".kis" / "profiles"
+DEFAULT_INTERVAL = 0.002
+WORKER_PREFIXES = ("scan", "kis-async")
+MAX_DEPTH = 128
+
+
+def _idle(frame: Any) -> bool:
+    """A pool worker blocked on its work queue (waiting for a task, not for KIS)."""
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+
+def _frame_label(code: Any) -> str:
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the given thread plus worker threads until stop(); stacks are kept as folded counts."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = DEFAULT_INTERVAL, prefixes: Tuple[str, ...] = WORKER_PREFIXES):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.prefixes = prefixes
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.seconds = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _targets(self) -> Dict[int, str]:
+        targets = {}
+        for t in threading.enumerate():
+            if t.ident == self.thread_id:
+                targets[t.ident] = "request"
+            elif t.ident is not None and t.name.startswith(self.prefixes):
+                targets[t.ident] = t.name
+        return targets
+
+    def _sample(self) -> None:
+        targets = self._targets()
+        for ident, frame in sys._current_frames().items():
+            name = targets.get(ident)
+            if name is None or (name != "request" and _idle(frame)):
+                continue
+            parts = []
+            while frame is not None and len(parts) < MAX_DEPTH:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = _frame_label(code)
+                parts.append(label)
+                frame = frame.f_back
+            parts.append(name)
+            self.stacks[";".join(reversed(parts))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.seconds = time.perf_counter() - self.started
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 15) -> List[Dict[str, Any]]:
+        """
+        Hottest functions by self samples (leaf) with total samples (anywhere
+        on the stack), as % of sampling ticks; with several worker threads
+        sampled per tick the percentages can add up past 100.
+        """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for f in set(frames):
+                total[f] += count
+        scale = 100.0 / self.samples if self.samples else 0.0
+        return [
+            {"function": f, "self_pct": round(n * scale, 1), "total_pct": round(total[f] * scale, 1), "samples": n}
+            for f, n in own.most_common(limit)
+        ]
+
+    def summary(self, limit: int = 15) -> Dict[str, Any]:
+        return {"seconds": round(self.seconds, 4), "samples": self.samples, "interval": self.interval, "top": self.top(limit)}
+
+
+def profile_dir() -> Path:
+    return Path(os.getenv("PROFILE_DIR", str(DEFAULT_DIR))).expanduser()
+
+
+def write_folded(profiler: SamplingProfiler, name: str) -> Path:
+    """Write profiler's folded stacks to PROFILE_DIR/<time>-<name>.folded."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+    path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{name}.folded"
+    path.write_text(profiler.folded(), encoding="utf-8")
+    return path
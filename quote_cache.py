@@ -0,0 +1,153 @@
+"""
+Short-TTL in-process quote cache with single-flight request coalescing.
+
+Entries are keyed by (mode, market, symbol, tr_id) and kept in LRU order up to
+max_size. When several callers ask for the same missing key at once, one
+of them fetches and the others wait for its result instead of issuing a
+duplicate upstream call.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+_MISS = object()
+
+
+class _Call:
+    """One in-flight fetch that other callers can wait on."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
+class QuoteCache:
+    def __init__(self, ttl: float = 2.0, max_size: int = 5000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _fresh(self, key: Hashable, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+        if entry[0] <= now:
+            del self._entries[key]
+            return _MISS
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _finish(self, key: Hashable, call: _Call, value: Any, error: Optional[Exception]) -> None:
+        with self._lock:
+            if error is None and self.ttl > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        call.value, call.error = value, error
+        call.event.set()
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Return a fresh cached value, join an in-flight fetch, or call fetch()."""
+        with self._lock:
+            value = self._fresh(key, time.monotonic())
+            if value is not _MISS:
+                self.hits += 1
+                return value
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                call = _Call()
+                self._inflight[key] = call
+                owner = True
+        if not owner:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            value = fetch()
+        except Exception as e:
+            self._finish(key, call, None, e)
+            raise
+        self._finish(key, call, value, None)
+        return value
+
+    def get_many(
+        self,
+        keys: Iterable[Hashable],
+        fetch_many: Callable[[List[Hashable]], Dict[Hashable, Tuple[Any, Optional[str]]]],
+    ) -> List[Tuple[Any, Optional[str]]]:
+        """
+        Batch form of get_or_fetch. fetch_many(missing_keys) must return
+        {key: (value, error)}; results come back as [(value, error)] in key order.
+        """
+        keys = list(keys)
+        results: Dict[Hashable, Tuple[Any, Optional[str]]] = {}
+        owned: Dict[Hashable, _Call] = {}
+        waiting: Dict[Hashable, _Call] = {}
+        with self._lock:
+            now = time.monotonic()
+            for key in keys:
+                if key in results or key in owned or key in waiting:
+                    continue
+                value = self._fresh(key, now)
+                if value is not _MISS:
+                    self.hits += 1
+                    results[key] = (value, None)
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    call = _Call()
+                    self._inflight[key] = call
+                    owned[key] = call
+        if owned:
+            fetched: Dict[Hashable, Tuple[Any, Optional[str]]] = {}
+            failure = "no result returned"
+            try:
+                fetched = fetch_many(list(owned))
+            except Exception as e:
+                failure = str(e)
+            for key, call in owned.items():
+                value, error = fetched.get(key, (None, failure))
+                # joiners in get_or_fetch re-raise call.error, so it must be an exception
+                self._finish(key, call, value, RuntimeError(error) if error is not None else None)
+                results[key] = (value, error)
+        for key, call in waiting.items():
+            call.event.wait()
+            results[key] = (call.value, str(call.error) if call.error is not None else None)
+        return [results[key] for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "ttl": self.ttl,
+            "max_size": self.max_size,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,105 @@
+"""
+Per-appkey request pacing for the KIS Open Trading API.
+
+KIS caps calls per second per appkey (paper/VTS far lower than prod).
+Each (appkey, mode, kind) gets a token bucket, where kind splits the budget
+between quotation and trading tr_ids. When the server answers with the
+throttle code (EGW00201) the bucket halves its rate and pauses, then
+creeps back up to the configured rate as calls succeed.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+THROTTLE_CODE = "EGW00201"  # 초당 거래건수를 초과하였습니다.
+_THROTTLE_BYTES = THROTTLE_CODE.encode()
+
+# calls per second, per appkey; override with KIS_RATE_<MODE>_<KIND> (e.g. KIS_RATE_PAPER_QUOTE=1)
+RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    "prod": {"quote": 15.0, "trade": 5.0},
+    "paper": {"quote": 1.5, "trade": 0.5},
+}
+TRADE_TR_PREFIXES = ("TTTC", "VTTC", "CTSC", "VTSC")
+BACKOFF_SECONDS = 1.0
+
+
+def tr_kind(tr_id: str) -> str:
+    """Classify a tr_id as 'trade' (account/order TRs) or 'quote'."""
+    return "trade" if tr_id.startswith(TRADE_TR_PREFIXES) else "quote"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() books a slot and returns how long the
+    caller must wait, so the same bucket serves threads and asyncio tasks.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 8
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.throttles = 0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttled(self) -> None:
+        """Server said slow down: halve the rate and push every waiter back."""
+        with self.lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0) - self.rate * BACKOFF_SECONDS
+
+    def succeeded(self) -> None:
+        """Recover the rate a little after each accepted call (checked under the lock, like throttled)."""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+_BUCKETS: Dict[Tuple[str, str, str], TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def configured_rate(mode: str, kind: str) -> float:
+    override = os.getenv(f"KIS_RATE_{mode.upper()}_{kind.upper()}")
+    if override:
+        return float(override)
+    return RATE_LIMITS.get(mode, RATE_LIMITS["paper"])[kind]
+
+
+def get_limiter(appkey: str, mode: str, tr_id: Optional[str]) -> Optional[TokenBucket]:
+    """Return the shared bucket for this appkey/mode/tr_id kind (None for OAuth calls)."""
+    if not tr_id:
+        return None
+    key = (appkey, mode, tr_kind(tr_id))
+    bucket = _BUCKETS.get(key)
+    if bucket is not None:
+        return bucket
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None:
+            bucket = TokenBucket(configured_rate(mode, key[2]))
+            _BUCKETS[key] = bucket
+    return bucket
+
+
+def is_throttled(content: bytes) -> bool:
+    """KIS signals throttling with msg_cd EGW00201 in the body (usually on an HTTP 500)."""
+    return _THROTTLE_BYTES in content
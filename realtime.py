@@ -0,0 +1,277 @@
+"""
+Real-time (WebSocket) feed for KIS domestic stock data.
+
+RealtimeFeed keeps one WebSocket session per environment on a background
+thread, (re)subscribes tr_id/tr_key pairs, answers PINGPONG and hands every
+data frame ("0|H0STCNT0|003|f^f^f...") to the handler registered for its
+tr_id. Trade ticks (실시간체결가) land in a LastPriceStore so quote readers
+get an O(1) lookup instead of a REST round trip; 실시간호가 depth goes to
+orderbook.DepthStore. Encrypted frames (flag "1", e.g. 체결통보) are
+decrypted with the AES-256-CBC key/iv the server returned when that tr_id
+was subscribed.
+"""
+
+import asyncio
+import base64
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import websockets
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+from kis_client import get_client
+from orderbook import DEPTH_TR_IDS, DepthStore
+
+WS_URLS = {
+    "prod": "ws://ops.koreainvestment.com:21000",
+    "paper": "ws://ops.koreainvestment.com:31000",
+}
+# 실시간체결가 tr_id per market (J=KRX, NX=Nextrade, UN=Unified)
+TICK_TR_IDS = {"J": "H0STCNT0", "NX": "H0NXCNT0", "UN": "H0UNCNT0"}
+TICK_WIDTH = 46  # fields per tick record
+# field positions inside one tick record (docs/API/국내주식 실시간체결가 (KRX)-표 1.csv)
+_SYMBOL, _TIME, _PRICE, _RATE, _VOLUME = 0, 1, 2, 5, 13
+
+RECONNECT_MAX_DELAY = 30.0
+
+FrameHandler = Callable[[str, int], None]
+
+
+def issue_approval_key(env: Dict) -> str:
+    """Issue a WebSocket approval key (POST /oauth2/Approval)."""
+    if not env.get("appkey") or not env.get("appsecret"):
+        raise ValueError("appkey or appsecret is missing")
+    body = {
+        "grant_type": "client_credentials",
+        "appkey": env["appkey"],
+        "secretkey": env["appsecret"],
+    }
+    result = get_client(env).post("/oauth2/Approval", None, None, body)
+    key = result.get("approval_key")
+    if not key:
+        raise RuntimeError(f"approval_key missing in response: {result}")
+    return key
+
+
+def aes_cbc_decrypt(key: str, iv: str, payload: str) -> str:
+    """Decrypt one base64 frame payload with the subscription's AES-256-CBC key and iv."""
+    cipher = AES.new(key.encode("utf-8"), AES.MODE_CBC, iv.encode("utf-8"))
+    return unpad(cipher.decrypt(base64.b64decode(payload)), AES.block_size).decode("utf-8")
+
+
+class LastPriceStore:
+    """
+    Last trade per symbol. Each update swaps in one small tuple of the raw
+    strings from the frame, so readers never see a half-written row and no
+    per-field dicts are built on the hot path.
+    """
+
+    def __init__(self):
+        # symbol -> (price, change_rate, acml_vol, hhmmss, received_at)
+        self._rows: Dict[str, Tuple[str, str, str, str, float]] = {}
+        self.updates = 0
+
+    def update(self, symbol: str, price: str, rate: str, volume: str, hhmmss: str, received_at: float) -> None:
+        self._rows[symbol] = (price, rate, volume, hhmmss, received_at)
+        self.updates += 1
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        row = self._rows.get(symbol)
+        if row is None:
+            return None
+        return {
+            "symbol": symbol,
+            "price": float(row[0]),
+            "change_rate": float(row[1]),
+            "volume": int(row[2] or 0),
+            "time": row[3],
+            "age": round(time.time() - row[4], 3),
+        }
+
+    def quote(self, symbol: str) -> Optional[Dict]:
+        """Last tick shaped like an inquire-price response ({"output": {...}})."""
+        row = self._rows.get(symbol)
+        if row is None:
+            return None
+        return {"rt_cd": "0", "msg1": "realtime", "output": {"stck_prpr": row[0], "prdy_ctrt": row[1], "acml_vol": row[2]}}
+
+    def symbols(self) -> List[str]:
+        return list(self._rows)
+
+
+def parse_ticks(store: LastPriceStore, payload: str, count: int) -> None:
+    """Apply `count` caret-delimited tick records from one frame to store."""
+    fields = payload.split("^")
+    if len(fields) < count * TICK_WIDTH:
+        count = len(fields) // TICK_WIDTH
+    now = time.time()
+    update = store.update
+    for base in range(0, count * TICK_WIDTH, TICK_WIDTH):
+        update(fields[base + _SYMBOL], fields[base + _PRICE], fields[base + _RATE], fields[base + _VOLUME], fields[base + _TIME], now)
+
+
+class RealtimeFeed:
+    """One reconnecting WebSocket session for an environment, run on a daemon thread."""
+
+    def __init__(self, env: Dict, url: Optional[str] = None, approval_key: Optional[str] = None):
+        self.env = env
+        self.url = url or env.get("ws") or WS_URLS[env.get("name", "paper")]
+        self.approval_key = approval_key
+        self.handlers: Dict[str, FrameHandler] = {}
+        self.subscriptions: Set[Tuple[str, str]] = set()
+        self._sub_lock = threading.Lock()  # orders subscribe() against the resubscribe snapshot
+        self.keys: Dict[str, Tuple[str, str]] = {}  # tr_id -> (aes key, iv) from SUBSCRIBE SUCCESS
+        self.ticks: Dict[str, LastPriceStore] = {}
+        for market, tr_id in TICK_TR_IDS.items():
+            store = LastPriceStore()
+            self.ticks[market] = store
+            self.on(tr_id, lambda payload, count, store=store: parse_ticks(store, payload, count))
+        self.books: Dict[str, DepthStore] = {}
+        for market, (tr_id, width) in DEPTH_TR_IDS.items():
+            depth = DepthStore()
+            self.books[market] = depth
+            self.on(tr_id, lambda payload, count, depth=depth, width=width: depth.apply(payload, count, width))
+        self.connected = threading.Event()
+        self.frames = 0
+        self.last_error: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ws = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def on(self, tr_id: str, handler: FrameHandler) -> None:
+        """Route data frames for tr_id to handler(payload, record_count)."""
+        self.handlers[tr_id] = handler
+
+    def subscribe(self, tr_id: str, tr_key: str) -> None:
+        item = (tr_id, tr_key)
+        with self._sub_lock:
+            if item in self.subscriptions:
+                return
+            self.subscriptions.add(item)
+            self._send_threadsafe(tr_id, tr_key, "1")
+
+    def unsubscribe(self, tr_id: str, tr_key: str) -> None:
+        with self._sub_lock:
+            if (tr_id, tr_key) not in self.subscriptions:
+                return
+            self.subscriptions.discard((tr_id, tr_key))
+            self._send_threadsafe(tr_id, tr_key, "2")
+
+    def subscribe_ticks(self, symbols: List[str], market: str = "J") -> LastPriceStore:
+        tr_id = TICK_TR_IDS[market]
+        for sym in symbols:
+            self.subscribe(tr_id, sym)
+        return self.ticks[market]
+
+    def subscribe_depth(self, symbols: List[str], market: str = "J") -> DepthStore:
+        tr_id = DEPTH_TR_IDS[market][0]
+        for sym in symbols:
+            self.subscribe(tr_id, sym)
+        return self.books[market]
+
+    def start(self) -> "RealtimeFeed":
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._thread_main, name=f"realtime-{self.env.get('name')}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping = True
+        loop, ws = self._loop, self._ws
+        if loop is not None and ws is not None:
+            asyncio.run_coroutine_threadsafe(ws.close(), loop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _subscribe_message(self, tr_id: str, tr_key: str, tr_type: str) -> str:
+        return json.dumps(
+            {
+                "header": {
+                    "approval_key": self.approval_key,
+                    "custtype": "P",
+                    "tr_type": tr_type,
+                    "content-type": "utf-8",
+                },
+                "body": {"input": {"tr_id": tr_id, "tr_key": tr_key}},
+            }
+        )
+
+    def _send_threadsafe(self, tr_id: str, tr_key: str, tr_type: str) -> None:
+        loop, ws = self._loop, self._ws
+        if loop is None or ws is None or not self.connected.is_set():
+            return  # sent on (re)connect
+        asyncio.run_coroutine_threadsafe(ws.send(self._subscribe_message(tr_id, tr_key, tr_type)), loop)
+
+    def _thread_main(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        delay = 1.0
+        while not self._stopping:
+            try:
+                if not self.approval_key:
+                    self.approval_key = await self._loop.run_in_executor(None, issue_approval_key, self.env)
+                await self._session()
+                delay = 1.0
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[{self.env.get('name')}] realtime feed error: {e}")
+            self.connected.clear()
+            self._ws = None
+            if not self._stopping:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _session(self) -> None:
+        async with websockets.connect(self.url, ping_interval=None, max_queue=None) as ws:
+            self._ws = ws
+            # set connected and snapshot together: a subscribe() before this is in
+            # the batch, one after it is sent live by _send_threadsafe
+            with self._sub_lock:
+                self.connected.set()
+                pending = list(self.subscriptions)
+            for tr_id, tr_key in pending:
+                await ws.send(self._subscribe_message(tr_id, tr_key, "1"))
+            async for message in ws:
+                reply = self.handle_message(message)
+                if reply is not None:
+                    await ws.send(reply)
+
+    def handle_message(self, message) -> Optional[str]:
+        """Dispatch one WebSocket message; returns a reply to send back, if any."""
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        if message[:1] in ("0", "1"):
+            encrypted, tr_id, count, payload = message.split("|", 3)
+            handler = self.handlers.get(tr_id)
+            if handler is not None:
+                if encrypted == "1":
+                    if tr_id not in self.keys:
+                        return None
+                    payload = aes_cbc_decrypt(*self.keys[tr_id], payload)
+                self.frames += 1
+                handler(payload, int(count))
+            return None
+        msg = json.loads(message)
+        header = msg.get("header") or {}
+        if header.get("tr_id") == "PINGPONG":
+            return message
+        body = msg.get("body") or {}
+        output = body.get("output") or {}
+        if output.get("key") and output.get("iv"):
+            self.keys[header.get("tr_id", "")] = (output["key"], output["iv"])
+        if body.get("rt_cd") not in (None, "0"):
+            print(f"[{self.env.get('name')}] realtime {header.get('tr_id')} {header.get('tr_key')}: {body.get('msg1')}")
+        return None
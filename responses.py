@@ -0,0 +1,148 @@
+"""
+Response shaping for the Flask API: field projection, masking and JSON encoding.
+
+Ranking endpoints can return thousands of rows, each with an upstream
+payload, so the work per row has to stay small:
+  - compile_fields/project keep only the requested fields (dotted paths
+    reach into nested payloads, e.g. raw.output.stck_prpr), before
+    anything is masked or encoded;
+  - MaskPlan classifies each dict key once and copies only the
+    containers on the path to a sensitive key; everything else is
+    returned as is (KIS quote payloads carry none);
+  - OrjsonProvider encodes responses with orjson straight to bytes.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+SENSITIVE_KEYS = ("appkey", "appsecret", "token", "access_token", "authorization")
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+MAX_KNOWN_KEYS = 100_000  # classified-key memo is reset past this size
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+FieldPaths = Tuple[Tuple[str, ...], ...]
+
+
+def _mask_value(value: Any) -> str:
+    if isinstance(value, str) and value:
+        return value[:4] + "***" if len(value) > 4 else "***"
+    return "***"
+
+
+class MaskPlan:
+    """
+    Sensitive-key masking compiled once for a key set. Every dict key seen
+    is classified once and remembered, so a dict is checked with two set
+    operations instead of lower-casing each of its keys.
+    """
+
+    def __init__(self, keys: Iterable[str] = SENSITIVE_KEYS):
+        self.keys = frozenset(k.lower() for k in keys)
+        self._known: Set[Any] = set()
+        self._sensitive: Set[Any] = set()  # spellings of sensitive keys seen so far
+
+    def _learn(self, data: Dict) -> None:
+        if len(self._known) > MAX_KNOWN_KEYS:
+            self._known.clear()
+        for k in data:
+            if k not in self._known:
+                self._known.add(k)
+                if isinstance(k, str) and k.lower() in self.keys:
+                    self._sensitive.add(k)
+
+    def mask(self, data: Any) -> Any:
+        """
+        Masked view of data in one pass. Containers without a sensitive key
+        below them are returned unchanged (not copied), so callers must not
+        mutate the result in place.
+        """
+        cls = data.__class__
+        if cls is dict or (cls not in _SCALARS and isinstance(data, dict)):
+            if not self._known.issuperset(data):
+                self._learn(data)
+            sensitive = self._sensitive
+            out = None
+            if not sensitive.isdisjoint(data):
+                out = dict(data)
+                for k in sensitive.intersection(data):
+                    out[k] = _mask_value(data[k])
+            for k, v in data.items():
+                c = v.__class__
+                if c is dict or c is list or (c not in _SCALARS and isinstance(v, (dict, list))):
+                    new = self.mask(v)
+                    if new is not v and k not in sensitive:
+                        if out is None:
+                            out = dict(data)
+                        out[k] = new
+            return data if out is None else out
+        if cls is list or (cls not in _SCALARS and isinstance(data, list)):
+            out = None
+            for i, v in enumerate(data):
+                c = v.__class__
+                if c is dict or c is list or (c not in _SCALARS and isinstance(v, (dict, list))):
+                    new = self.mask(v)
+                    if new is not v:
+                        if out is None:
+                            out = list(data)
+                        out[i] = new
+            return data if out is None else out
+        return data
+
+
+DEFAULT_MASK = MaskPlan()
+
+
+def compile_fields(spec: Union[str, Sequence[str], None]) -> Optional[FieldPaths]:
+    """'symbol,score,raw.output.stck_prpr' (or a list) -> path tuples; None keeps every field."""
+    if not spec:
+        return None
+    names = spec.split(",") if isinstance(spec, str) else spec
+    paths = tuple(tuple(name.strip().split(".")) for name in names if name and name.strip())
+    return paths or None
+
+
+def project(row: Dict[str, Any], fields: FieldPaths) -> Dict[str, Any]:
+    """Copy of row with only the given paths; missing paths are left out."""
+    out: Dict[str, Any] = {}
+    for path in fields:
+        value: Any = row
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = out
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = value
+    return out
+
+
+def shape_rows(rows: List[Dict[str, Any]], fields: Optional[FieldPaths], plan: MaskPlan = DEFAULT_MASK) -> List[Dict[str, Any]]:
+    """Project rows to fields (if any), then mask what is left."""
+    if fields is not None:
+        rows = [project(row, fields) for row in rows]
+    return plan.mask(rows)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=JSON_OPTIONS)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (UTF-8 output, keys in insertion order)."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        return self._app.response_class(dumps(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
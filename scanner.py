@@ -0,0 +1,146 @@
+"""
+Bounded-concurrency universe scan shared by app.py and auto_trader.py.
+
+Quotes are fetched on a thread pool (the pooled KIS session is thread-safe),
+and results come back in input order so downstream ranking stays
+deterministic regardless of which request finishes first; iter_scan
+yields in completion order instead, for streamed responses. The
+multi-symbol price helpers are shared with the asyncio pipeline in
+kis_async.py.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CONCURRENCY = 8
+
+ScanResult = Tuple[str, Optional[Any], Optional[str]]
+
+MULTI_PRICE_PATH = "/uapi/domestic-stock/v1/quotations/intstock-multprice"
+# 관심종목(멀티종목) 시세조회: max symbols per call and field aliases to inquire-price names
+MULTI_PRICE_MAX = 30
+MULTI_PRICE_FIELDS = {
+    "inter_kor_isnm": "hts_kor_isnm",
+    "inter2_prpr": "stck_prpr",
+    "inter2_prdy_vrss": "prdy_vrss",
+    "inter2_oprc": "stck_oprc",
+    "inter2_hgpr": "stck_hgpr",
+    "inter2_lwpr": "stck_lwpr",
+    "inter2_mxpr": "stck_mxpr",
+    "inter2_llam": "stck_llam",
+    "inter2_prdy_clpr": "stck_prdy_clpr",
+}
+
+
+def scan_concurrency(value: Optional[int] = None) -> int:
+    """Resolve worker count: explicit value, else SCAN_CONCURRENCY env, else default."""
+    if value is None:
+        value = int(os.getenv("SCAN_CONCURRENCY", DEFAULT_CONCURRENCY))
+    return max(1, int(value))
+
+
+def scan_symbols(
+    symbols: Iterable[str],
+    fetch: Callable[[str], Any],
+    concurrency: Optional[int] = None,
+) -> List[ScanResult]:
+    """
+    Call fetch(symbol) for every symbol with at most `concurrency` in flight.
+    Returns [(symbol, result, error)] in the same order as `symbols`;
+    a failed fetch yields result=None and error=str(exception).
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return []
+
+    def run_one(sym: str) -> ScanResult:
+        return _run_one(fetch, sym)
+
+    workers = min(scan_concurrency(concurrency), len(symbols))
+    if workers == 1:
+        return [run_one(sym) for sym in symbols]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        return list(pool.map(run_one, symbols))
+
+
+def _run_one(fetch: Callable[[str], Any], sym: str) -> ScanResult:
+    try:
+        return sym, fetch(sym), None
+    except Exception as e:
+        return sym, None, str(e)
+
+
+def iter_scan(
+    symbols: Iterable[str],
+    fetch: Callable[[str], Any],
+    concurrency: Optional[int] = None,
+) -> Iterator[ScanResult]:
+    """
+    Like scan_symbols, but yields each (symbol, result, error) as soon as it
+    completes. Only `concurrency` fetches are submitted at a time, so finished
+    results never pile up ahead of a slow consumer; closing the generator
+    waits for the in-flight fetches and submits no more.
+    """
+    pending_symbols = iter(symbols)
+    workers = scan_concurrency(concurrency)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        pending = set()
+        for sym in pending_symbols:
+            pending.add(pool.submit(_run_one, fetch, sym))
+            if len(pending) >= workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for sym in pending_symbols:
+                    pending.add(pool.submit(_run_one, fetch, sym))
+                    break
+
+
+def multi_price_chunks(symbols: List[str]) -> List[str]:
+    """Split symbols into comma-joined chunks of MULTI_PRICE_MAX, scanned as one key each."""
+    return [",".join(symbols[i:i + MULTI_PRICE_MAX]) for i in range(0, len(symbols), MULTI_PRICE_MAX)]
+
+
+def multi_price_params(chunk: str, market: str) -> Dict[str, str]:
+    params = {}
+    for n, sym in enumerate(chunk.split(","), 1):
+        params[f"FID_COND_MRKT_DIV_CODE_{n}"] = market
+        params[f"FID_INPUT_ISCD_{n}"] = sym
+    return params
+
+
+def normalize_multi_price(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Map intstock-multprice fields onto the inquire-price names the rankers read."""
+    out = dict(row)
+    for src, dst in MULTI_PRICE_FIELDS.items():
+        if src in row:
+            out[dst] = row[src]
+    return out
+
+
+def split_multi_price(chunk: str, resp: Optional[Dict], err: Optional[str]) -> List[ScanResult]:
+    """Turn one multi-price response into per-symbol ScanResults shaped like inquire-price."""
+    symbols = chunk.split(",")
+    if err:
+        return [(sym, None, err) for sym in symbols]
+    rows = resp.get("output") or []
+    if isinstance(rows, dict):
+        rows = [rows]
+    by_symbol = {row.get("inter_shrn_iscd"): row for row in rows if isinstance(row, dict)}
+    results: List[ScanResult] = []
+    for sym in symbols:
+        row = by_symbol.get(sym)
+        if row is None:
+            results.append((sym, None, resp.get("msg1") or "symbol missing from multi-price response"))
+            continue
+        results.append(
+            (
+                sym,
+                {"rt_cd": resp.get("rt_cd"), "msg_cd": resp.get("msg_cd"), "msg1": resp.get("msg1"), "output": normalize_multi_price(row)},
+                None,
+            )
+        )
+    return results
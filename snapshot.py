@@ -0,0 +1,160 @@
+"""
+Background universe scans that keep a ranked snapshot warm.
+
+A UniverseScanner rescans one universe every `interval` seconds on a
+daemon thread, ranks it with factors.rank_quotes and publishes an
+immutable RankedSnapshot by swapping a single reference, so readers never
+see a half-built ranking. Readers call get(max_staleness): a fresh enough
+snapshot is returned as is, an older one (or none yet) triggers a
+synchronous refresh that concurrent callers share. A scanner with no
+readers for `idle` seconds stops scanning until the next read.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from factors import rank_quotes, weights_for
+from scanner import ScanResult
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_IDLE = 600.0
+
+
+class RankedSnapshot:
+    """One finished ranking: rows best first (unrankable and failed symbols last)."""
+
+    __slots__ = ("rows", "positions", "rankable", "started_at", "finished_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], started_at: float, finished_at: float):
+        self.rows = rows
+        self.positions = {row["symbol"]: i for i, row in enumerate(rows)}
+        self.rankable = sum(1 for row in rows if row.get("score") is not None)
+        self.started_at = started_at
+        self.finished_at = finished_at
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.finished_at
+
+    def top(self, n: int, alloc: str = "equal") -> List[Dict[str, Any]]:
+        """The n best rankable rows with portfolio weights."""
+        picks = self.rows[: min(n, self.rankable)]
+        vol = np.array([row.get("vol") or np.nan for row in picks], dtype=np.float64)
+        weights = weights_for(np.arange(len(picks)), vol, alloc)
+        return [dict(row, weight=round(float(w), 4)) for row, w in zip(picks, weights)]
+
+    def subset(self, symbols: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Rows for symbols in snapshot rank order, or None if any symbol is not covered."""
+        positions = self.positions
+        if any(sym not in positions for sym in symbols):
+            return None
+        return [self.rows[i] for i in sorted({positions[sym] for sym in symbols})]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "as_of": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.finished_at)),
+            "age": round(self.age, 3),
+            "scan_seconds": round(self.finished_at - self.started_at, 3),
+            "symbols": len(self.rows),
+            "ranked": self.rankable,
+        }
+
+
+class UniverseScanner:
+    """
+    Periodic scan of symbols_fn() through fetch(symbols) -> [ScanResult].
+    fetch is expected to obtain its own token, so a long-running scanner
+    survives token rotation.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        symbols_fn: Callable[[], List[str]],
+        fetch: Callable[[List[str]], List[ScanResult]],
+        interval: float = DEFAULT_INTERVAL,
+        idle: float = DEFAULT_IDLE,
+    ):
+        self.name = name
+        self.symbols_fn = symbols_fn
+        self.fetch = fetch
+        self.interval = interval
+        self.idle = idle
+        self.snapshot: Optional[RankedSnapshot] = None
+        self.scans = 0
+        self.last_error: Optional[str] = None
+        self.last_read = time.time()
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> RankedSnapshot:
+        """Scan now and publish. Callers that queue behind a running scan reuse its result."""
+        seen = self.scans
+        with self._refresh_lock:
+            if self.scans != seen and self.snapshot is not None:
+                return self.snapshot
+            started = time.time()
+            rows = rank_quotes(self.fetch(self.symbols_fn()))
+            for row in rows:
+                row.pop("resp", None)
+            snapshot = RankedSnapshot(rows, started, time.time())
+            self.snapshot = snapshot
+            self.scans += 1
+            self.last_error = None
+            return snapshot
+
+    def get(self, max_staleness: Optional[float] = None) -> RankedSnapshot:
+        """
+        Current snapshot if it is at most max_staleness seconds old (default
+        twice the interval), else a fresh one. Keeps the background thread running.
+        """
+        self.last_read = time.time()
+        self.start()
+        limit = 2 * self.interval if max_staleness is None else max_staleness
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.age > limit:
+            snapshot = self.refresh()
+        return snapshot
+
+    def start(self) -> "UniverseScanner":
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=f"snapshot-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set() and time.time() - self.last_read < self.idle:
+            snapshot = self.snapshot
+            due = self.interval - snapshot.age if snapshot is not None else 0
+            if due <= 0:
+                try:
+                    self.refresh()
+                    due = self.interval
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"[{self.name}] universe scan failed: {e}")
+                    due = self.interval
+            self._stop.wait(max(due, 0.05))
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "scans": self.scans,
+            "last_error": self.last_error,
+            "snapshot": snapshot.info() if snapshot is not None else None,
+        }
@@ -0,0 +1,116 @@
+"""
+Durable access-token store shared by every process on the host.
+
+KIS throttles /oauth2/tokenP to roughly one call per minute, so the Flask
+server, auto_trader runs and cli_test commands all read tokens from one
+SQLite file (keyed by appkey hash + mode) before issuing a new one. Issuing
+happens under SQLite's write lock, so concurrent cold starts wait for the
+first process's token instead of each calling tokenP. The file is 0600.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_PATH = Path.home() / ".kis" / "tokens.db"
+EXPIRY_BUFFER = 60  # seconds shaved off expires_in
+LOCK_TIMEOUT = 30.0  # seconds to wait for another process that is issuing
+
+
+def _key(appkey: str, mode: str) -> str:
+    return hashlib.sha256(f"{mode}:{appkey}".encode()).hexdigest()
+
+
+class TokenStore:
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if not self.path.exists():
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.path, 0o600)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, mode TEXT, token TEXT, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=LOCK_TIMEOUT, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, appkey: str, mode: str) -> Optional[Tuple[str, float]]:
+        """Return (token, expires_at) if a still-valid token is stored."""
+        row = self._connect().execute(
+            "SELECT token, expires_at FROM tokens WHERE key = ?", (_key(appkey, mode),)
+        ).fetchone()
+        if row and row[1] > time.time():
+            return row[0], row[1]
+        return None
+
+    def put(self, appkey: str, mode: str, token: str, expires_at: float) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tokens (key, mode, token, expires_at) VALUES (?, ?, ?, ?)",
+            (_key(appkey, mode), mode, token, expires_at),
+        )
+
+    def delete(self, appkey: str, mode: str, token: Optional[str] = None) -> None:
+        """Forget the stored token (only if it equals `token`, when given)."""
+        if token is None:
+            self._connect().execute("DELETE FROM tokens WHERE key = ?", (_key(appkey, mode),))
+        else:
+            self._connect().execute("DELETE FROM tokens WHERE key = ? AND token = ?", (_key(appkey, mode), token))
+
+    def get_or_issue(self, appkey: str, mode: str, issue: Callable[[], Dict]) -> Tuple[Optional[str], float]:
+        """
+        Return a valid stored token, or call issue() (a tokenP response dict)
+        while holding the write lock and store the result.
+        """
+        found = self.get(appkey, mode)
+        if found:
+            return found
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            found = self.get(appkey, mode)
+            if found:
+                conn.execute("COMMIT")
+                return found
+            result = issue()
+            token = result.get("access_token")
+            expires_at = token_expires_at(result)
+            if token and expires_at:
+                self.put(appkey, mode, token, expires_at)
+            conn.execute("COMMIT")
+            return token, expires_at
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def token_expires_at(result: Dict) -> float:
+    """Absolute expiry (epoch seconds, minus a buffer) from a tokenP response; 0 if unknown."""
+    expires_in = result.get("expires_in")
+    if not expires_in:
+        return 0.0
+    return time.time() + max(int(expires_in) - EXPIRY_BUFFER, 0)
+
+
+_STORE: Optional[TokenStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_token_store() -> TokenStore:
+    """Process-wide store at KIS_TOKEN_STORE (default ~/.kis/tokens.db)."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = TokenStore(Path(os.getenv("KIS_TOKEN_STORE", str(DEFAULT_PATH))).expanduser())
+    return _STORE
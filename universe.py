@@ -1,19 +1,43 @@
 import csv
+import json
+import os
+import threading
 import time
+from email.utils import formatdate
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import requests
 
 KRX_SOURCE = "https://raw.githubusercontent.com/FinanceData/FinanceDataReader/master/FinanceDataReader/data/krx/krx_code.csv"
 DEFAULT_PATH = Path("data/krx_universe.csv")
 DEFAULT_TTL = 60 * 60 * 24  # 24 hours
 
+# accepted CSV headers per field (krx_code.csv has used both Sector and Dept)
+_COLUMNS = {
+    "code": ("Code", "code", "Symbol"),
+    "name": ("Name", "name"),
+    "market": ("Market", "market"),
+    "sector": ("Sector", "sector", "Industry", "Dept"),
+}
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_suffix(".meta.json")
+
+
+def _index_path(path: Path) -> Path:
+    return path.with_suffix(".idx.npz")
+
 
 def ensure_universe_csv(path: Path = DEFAULT_PATH, ttl: int = DEFAULT_TTL) -> Path:
     """
-    Download KRX symbol list if missing or stale.
+    Download KRX symbol list if missing, or revalidate it once stale.
     Source: FinanceDataReader public GitHub (krx_code.csv).
+    Revalidation is conditional (If-None-Match / If-Modified-Since), so an
+    unchanged list costs a 304; if the source is unreachable the stale copy
+    is kept.
     """
     path.parent.mkdir(parents=True, exist_ok=True)
     if path.exists():
@@ -21,25 +45,164 @@ def ensure_universe_csv(path: Path = DEFAULT_PATH, ttl: int = DEFAULT_TTL) -> Pa
         if time.time() - mtime < ttl:
             return path
 
-    resp = requests.get(KRX_SOURCE, timeout=10)
-    resp.raise_for_status()
-    path.write_bytes(resp.content)
+    meta_path = _meta_path(path)
+    headers = {}
+    if path.exists():
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        headers["If-Modified-Since"] = meta.get("last_modified") or formatdate(path.stat().st_mtime, usegmt=True)
+
+    try:
+        resp = requests.get(KRX_SOURCE, headers=headers, timeout=10)
+        if resp.status_code == 304:
+            os.utime(path)
+            if _index_path(path).exists():
+                os.utime(_index_path(path))
+            return path
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        if not path.exists():
+            raise
+        print(f"Universe refresh failed, using stale copy: {e}")
+        return path
+
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(resp.content)
+    os.replace(tmp, path)
+    meta_path.write_text(json.dumps({"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}))
     return path
 
 
-def load_universe(limit: int = 200) -> List[str]:
+def _pick(row: Dict[str, str], field: str) -> str:
+    for key in _COLUMNS[field]:
+        value = row.get(key)
+        if value:
+            return value.strip()
+    return ""
+
+
+def build_index(path: Path) -> Path:
     """
-    Return a list of KRX tickers (zero-padded 6 digits).
-    Limit to avoid overloading API calls.
+    Parse the CSV once into a compact index next to it: codes as fixed 6-byte
+    strings, names as one UTF-8 blob with offsets, market and sector as
+    small integer codes into their vocabularies.
     """
-    path = ensure_universe_csv()
-    symbols: List[str] = []
+    codes: List[bytes] = []
+    names: List[bytes] = []
+    markets: List[str] = []
+    sectors: List[str] = []
     with path.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            code = row.get("Code") or row.get("code")
-            if code:
-                symbols.append(code.strip())
-            if len(symbols) >= limit:
-                break
-    return symbols
+        for row in csv.DictReader(f):
+            code = _pick(row, "code")
+            if not code:
+                continue
+            codes.append((code.zfill(6) if code.isdigit() else code).encode())
+            names.append(_pick(row, "name").encode())
+            markets.append(_pick(row, "market"))
+            sectors.append(_pick(row, "sector"))
+
+    market_vocab = sorted(set(markets))
+    sector_vocab = sorted(set(sectors))
+    market_ids = {m: i for i, m in enumerate(market_vocab)}
+    sector_ids = {s: i for i, s in enumerate(sector_vocab)}
+    index = _index_path(path)
+    tmp = index.with_suffix(".tmp.npz")
+    np.savez(
+        tmp,
+        codes=np.array(codes, dtype="S12"),
+        name_offsets=np.cumsum([0] + [len(n) for n in names], dtype=np.int64),
+        names=np.frombuffer(b"".join(names), dtype=np.uint8),
+        market=np.array([market_ids[m] for m in markets], dtype=np.uint8),
+        sector=np.array([sector_ids[s] for s in sectors], dtype=np.uint16),
+        vocab=np.frombuffer(json.dumps({"market": market_vocab, "sector": sector_vocab}).encode(), dtype=np.uint8),
+    )
+    os.replace(tmp, index)
+    return index
+
+
+class SymbolMaster:
+    """Symbol master loaded from the binary index; lookups and selections are memoized."""
+
+    def __init__(self, index: Path):
+        with np.load(index) as data:
+            self.codes = [c.decode() for c in data["codes"].tolist()]
+            self._offsets = data["name_offsets"]
+            self._names = data["names"].tobytes()
+            self._market = data["market"]
+            self._sector = data["sector"]
+            vocab = json.loads(data["vocab"].tobytes())
+        self.markets: List[str] = vocab["market"]
+        self.sectors: List[str] = vocab["sector"]
+        self._by_code = {code: i for i, code in enumerate(self.codes)}
+        self._selections: Dict[Tuple, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._by_code
+
+    def get(self, code: str) -> Optional[Dict[str, str]]:
+        """{code, name, market, sector} for a code, or None."""
+        i = self._by_code.get(code)
+        if i is None:
+            return None
+        return {
+            "code": code,
+            "name": self._names[self._offsets[i]:self._offsets[i + 1]].decode(),
+            "market": self.markets[self._market[i]],
+            "sector": self.sectors[self._sector[i]],
+        }
+
+    def select(self, market: Optional[str] = None, sector: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Codes in file order, optionally filtered by market and/or sector (case-insensitive)."""
+        key = (market and market.upper(), sector and sector.lower(), limit)
+        cached = self._selections.get(key)
+        if cached is None:
+            mask = np.ones(len(self.codes), dtype=bool)
+            if market:
+                ids = [i for i, m in enumerate(self.markets) if m.upper() == key[0]]
+                mask &= np.isin(self._market, ids)
+            if sector:
+                ids = [i for i, s in enumerate(self.sectors) if s.lower() == key[1]]
+                mask &= np.isin(self._sector, ids)
+            rows = np.flatnonzero(mask)[:limit]
+            cached = self._selections[key] = [self.codes[i] for i in rows.tolist()]
+        return list(cached)
+
+
+_MASTER: Optional[SymbolMaster] = None
+_MASTER_CHECKED = 0.0
+_MASTER_LOCK = threading.Lock()
+
+
+def get_symbol_master(path: Path = DEFAULT_PATH, ttl: int = DEFAULT_TTL) -> SymbolMaster:
+    """
+    Process-wide symbol master, built lazily. The CSV freshness check runs at
+    most once per ttl; the index is rebuilt only when the CSV changed.
+    """
+    global _MASTER, _MASTER_CHECKED
+    if _MASTER is not None and time.time() - _MASTER_CHECKED < ttl:
+        return _MASTER
+    with _MASTER_LOCK:
+        if _MASTER is not None and time.time() - _MASTER_CHECKED < ttl:
+            return _MASTER
+        csv_path = ensure_universe_csv(path, ttl)
+        index = _index_path(csv_path)
+        stale = not index.exists() or index.stat().st_mtime < csv_path.stat().st_mtime
+        if stale:
+            build_index(csv_path)
+        if stale or _MASTER is None:
+            _MASTER = SymbolMaster(index)
+        _MASTER_CHECKED = time.time()
+        return _MASTER
+
+
+def load_universe(limit: int = 200, market: Optional[str] = None, sector: Optional[str] = None) -> List[str]:
+    """
+    Return a list of KRX tickers (zero-padded 6 digits), optionally filtered
+    by market (KOSPI/KOSDAQ/...) and sector.
+    Limit to avoid overloading API calls.
+    """
+    return get_symbol_master().select(market, sector, limit)
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the KIS real-time WebSocket server.
+
+Answers subscribe requests with SUBSCRIBE SUCCESS, sends PINGPONG
+periodically and replays canned data frames from a file (one raw frame per
+line, e.g. "0|H0STCNT0|001|005930^...") to clients subscribed to that tr_id,
+so realtime.RealtimeFeed can be exercised offline. Frames flagged "1"
+(encrypted, e.g. 체결통보) are written in plain text and encrypted on send
+with the key/iv handed out in the subscribe reply:
+
+    python ws_replay.py frames.txt --port 21000
+    WS_PAPER=ws://127.0.0.1:21000 python app.py
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+from pathlib import Path
+from typing import List, Optional, Set
+
+import websockets
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+REPLAY_KEY = "0" * 32
+REPLAY_IV = "0123456789abcdef"
+
+
+def load_frames(path: Path) -> List[str]:
+    with path.open("r", encoding="utf-8") as f:
+        return [line.rstrip("\r\n") for line in f if line.strip() and not line.startswith("#")]
+
+
+def subscribe_reply(tr_id: str, tr_key: str, tr_type: str) -> str:
+    msg1 = "SUBSCRIBE SUCCESS" if tr_type == "1" else "UNSUBSCRIBE SUCCESS"
+    return json.dumps(
+        {
+            "header": {"tr_id": tr_id, "tr_key": tr_key, "encrypt": "N"},
+            "body": {"rt_cd": "0", "msg_cd": "OPSP0000", "msg1": msg1, "output": {"iv": REPLAY_IV, "key": REPLAY_KEY}},
+        }
+    )
+
+
+def encrypt_frame(frame: str) -> str:
+    """Encrypt the payload of a frame flagged "1"; other frames pass through."""
+    if not frame.startswith("1|"):
+        return frame
+    flag, tr_id, count, payload = frame.split("|", 3)
+    cipher = AES.new(REPLAY_KEY.encode(), AES.MODE_CBC, REPLAY_IV.encode())
+    return f"{flag}|{tr_id}|{count}|{base64.b64encode(cipher.encrypt(pad(payload.encode('utf-8'), AES.block_size))).decode()}"
+
+
+async def serve(frames: List[str], host: str = "127.0.0.1", port: int = 21000, interval: float = 0.0,
+                repeat: int = 1, ping_interval: float = 30.0, ready: Optional[asyncio.Event] = None) -> None:
+    """Run the stand-in server until cancelled."""
+
+    async def handler(ws) -> None:
+        subscribed: Set[str] = set()
+        started = asyncio.Event()
+
+        async def replay() -> None:
+            await started.wait()
+            for _ in range(repeat):
+                for frame in frames:
+                    if frame.split("|", 2)[1] in subscribed:
+                        await ws.send(encrypt_frame(frame))
+                        if interval:
+                            await asyncio.sleep(interval)
+
+        async def pinger() -> None:
+            while True:
+                await asyncio.sleep(ping_interval)
+                await ws.send(json.dumps({"header": {"tr_id": "PINGPONG", "datetime": "20240101090000"}}))
+
+        tasks = [asyncio.create_task(replay()), asyncio.create_task(pinger())]
+        try:
+            async for message in ws:
+                msg = json.loads(message)
+                header = msg.get("header") or {}
+                if header.get("tr_id") == "PINGPONG":
+                    continue
+                body = (msg.get("body") or {}).get("input") or {}
+                tr_id, tr_key = body.get("tr_id", ""), body.get("tr_key", "")
+                tr_type = header.get("tr_type", "1")
+                if tr_type == "1":
+                    subscribed.add(tr_id)
+                await ws.send(subscribe_reply(tr_id, tr_key, tr_type))
+                started.set()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async with websockets.serve(handler, host, port):
+        if ready is not None:
+            ready.set()
+        await asyncio.Future()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Replay canned KIS WebSocket frames")
+    p.add_argument("frames", help="file with one raw frame per line")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=21000)
+    p.add_argument("--interval", type=float, default=0.0, help="seconds between frames")
+    p.add_argument("--repeat", type=int, default=1, help="times to replay the file per client")
+    return p
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    frames = load_frames(Path(args.frames))
+    print(f"Replaying {len(frames)} frames on ws://{args.host}:{args.port}")
+    asyncio.run(serve(frames, args.host, args.port, args.interval, args.repeat))